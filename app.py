@@ -11,6 +11,11 @@ import re
 import hashlib
 import importlib
 from collections import Counter
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as futures_wait
+from functools import lru_cache, partial
+import queue
+import threading
 import time
 from datetime import datetime
 try:
@@ -21,8 +26,14 @@ from llm_backend import (
     HF_MODEL,
     LLM_BACKEND,
     llm_chat_completions_create,
+    llm_chat_completions_stream,
+    llm_circuit_stats,
     llm_is_available,
+    llm_is_configured,
+    llm_limiter_stats,
+    llm_response_cache_stats,
     llm_text_generation,
+    track_llm_calls,
 )
 from auth_utils import signup, login, logout, verify_token, get_user_by_id, update_user_profile, update_password
 from review_utils import (
@@ -30,6 +41,8 @@ from review_utils import (
     get_review,
     get_reviews_for_shop,
     get_reviews_for_recommendation_batch,
+    iter_reviews_for_recommendation_batch,
+    ensure_review_normalization_columns,
     get_user_reviews,
     get_latest_reviews,
     get_user_review_stats,
@@ -53,18 +66,32 @@ from preference_suggestion_utils import (
     list_preference_suggestions,
     update_preference_suggestion,
 )
-from slang_normalize import normalize_text_with_slang, tokenize_normalized, DOMAIN_CANONICAL_REPLACEMENTS
+from slang_normalize import (
+    normalize_text_with_slang,
+    tokenize_normalized,
+    tokenize_texts,
+    token_lemmas,
+    slang_map_version,
+    DOMAIN_CANONICAL_REPLACEMENTS,
+)
 from bm25_utils import (
+    DEFAULT_BM25F_FIELDS,
+    BM25ScoreCache,
+    KeywordPhraseMatcher,
+    PhraseIndex,
+    SpanIntervals,
     build_query_tokens,
-    build_bm25_index,
+    get_shared_bm25_index,
+    notify_place_deleted as bm25_notify_place_deleted,
+    publish_bm25_snapshot,
     score_shops_bm25,
     normalize_bm25_scores,
 )
 from llm_recommender import (
     build_user_taste_profile,
-    corpus_vocabulary_from_tokens,
     expand_pill_keywords,
     format_user_taste_prompt_block,
+    ground_expansion_keywords,
     grounding_check_enabled as llm_grounding_check_enabled,
     llm_rerank_candidates,
     pipeline_config as llm_pipeline_config,
@@ -81,7 +108,31 @@ from favorites_utils import (
     get_favorite_count,
 )
 from want_to_visit_utils import add_want_to_visit, remove_want_to_visit, get_user_want_to_visit, is_want_to_visit
-from db_backend import dict_from_row, get_connection
+from profile_store import (
+    corpus_revision,
+    get_shared_profile_store,
+    notify_profile_changed,
+    profile_store_stats,
+)
+from recommendation_cache import PillResultCache, pill_cache_key, pipeline_fingerprint
+from single_flight import SingleFlight
+from pill_precompute import (
+    corpus_stamp,
+    corpus_stamp_enabled,
+    load_precomputed,
+    order_combinations,
+    pill_combinations,
+    precompute_combination,
+    precompute_combinations,
+    recent_feedback_preference_keys,
+)
+from db_backend import (
+    dict_from_row,
+    get_connection,
+    pool_stats as db_pool_stats,
+    sql_translation_cache_stats,
+    streaming_enabled as db_streaming_enabled,
+)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -93,6 +144,60 @@ COFIND_DEV_LLM_STRICT = os.getenv('COFIND_DEV_LLM_STRICT', 'false').strip().lowe
 # Modal quote summary: default deterministik (tanpa LLM per toko). Set true untuk LLM.
 COFIND_MODAL_QUOTE_LLM = os.getenv('COFIND_MODAL_QUOTE_LLM', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
 COFIND_RECOMMEND_VERBOSE = os.getenv('COFIND_RECOMMEND_VERBOSE', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+# Hanya K toko teratas BM25 (retrieval MaxScore) yang masuk scoring hybrid + evidence. 0 = semua toko.
+COFIND_BM25_TOP_K = max(0, int(os.getenv('COFIND_BM25_TOP_K', '50') or 0))
+# bm25f = review + fasilitas + pros komunitas dinilai sebagai field terpisah (boost per field).
+COFIND_BM25_MODE = 'bm25f' if os.getenv('COFIND_BM25_MODE', 'bm25').strip().lower() == 'bm25f' else 'bm25'
+COFIND_BM25_FIELDS = DEFAULT_BM25F_FIELDS if COFIND_BM25_MODE == 'bm25f' else None
+# File snapshot indeks BM25 (mmap) yang dibagi antar worker. Kosong = tiap proses bangun sendiri.
+COFIND_BM25_SNAPSHOT_PATH = os.getenv('COFIND_BM25_SNAPSHOT_PATH', '').strip()
+# Sync penuh indeks BM25 dengan profil hanya saat versi korpus berubah; batas umur ini
+# menangkap perubahan di luar hook tulis (SQL manual). 0 = tanpa batas umur.
+COFIND_BM25_FULL_SYNC_SECONDS = max(0.0, float(os.getenv('COFIND_BM25_FULL_SYNC_SECONDS', '600') or 0))
+# Boost frasa/kedekatan di atas skor BM25 ternormalisasi (0 = nonaktif) dan lebar jendelanya.
+COFIND_BM25_PHRASE_BOOST = max(0.0, float(os.getenv('COFIND_BM25_PHRASE_BOOST', '0') or 0))
+COFIND_BM25_PROXIMITY_WINDOW = max(2, int(os.getenv('COFIND_BM25_PROXIMITY_WINDOW', '5') or 5))
+# Jumlah proses untuk tokenisasi batch saat sync korpus BM25 besar (0/1 = serial di proses ini).
+COFIND_NORMALIZE_PROCESSES = max(0, int(os.getenv('COFIND_NORMALIZE_PROCESSES', '0') or 0))
+# LRU skor BM25 per kombinasi token query (0 = nonaktif).
+_bm25_score_cache = BM25ScoreCache(int(os.getenv('COFIND_BM25_SCORE_CACHE_SIZE', '256') or 0))
+# Profil toko ter-materialisasi (profile_store.py); false = bangun ulang tiap request.
+COFIND_PROFILE_STORE = os.getenv('COFIND_PROFILE_STORE', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+COFIND_PROFILE_STORE_TTL_SECONDS = max(0.0, float(os.getenv('COFIND_PROFILE_STORE_TTL_SECONDS', '600') or 0))
+# Jumlah rekomendasi yang dikirim ke client.
+MAX_RECOMMENDATIONS = 3
+# Cache hasil per kombinasi pill (recommendation_cache.py); 0 = nonaktif (lapisan bersama
+# dihitung ulang tiap request). Hasil bersama dihitung tanpa data user; personalisasi
+# (eksklusi feedback, rerank LLM dengan profil selera, boost favorit) diterapkan di atasnya.
+_pill_result_cache = PillResultCache(
+    int(os.getenv('COFIND_PILL_CACHE_SIZE', '128') or 0),
+    ttl_seconds=float(os.getenv('COFIND_PILL_CACHE_TTL_SECONDS', '900') or 0),
+)
+# Kandidat cadangan di hasil bersama untuk menutup toko yang dieksklusi feedback user.
+COFIND_PILL_CACHE_RESERVE = max(0, int(os.getenv('COFIND_PILL_CACHE_RESERVE', '3') or 0))
+_PILL_CACHE_MAX_RESULTS = MAX_RECOMMENDATIONS + COFIND_PILL_CACHE_RESERVE
+# Toko favorit user naik sejauh ini (posisi) di atas hasil bersama; 0 = tanpa boost.
+COFIND_PILL_FAVORITE_RANK_BOOST = max(0, int(os.getenv('COFIND_PILL_FAVORITE_RANK_BOOST', '1') or 0))
+# Rerank LLM per user (profil selera) atas kandidat hasil bersama; satu panggilan rerank
+# kecil per request user yang punya histori, tanpa BM25/evidence/ringkasan ulang.
+COFIND_PILL_PERSONAL_RERANK = os.getenv('COFIND_PILL_PERSONAL_RERANK', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# Baca hasil prakomputasi pill (pill_precompute.py) saat cache memori miss.
+COFIND_PILL_PRECOMPUTED = os.getenv('COFIND_PILL_PRECOMPUTED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# Request pill identik yang bersamaan menunggu satu komputasi (single_flight.py);
+# _REDIS = juga lintas worker lewat lock Redis.
+COFIND_SINGLE_FLIGHT = os.getenv('COFIND_SINGLE_FLIGHT', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+COFIND_SINGLE_FLIGHT_REDIS = os.getenv('COFIND_SINGLE_FLIGHT_REDIS', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+COFIND_SINGLE_FLIGHT_WAIT_SECONDS = max(0.0, float(os.getenv('COFIND_SINGLE_FLIGHT_WAIT_SECONDS', '120') or 0))
+# Thread pool tahap LLM/IO pipeline rekomendasi yang saling independen (ekspansi keyword
+# dan konteks user paralel dengan load profil). 1 = serial seperti semula.
+COFIND_LLM_PARALLELISM = max(1, int(os.getenv('COFIND_LLM_PARALLELISM', '4') or 1))
+# Opt-in: summary satu panggilan LLM per toko di thread pool (mulai lebih awal, bisa
+# di-stream) alih-alih satu prompt batch. Biaya: prompt sistem + instruksi diulang tiap
+# toko, jadi jumlah panggilan dan token LLM naik kira-kira sebanyak jumlah toko yang
+# diringkas. Default false = satu prompt batch. Butuh COFIND_LLM_PARALLELISM > 1.
+COFIND_PARALLEL_SUMMARIES = os.getenv('COFIND_PARALLEL_SUMMARIES', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+# Stream teks summary per toko ke SSE (event summary_delta); butuh COFIND_PARALLEL_SUMMARIES.
+COFIND_STREAM_SUMMARIES = os.getenv('COFIND_STREAM_SUMMARIES', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
 
 
 try:
@@ -114,6 +219,14 @@ try:
 except Exception as _ps_err:
     print(f"[WARN] Inisialisasi preference_suggestions gagal: {_ps_err}")
 
+try:
+    if ensure_review_normalization_columns():
+        print("[INFO] Kolom normalisasi review siap.")
+        # Review lama / versi slang map basi dinormalisasi ulang lewat task Celery
+        # cofind.backfill_review_normalization atau `python review_utils.py`, bukan saat import.
+except Exception as _rn_err:
+    print(f"[WARN] Inisialisasi normalisasi review gagal: {_rn_err}")
+
 # Konfigurasi LLM: lihat llm_backend.py (HF_LLM_BACKEND, HF_MODEL, HF_API_TOKEN, dll.)
 print(f"[INFO] LLM backend aktif: {LLM_BACKEND} | model={HF_MODEL}")
 print("[INFO] Database backend: postgresql (Supabase)")
@@ -1368,6 +1481,7 @@ def admin_update_facility_entry(place_id):
 
         facilities_index[place_id] = entry
         _save_facilities_index(facilities_index)
+        notify_profile_changed(place_id, 'facilities')
 
         return jsonify({'status': 'success', 'message': 'Facilities JSON berhasil diperbarui'}), 200
     except Exception as e:
@@ -1479,6 +1593,7 @@ def admin_update_shop(place_id):
 
         conn.commit()
         conn.close()
+        notify_profile_changed(place_id, 'shop')
         return jsonify({'status': 'success', 'message': 'Coffee shop updated successfully'}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1510,6 +1625,8 @@ def admin_delete_shop(place_id):
 
         conn.commit()
         conn.close()
+        bm25_notify_place_deleted(place_id)
+        notify_profile_changed(place_id)
         return jsonify({'status': 'success', 'message': 'Coffee shop deleted successfully'}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1733,6 +1850,7 @@ def admin_delete_review(review_id):
         conn = get_connection()
         cursor = conn.cursor()
 
+        review_row = cursor.execute('SELECT place_id FROM reviews WHERE id = ?', (review_id,)).fetchone()
         cursor.execute('DELETE FROM review_likes WHERE review_id = ?', (review_id,))
         cursor.execute('DELETE FROM review_photos WHERE review_id = ?', (review_id,))
         cursor.execute('DELETE FROM review_reports WHERE review_id = ?', (review_id,))
@@ -1740,6 +1858,8 @@ def admin_delete_review(review_id):
 
         conn.commit()
         conn.close()
+        if review_row:
+            notify_profile_changed(review_row[0], 'reviews')
         return jsonify({'status': 'success', 'message': 'Review deleted successfully'}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -2612,6 +2732,7 @@ def _parse_llm_json_with_repair(raw_text, *, expected='any', model=None):
             max_tokens=320,
             temperature=0.0,
             top_p=0.9,
+            cache_site='json_repair',
         )
         repaired_candidate = _extract_json_candidate(repaired, expected=expected)
         try:
@@ -2631,13 +2752,14 @@ def _llm_model_id():
     return (HF_MODEL or "meta-llama/Meta-Llama-3-8B").strip()
 
 
-def _llm_chat_for_pipeline(*, messages, max_tokens, temperature):
+def _llm_chat_for_pipeline(*, messages, max_tokens, temperature, cache_site='pipeline'):
     """Adapter chat completion untuk tahap keputusan LLM di llm_recommender."""
     return llm_chat_completions_create(
         model=_llm_model_id(),
         messages=messages,
         max_tokens=max_tokens,
         temperature=temperature,
+        cache_site=cache_site,
     )
 
 
@@ -3256,6 +3378,7 @@ Output JSON:"""
                 max_new_tokens=2048,
                 temperature=0.2,
                 return_full_text=False,
+                cache_site='review_analysis',
             )
             generated_text = (generated_text or '').strip()
             break
@@ -3978,10 +4101,55 @@ def _profile_from_shop_and_reviews(shop_data, reviews, facilities_index=None):
     }
 
 
+def _iter_recommendation_review_groups(place_ids):
+    """
+    Yield (place_id, reviews) untuk pembangunan profil.
+    COFIND_DB_STREAM_RESULTS=true: baris dibaca lewat server-side cursor per toko;
+    selain itu satu query batch. Keduanya fallback ke get_reviews_for_shop per toko.
+    """
+    if db_streaming_enabled():
+        yielded = set()
+        try:
+            for pid, reviews in iter_reviews_for_recommendation_batch(place_ids):
+                yielded.add(pid)
+                yield pid, reviews
+            return
+        except Exception as stream_err:
+            print(
+                f"[RECOMMEND] Streaming reviews gagal: {stream_err}; "
+                "fallback per-shop get_reviews_for_shop",
+                flush=True,
+            )
+        for pid in place_ids:
+            if pid in yielded:
+                continue
+            one = get_reviews_for_shop(pid, limit=None)
+            yield pid, (one.get('reviews', []) if one.get('success') else [])
+        return
+
+    reviews_result = get_reviews_for_recommendation_batch(place_ids)
+    reviews_by_place = reviews_result.get('by_place') or {}
+    if not reviews_result.get('success'):
+        print(
+            f"[RECOMMEND] Batch reviews gagal: {reviews_result.get('error')}; "
+            "fallback per-shop get_reviews_for_shop",
+            flush=True,
+        )
+        reviews_by_place = {}
+        for pid in place_ids:
+            one = get_reviews_for_shop(pid, limit=None)
+            reviews_by_place[pid] = one.get('reviews', []) if one.get('success') else []
+    for pid in place_ids:
+        yield pid, reviews_by_place.get(pid) or []
+
+
 def _build_profiles_for_recommendation(place_ids, facilities_index=None, excluded_place_ids=None):
     """
     Batch-load profil rekomendasi:
-      1 query coffee_shops + 1 query reviews lean (tanpa foto/like).
+      1 query coffee_shops + 1 query reviews lean (tanpa foto/like), atau
+      server-side cursor bila COFIND_DB_STREAM_RESULTS aktif.
+    COFIND_PROFILE_STORE aktif (dan facilities_index tidak diberikan): dibaca dari
+    profile store; profil dibagi antar request, jangan dimutasi.
     Return: (profiles, shops_without_reviews)
     """
     excluded = set(excluded_place_ids or set())
@@ -3989,37 +4157,34 @@ def _build_profiles_for_recommendation(place_ids, facilities_index=None, exclude
     if not target_ids:
         return [], []
 
+    if facilities_index is None and COFIND_PROFILE_STORE:
+        # Profil ter-materialisasi: hanya bagian yang di-invalidasi hook tulis yang dimuat ulang.
+        by_place = _recommendation_profile_store().get_profiles(target_ids)
+        profiles = []
+        shops_without_reviews = []
+        for pid in target_ids:
+            profile = by_place.get(str(pid))
+            if not profile:
+                continue
+            if profile['review_count'] < REVIEW_BASED_MIN_REVIEWS:
+                shops_without_reviews.append(pid)
+                continue
+            profiles.append(profile)
+        return profiles, shops_without_reviews
+
     if facilities_index is None:
         facilities_index = _load_facilities_index()
 
-    shops_by_id = {}
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        placeholders = ','.join('?' * len(target_ids))
-        rows = cur.execute(
-            f"SELECT place_id, name, rating, total_reviews FROM coffee_shops WHERE place_id IN ({placeholders})",
-            target_ids,
-        ).fetchall()
-        for row in rows:
-            shop = dict_from_row(cur, row)
-            if shop and shop.get('place_id'):
-                shops_by_id[shop['place_id']] = shop
-    finally:
-        conn.close()
+    shops_by_id = _load_shop_rows(target_ids)
 
-    reviews_result = get_reviews_for_recommendation_batch(list(shops_by_id.keys()))
-    reviews_by_place = reviews_result.get('by_place') or {}
-    if not reviews_result.get('success'):
-        print(
-            f"[RECOMMEND] Batch reviews gagal: {reviews_result.get('error')}; "
-            "fallback per-shop get_reviews_for_shop",
-            flush=True,
-        )
-        reviews_by_place = {}
-        for pid in shops_by_id:
-            one = get_reviews_for_shop(pid, limit=None)
-            reviews_by_place[pid] = one.get('reviews', []) if one.get('success') else []
+    profiles_by_place = {}
+    for pid, reviews in _iter_recommendation_review_groups(list(shops_by_id.keys())):
+        shop_data = shops_by_id.get(pid)
+        if not shop_data:
+            continue
+        profile = _profile_from_shop_and_reviews(shop_data, reviews, facilities_index=facilities_index)
+        if profile:
+            profiles_by_place[pid] = profile
 
     profiles = []
     shops_without_reviews = []
@@ -4027,8 +4192,9 @@ def _build_profiles_for_recommendation(place_ids, facilities_index=None, exclude
         shop_data = shops_by_id.get(pid)
         if not shop_data:
             continue
-        reviews = reviews_by_place.get(pid) or []
-        profile = _profile_from_shop_and_reviews(shop_data, reviews, facilities_index=facilities_index)
+        profile = profiles_by_place.get(pid)
+        if profile is None:
+            profile = _profile_from_shop_and_reviews(shop_data, [], facilities_index=facilities_index)
         if not profile:
             continue
         if profile['review_count'] < REVIEW_BASED_MIN_REVIEWS:
@@ -4042,19 +4208,144 @@ def _build_profiles_for_recommendation(place_ids, facilities_index=None, exclude
         pros_by_place = get_top_voted_pros_batch(community_ids, limit=3)
         for profile in profiles:
             pid = profile.get('place_id')
-            vote = vote_by_place.get(pid) or {}
-            profile['community_signals'] = {
-                'vote': {
-                    'total_votes': vote.get('total_votes') or 0,
-                    'rating_counts': vote.get('rating_counts') or {},
-                    'best_for_counts': vote.get('best_for_counts') or {},
-                    'slider_averages': vote.get('slider_averages') or {},
-                },
-                'top_pros': pros_by_place.get(pid) or [],
-            }
+            profile['community_signals'] = _community_signals(vote_by_place.get(pid), pros_by_place.get(pid))
     return profiles, shops_without_reviews
 
 
+def _community_signals(vote, top_pros):
+    vote = vote or {}
+    return {
+        'vote': {
+            'total_votes': vote.get('total_votes') or 0,
+            'rating_counts': vote.get('rating_counts') or {},
+            'best_for_counts': vote.get('best_for_counts') or {},
+            'slider_averages': vote.get('slider_averages') or {},
+        },
+        'top_pros': top_pros or [],
+    }
+
+
+def _load_shop_rows(place_ids):
+    shops_by_id = {}
+    if not place_ids:
+        return shops_by_id
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        placeholders = ','.join('?' * len(place_ids))
+        rows = cur.execute(
+            f"SELECT place_id, name, rating, total_reviews FROM coffee_shops WHERE place_id IN ({placeholders})",
+            list(place_ids),
+        ).fetchall()
+        for row in rows:
+            shop = dict_from_row(cur, row)
+            if shop and shop.get('place_id'):
+                shops_by_id[shop['place_id']] = shop
+    finally:
+        conn.close()
+    return shops_by_id
+
+
+def _load_facilities_entries(place_ids):
+    facilities_index = _load_facilities_index()
+    return {pid: facilities_index.get(pid) for pid in place_ids}
+
+
+def _assemble_recommendation_profile(place_id, parts):
+    """Rakit profil dari bagian profile store; sama dengan jalur batch non-store."""
+    shop_data = parts.get('shop')
+    if not shop_data:
+        return None
+    profile = _profile_from_shop_and_reviews(
+        shop_data,
+        parts.get('reviews') or [],
+        facilities_index={place_id: parts.get('facilities') or {}},
+    )
+    if profile:
+        profile['community_signals'] = _community_signals(parts.get('votes'), parts.get('pros'))
+    return profile
+
+
+def _recommendation_profile_store():
+    return get_shared_profile_store(
+        {
+            'shop': _load_shop_rows,
+            'reviews': lambda pids: dict(_iter_recommendation_review_groups(pids)),
+            'facilities': _load_facilities_entries,
+            'votes': lambda pids: get_vote_summaries_batch(pids, include_review_stars=False),
+            'pros': lambda pids: get_top_voted_pros_batch(pids, limit=3),
+        },
+        _assemble_recommendation_profile,
+        ttl_seconds=COFIND_PROFILE_STORE_TTL_SECONDS,
+    )
+
+
+_pill_single_flight = None
+_pill_single_flight_lock = threading.Lock()
+
+
+def _recommendation_single_flight():
+    """SingleFlight bersama per proses untuk lapisan pill (None bila COFIND_SINGLE_FLIGHT=false)."""
+    global _pill_single_flight
+    if not COFIND_SINGLE_FLIGHT:
+        return None
+    with _pill_single_flight_lock:
+        if _pill_single_flight is None:
+            redis_client = None
+            if COFIND_SINGLE_FLIGHT_REDIS:
+                try:
+                    from redis_utils import redis_from_url
+                    redis_client = redis_from_url(socket_connect_timeout=1.0, socket_timeout=1.0)
+                except Exception as e:
+                    print(f"[WARN] Single-flight Redis tidak tersedia ({e}); koordinasi hanya lokal.")
+            _pill_single_flight = SingleFlight(
+                redis_client=redis_client,
+                lock_ttl_seconds=COFIND_SINGLE_FLIGHT_WAIT_SECONDS + 60,
+                wait_timeout_seconds=COFIND_SINGLE_FLIGHT_WAIT_SECONDS,
+            )
+        return _pill_single_flight
+
+
+_llm_stage_pool = None
+_llm_stage_pool_lock = threading.Lock()
+
+
+def _llm_stage_executor():
+    """Thread pool bersama tahap pipeline yang bisa tumpang-tindih (None = serial)."""
+    global _llm_stage_pool
+    if COFIND_LLM_PARALLELISM <= 1:
+        return None
+    with _llm_stage_pool_lock:
+        if _llm_stage_pool is None:
+            _llm_stage_pool = ThreadPoolExecutor(
+                max_workers=COFIND_LLM_PARALLELISM,
+                thread_name_prefix='cofind-llm',
+            )
+        return _llm_stage_pool
+
+
+def _submit_pipeline_stage(fn, *args, **kwargs):
+    """
+    Jalankan fn di thread pool (atau langsung bila serial). Future menghasilkan
+    (hasil, busy_ms) supaya pemanggil bisa menjumlah waktu kerja di samping wall-clock.
+    Konteks (contextvars) pemanggil ikut dibawa, mis. akumulator tunggu antrean LLM.
+    """
+    def _timed():
+        started = time.perf_counter()
+        value = fn(*args, **kwargs)
+        return value, round((time.perf_counter() - started) * 1000, 1)
+
+    executor = _llm_stage_executor()
+    if executor is not None:
+        return executor.submit(contextvars.copy_context().run, _timed)
+    future = Future()
+    try:
+        future.set_result(_timed())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
 def _load_all_place_ids():
     """Return list of all place_ids dari database (tabel coffee_shops)."""
     place_ids = []
@@ -4077,31 +4368,32 @@ def _has_semantic_family_signal(review_text):
     if not normalized:
         return False, None
 
-    direct_patterns = [
-        'orang sayang',
-        'orang tersayang',
-        'family friendly',
-        'ramah keluarga',
-        'cocok keluarga',
-        'bawa anak',
-        'anak-anak',
-        'quality time',
-    ]
-    for pattern in direct_patterns:
-        if _matches_keyword_phrase(normalized, pattern):
-            return True, pattern
-
-    together_patterns = ['berkumpul', 'kumpul', 'kebersamaan', 'quality time', 'bersama']
-    close_people_patterns = ['orang sayang', 'orang tersayang', 'keluarga', 'family', 'anak', 'pasangan']
+    direct = _match_keyword_phrases(normalized, _FAMILY_DIRECT_PATTERNS)
+    if direct:
+        return True, direct[0]
 
-    if any(_matches_keyword_phrase(normalized, a) for a in together_patterns) and any(
-        _matches_keyword_phrase(normalized, b) for b in close_people_patterns
+    if _match_keyword_phrases(normalized, _FAMILY_TOGETHER_PATTERNS) and _match_keyword_phrases(
+        normalized, _FAMILY_CLOSE_PEOPLE_PATTERNS
     ):
         return True, 'kebersamaan dengan orang terdekat'
 
     return False, None
 
 
+_FAMILY_DIRECT_PATTERNS = (
+    'orang sayang',
+    'orang tersayang',
+    'family friendly',
+    'ramah keluarga',
+    'cocok keluarga',
+    'bawa anak',
+    'anak-anak',
+    'quality time',
+)
+_FAMILY_TOGETHER_PATTERNS = ('berkumpul', 'kumpul', 'kebersamaan', 'quality time', 'bersama')
+_FAMILY_CLOSE_PEOPLE_PATTERNS = ('orang sayang', 'orang tersayang', 'keluarga', 'family', 'anak', 'pasangan')
+
+
 # Normalisasi frasa: domain coffee shop + kamus slang (slang_normalize.py).
 # Alias tetap ada agar referensi lama tidak putus.
 _TEXT_CANONICAL_REPLACEMENTS = DOMAIN_CANONICAL_REPLACEMENTS
@@ -4133,51 +4425,78 @@ def _keyword_variants(value):
     return variants
 
 
-# Imbuhan Indonesia yang boleh menempel pada kata kunci (anaknya, ngegame, berkeluarga).
-# Bukan substring bebas: "anak" di dalam "pontianak" atau "story" di dalam "history" tidak lolos.
-_ID_AFFIX_SUFFIXES = ('nya', 'lah', 'kah', 'pun', 'ku', 'mu', 'kan', 'an', 'i')
-_ID_AFFIX_PREFIXES = ('ber', 'me', 'di', 'ter', 'se', 'pe', 'per', 'ke', 'nge', 'ng')
+def _token_matches_keyword_token(token, keyword):
+    """
+    True jika token adalah kata kunci utuh, plus imbuhan wajar — bukan potongan di tengah kata lain.
+    Lemma token dihitung sekali (token_lemmas, di-cache) sehingga cek ini cukup lookup.
+    """
+    kw = str(keyword or '').strip().lower()
+    return bool(kw) and kw in token_lemmas(token)
 
 
-def _strip_match_token(token):
-    return re.sub(r'^[^\w]+|[^\w]+$', '', str(token or '').lower(), flags=re.UNICODE)
+def _review_match_tokens(review):
+    """
+    (token ter-normalisasi, tabel lemma) satu review untuk pencocokan kata kunci.
+    Memakai hasil normalisasi + lemma tersimpan bila ada; tabel None = hitung via token_lemmas.
+    """
+    if isinstance(review, dict):
+        text = (review.get('text') or '').strip()
+        stored = review.get('text_normalized')
+        if stored is not None and text:
+            return stored.split(), review.get('token_lemmas')
+    else:
+        text = str(review or '').strip()
+    return (_normalize_keyword_phrase(text).split() if text else []), None
 
 
-def _token_matches_keyword_token(token, keyword):
-    """True jika token adalah kata kunci utuh, plus imbuhan wajar — bukan potongan di tengah kata lain."""
-    tok = _strip_match_token(token)
-    kw = str(keyword or '').strip().lower()
-    if not tok or not kw:
-        return False
-    if '-' in tok:
-        return any(_token_matches_keyword_token(part, kw) for part in tok.split('-') if part)
-    if tok == kw:
-        return True
-    if len(kw) <= 3:
-        return False
-    for suf in _ID_AFFIX_SUFFIXES:
-        if tok == kw + suf:
-            return True
-    for pre in _ID_AFFIX_PREFIXES:
-        if tok == pre + kw:
-            return True
-        for suf in _ID_AFFIX_SUFFIXES:
-            if tok == pre + kw + suf:
-                return True
-    return False
+def _build_review_phrase_index(reviews):
+    """
+    PhraseIndex atas token review ter-normalisasi (dokumen ke-i = review ke-i).
+    _match_review_phrases() di indeks ini setara _matches_keyword_phrase per review, tapi
+    tiap review cukup dinormalisasi sekali untuk semua keyword.
+    """
+    docs, tables = [], []
+    for review in reviews or []:
+        tokens, table = _review_match_tokens(review)
+        docs.append(tokens)
+        tables.append(table)
+    return PhraseIndex(docs, lemma_fn=token_lemmas, docs_lemmas=tables)
 
 
-def _find_keyword_token_spans(tokens, keyword_variant):
-    """Span indeks token inklusif tempat frasa kunci cocok sebagai kata, bukan substring."""
-    found = set()
-    kw_tokens = [t for t in str(keyword_variant or '').split() if t]
-    if not tokens or not kw_tokens:
-        return found
-    n = len(kw_tokens)
-    for i in range(0, len(tokens) - n + 1):
-        if all(_token_matches_keyword_token(tokens[i + j], kw_tokens[j]) for j in range(n)):
-            found.add((i, i + n - 1))
-    return found
+def _match_review_phrases(phrase_index, keywords):
+    """
+    doc_id -> keyword (urutan input) yang cocok per review, lewat matcher terkompilasi
+    yang sama dengan _match_keyword_phrases (satu pindaian per review untuk semua keyword).
+    """
+    keywords = tuple(keywords or ())
+    if not keywords:
+        return {}
+    return phrase_index.match_phrases(keywords, matcher=_compiled_keyword_matcher(keywords))
+
+
+@lru_cache(maxsize=1024)
+def _compiled_keyword_matcher(keywords):
+    """
+    KeywordPhraseMatcher untuk satu tuple keyword (imbuhan lewat token_lemmas).
+    Di-cache: set keyword pill/ekspansi yang sama dipakai ulang lintas review dan request.
+    """
+    return KeywordPhraseMatcher(
+        keywords,
+        normalize_fn=_normalize_keyword_phrase,
+        lemma_fn=token_lemmas,
+    )
+
+
+def _match_keyword_phrases(text, keywords):
+    """
+    Keyword (urutan input) yang cocok sebagai kata/frasa di text — satu pindaian untuk
+    semua keyword, hasilnya sama dengan _matches_keyword_phrase per keyword.
+    """
+    keywords = tuple(keywords or ())
+    if not keywords or not text:
+        return []
+    matcher = _compiled_keyword_matcher(keywords)
+    return matcher.matched_keywords(matcher.match_text(text))
 
 
 def _matches_keyword_phrase(text, keyword):
@@ -4186,20 +4505,7 @@ def _matches_keyword_phrase(text, keyword):
     Contoh: 'anak' cocok di 'bawa anak', tidak cocok di 'Pontianak'.
     Berlaku untuk semua konteks pill, bukan hanya keluarga.
     """
-    normalized_text = _normalize_keyword_phrase(text)
-    if not normalized_text:
-        return False
-    tokens = normalized_text.split()
-    stemmed_text = _stem_indonesian_text(normalized_text)
-    stem_tokens = stemmed_text.split() if stemmed_text else []
-    for variant in _keyword_variants(keyword):
-        if not variant:
-            continue
-        if _find_keyword_token_spans(tokens, variant):
-            return True
-        if stem_tokens and _find_keyword_token_spans(stem_tokens, variant):
-            return True
-    return False
+    return bool(_match_keyword_phrases(text, (keyword,)))
 
 
 # Tokens stopword sederhana untuk text-overlap / keyword expansion.
@@ -4276,104 +4582,53 @@ _REVIEW_WEAKNESS_FRAGMENTS_SORTED = tuple(
 )
 
 
-def _split_tokens_with_spans(line):
-    """Token whitespace + span karakter inklusif [start, end) di line."""
-    if not line:
-        return [], []
-    tokens = []
-    spans = []
-    offset = 0
-    for chunk in line.split(' '):
-        if not chunk:
-            continue
-        idx = line.find(chunk, offset)
-        if idx < 0:
-            idx = line.index(chunk)
-        tokens.append(chunk)
-        spans.append((idx, idx + len(chunk)))
-        offset = idx + len(chunk) + 1
-    return tokens, spans
-
-
-def _collect_preference_anchor_spans_for_line(tokens, spans, line, preference_keywords):
-    """Span anchor di satu ruang token (normalized atau stem), tidak dicampur."""
-    found = set()
-    if not line or not tokens or not preference_keywords:
-        return found
-
-    for kw in preference_keywords:
-        for variant in _keyword_variants(kw):
-            if not variant:
-                continue
-            found.update(_find_keyword_token_spans(tokens, variant))
-    return found
-
-
-def _collect_weakness_token_spans(tokens, spans, line):
-    """Span token inklusif tempat fragmen kelemahan muncul di line ter-normalisasi."""
-    found = set()
-    if not line or not tokens:
-        return found
-    for frag in _REVIEW_WEAKNESS_FRAGMENTS_SORTED:
-        found.update(_find_keyword_token_spans(tokens, frag))
-    return found
+@lru_cache(maxsize=1)
+def _weakness_fragment_matcher():
+    """Matcher fragmen kelemahan (apa adanya, tidak dinormalisasi) atas token ter-normalisasi."""
+    return KeywordPhraseMatcher(_REVIEW_WEAKNESS_FRAGMENTS_SORTED, lemma_fn=token_lemmas)
 
 
-def _weakness_overlaps_anchor_window(weak_span, anchor_span, n_tokens, window):
-    if n_tokens <= 0:
-        return False
-    a0, a1 = anchor_span
-    w0, w1 = weak_span
-    zone_lo = max(0, a0 - window)
-    zone_hi = min(n_tokens - 1, a1 + window)
-    return not (w1 < zone_lo or w0 > zone_hi)
+@lru_cache(maxsize=20000)
+def _weakness_intervals(normalized_line):
+    """
+    Posisi semua fragmen kelemahan di satu review ter-normalisasi, dihitung sekali per
+    teks lalu dipakai ulang oleh setiap cek caveat (pill/keyword apa pun).
+    """
+    tokens = str(normalized_line or '').split()
+    matches = _weakness_fragment_matcher().match_tokens(tokens) if tokens else {}
+    return SpanIntervals((span for spans in matches.values() for span in spans), len(tokens))
 
 
-def _line_has_weakness_near_anchors(tokens, spans, line, stem_tokens, stem_spans, stem_line, preference_keywords, window):
-    """True jika ada fragmen kelemahan dalam ±window token dari blok keyword preferensi."""
-    if not preference_keywords:
-        return False
-    anchors_norm = _collect_preference_anchor_spans_for_line(tokens, spans, line, preference_keywords)
-    weak_norm = _collect_weakness_token_spans(tokens, spans, line)
-    n = len(tokens)
-    for anchor in anchors_norm:
-        for wsp in weak_norm:
-            if _weakness_overlaps_anchor_window(wsp, anchor, n, window):
-                return True
-    if stem_line and stem_tokens:
-        anchors_stem = _collect_preference_anchor_spans_for_line(
-            stem_tokens, stem_spans, stem_line, preference_keywords
-        )
-        weak_stem = _collect_weakness_token_spans(stem_tokens, stem_spans, stem_line)
-        n_st = len(stem_tokens)
-        for anchor in anchors_stem:
-            for wsp in weak_stem:
-                if _weakness_overlaps_anchor_window(wsp, anchor, n_st, window):
-                    return True
-    return False
+def _preference_anchor_spans(tokens, preference_keywords, lemmas=None):
+    """Span token tempat keyword preferensi (frasa utuh, ter-normalisasi) muncul."""
+    keywords = tuple(preference_keywords or ())
+    if not keywords or not tokens:
+        return []
+    matches = _compiled_keyword_matcher(keywords).match_tokens(tokens, lemmas=lemmas)
+    return [span for spans in matches.values() for span in spans]
 
 
-def _review_has_weakness_near_preference_keywords(text, preference_keywords, window=None):
+def _review_has_weakness_near_preference_keywords(text, preference_keywords, window=None, *, normalized_line=None, anchor_spans=None):
     """
     Kelemahan terhadap preferensi: fragmen _REVIEW_WEAKNESS_FRAGMENTS dalam jendela
     gabungan (maks window token sebelum blok keyword + maks window sesudah),
     dengan blok = frasa utuh dari pill / review_keywords (atau search_keywords).
+    normalized_line / anchor_spans: hasil yang sudah dihitung pemanggil (dipakai ulang).
     """
     if window is None:
         window = _PREFERENCE_WEAKNESS_TOKEN_WINDOW
     if not preference_keywords:
         return False
-    normalized_line = _normalize_keyword_phrase(text)
+    if normalized_line is None:
+        normalized_line = _normalize_keyword_phrase(text)
     if not normalized_line:
         return False
-    stem_line = _stem_indonesian_text(normalized_line)
-    tokens, spans = _split_tokens_with_spans(normalized_line)
-    stem_tokens, stem_spans = _split_tokens_with_spans(stem_line) if stem_line else ([], [])
-    return _line_has_weakness_near_anchors(
-        tokens, spans, normalized_line,
-        stem_tokens, stem_spans, stem_line,
-        preference_keywords, window,
-    )
+    weak = _weakness_intervals(normalized_line)
+    if not weak:
+        return False
+    if anchor_spans is None:
+        anchor_spans = _preference_anchor_spans(normalized_line.split(), preference_keywords)
+    return weak.near_any(anchor_spans, window)
 
 
 def _expand_pill_to_keywords(pill):
@@ -4724,22 +4979,27 @@ def _preference_keywords_for_evidence(pills, search_keywords=None):
     return _filter_overbroad_meeting_keywords(list(dict.fromkeys(out)), pills)
 
 
-def _quote_is_caveat(quote_text, preference_keywords):
+def _quote_is_caveat(quote_text, preference_keywords, *, normalized=None, anchor_spans=None):
     """
     True bila kutipan mengandung keluhan yang menempel pada konteks preferensi.
     Kutipan seperti ini tidak boleh dipakai sebagai bukti kecocokan, tapi tetap
     layak ditampilkan sebagai catatan jujur.
+    normalized / anchor_spans: teks ter-normalisasi dan span keyword preferensi bila
+    pemanggil sudah punya (review tersimpan), agar cek ini cukup irisan interval.
     """
     text = str(quote_text or '')
     if len(text.strip()) < 10:
         return False
-    normalized = _normalize_keyword_phrase(text)
+    if normalized is None:
+        normalized = _normalize_keyword_phrase(text)
     # "kurang cocok / tidak disarankan" tidak pernah jadi bukti pendukung,
     # meski keyword pill tidak ada di kalimat yang sama.
     if normalized and any(phrase in normalized for phrase in _UNSUITABILITY_PHRASES):
         return True
     if preference_keywords:
-        return _review_has_weakness_near_preference_keywords(text, preference_keywords)
+        return _review_has_weakness_near_preference_keywords(
+            text, preference_keywords, normalized_line=normalized, anchor_spans=anchor_spans
+        )
     return _review_has_weakness_signal(text)
 
 
@@ -4971,8 +5231,12 @@ def _weakness_quote_lines_for_prompt(evidence, *, limit=2, char_limit=220):
     return lines
 
 
-def _community_score_from_signals(signals, pills):
-    """Skor 0..1 dari agregat vote/overall/best-for/pros. None jika tidak ada data."""
+def _community_score_from_signals(signals, pills, *, bm25f_fields=False):
+    """
+    Skor 0..1 dari agregat vote/overall/best-for/pros. None jika tidak ada data.
+    bm25f_fields=True: bagian best-for dan pros dilewati karena sinyal yang sama sudah
+    masuk skor BM25F lewat field 'facilities' (Populer untuk) dan 'pros'.
+    """
     data = signals or {}
     vote = data.get('vote') or {}
     rating_counts = vote.get('rating_counts') or {}
@@ -5005,13 +5269,13 @@ def _community_score_from_signals(signals, pills):
     best_for_counts = vote.get('best_for_counts') or {}
     mapped_tags = [PILL_TO_BEST_FOR[p] for p in (pills or []) if p in PILL_TO_BEST_FOR]
     total_best = sum(int(v or 0) for v in best_for_counts.values())
-    if mapped_tags and total_best > 0:
+    if mapped_tags and total_best > 0 and not bm25f_fields:
         aligned = sum(int(best_for_counts.get(tag) or 0) for tag in mapped_tags)
         parts.append(min(1.0, aligned / float(total_best)))
         weights.append(0.20)
 
     pros = data.get('top_pros') or []
-    if pros:
+    if pros and not bm25f_fields:
         nets = [max(0, int(item.get('net') or 0)) for item in pros]
         avg_net = sum(nets) / max(1, len(nets))
         parts.append(min(1.0, avg_net / 8.0))
@@ -5242,6 +5506,7 @@ Kutipan ulasan paling relevan dengan konteks:
             ],
             max_tokens=220,
             temperature=0.4,
+            cache_site='modal_summary',
         )
         summary = _normalize_whitespace(str(raw or ''))
         if summary.startswith('```'):
@@ -5340,8 +5605,17 @@ def _pick_sentiment_review_quotes(reviews, pills=None, search_keywords=None, *,
         seen.add(key)
 
         rating = _review_rating_value(review)
-        has_weakness = _quote_is_caveat(text, preference_keywords)
-        matched_terms = [kw for kw in preference_keywords if _matches_keyword_phrase(text, kw)][:6]
+        # Satu pindaian keyword preferensi: dipakai untuk matched_terms sekaligus anchor caveat.
+        tokens, lemmas = _review_match_tokens(review)
+        matcher = _compiled_keyword_matcher(tuple(preference_keywords))
+        keyword_spans = matcher.match_tokens(tokens, lemmas=lemmas) if tokens else {}
+        has_weakness = _quote_is_caveat(
+            text,
+            preference_keywords,
+            normalized=' '.join(tokens),
+            anchor_spans=[span for spans in keyword_spans.values() for span in spans],
+        )
+        matched_terms = matcher.matched_keywords(keyword_spans)[:6]
         quote = {
             'quote': _truncate_evidence_text(text, _PROMPT_EVIDENCE_CHAR_LIMIT),
             'rating': review.get('rating'),
@@ -5387,19 +5661,25 @@ def _seed_search_keywords(valid_pills):
     )
 
 
-def _pick_keyword_matched_reviews(reviews, search_keywords, limit=3):
-    """Pilih review paling kuat berdasarkan search_keywords hasil ekspansi."""
+def _pick_keyword_matched_reviews(reviews, search_keywords, limit=3, phrase_index=None):
+    """
+    Pilih review paling kuat berdasarkan search_keywords hasil ekspansi.
+    phrase_index: hasil _build_review_phrase_index(reviews) bila sudah ada (dipakai ulang).
+    """
     keywords = _light_keyword_phrase_list(search_keywords or [])
     if not reviews or not keywords:
         return []
 
+    if phrase_index is None:
+        phrase_index = _build_review_phrase_index(reviews)
+    matches_by_review = _match_review_phrases(phrase_index, keywords)
     scored_reviews = []
     seen_quotes = set()
-    for review in reviews:
+    for idx, review in enumerate(reviews):
         text = (review.get('text') or '').strip() if isinstance(review, dict) else str(review or '').strip()
         if len(text) < 15:
             continue
-        matched_terms = [kw for kw in keywords if _matches_keyword_phrase(text, kw)]
+        matched_terms = matches_by_review.get(idx) or []
         if not matched_terms:
             continue
         quote_key = _normalize_whitespace(text).lower()
@@ -5508,6 +5788,7 @@ def _score_shop_by_user_reviews(
             'avg_user_rating': profile.get('avg_user_rating'),
             'has_quote_evidence': False,
             'community_score': None,
+            'phrase_score': 0.0,
         }
 
     avg_user_rating = profile.get('avg_user_rating')
@@ -5517,18 +5798,21 @@ def _score_shop_by_user_reviews(
 
     per_pill_stats = {}
     keyword_scores = []
+    # Posisi token semua review dibangun sekali; semua pencocokan frasa di bawah lewat indeks ini.
+    phrase_index = _build_review_phrase_index(reviews)
 
     for pill in pills:
         keywords = _expand_pill_to_keywords(pill)
+        keyword_matches = _match_review_phrases(phrase_index, keywords)
         keyword_review_hits = 0
         sample_quotes = []
 
-        for review in reviews:
+        for idx, review in enumerate(reviews):
             text = (review.get('text') or '').strip()
             matched_terms = []
 
             if text:
-                matched_terms = [kw for kw in keywords if _matches_keyword_phrase(text, kw)]
+                matched_terms = list(keyword_matches.get(idx) or [])
                 if pill == 'keluarga' and not matched_terms:
                     has_family_signal, _ = _has_semantic_family_signal(text)
                     if has_family_signal:
@@ -5561,18 +5845,18 @@ def _score_shop_by_user_reviews(
     keyword_score_avg = sum(keyword_scores) / len(keyword_scores) if keyword_scores else 0.0
     category_score_avg, category_detail = _review_rating_category_scores(reviews, pills)
 
-    expanded_keyword_matches = _pick_keyword_matched_reviews(reviews, search_keywords, limit=3)
+    expanded_keyword_matches = _pick_keyword_matched_reviews(
+        reviews, search_keywords, limit=3, phrase_index=phrase_index
+    )
     llm_evidence_matches = (
-        _pick_keyword_matched_reviews(reviews, llm_preference_keywords, limit=5)
+        _pick_keyword_matched_reviews(reviews, llm_preference_keywords, limit=5, phrase_index=phrase_index)
         if llm_preference_keywords
         else []
     )
-    expanded_keyword_hits = 0
     if search_keywords:
-        for review in reviews:
-            text = (review.get('text') or '').strip()
-            if text and any(_matches_keyword_phrase(text, kw) for kw in search_keywords):
-                expanded_keyword_hits += 1
+        expanded_keyword_hits = len(
+            _match_review_phrases(phrase_index, search_keywords)
+        )
         expanded_keyword_score = min(1.0, expanded_keyword_hits / max(1, min(review_count, 5)))
     else:
         expanded_keyword_score = 0.0
@@ -5597,7 +5881,22 @@ def _score_shop_by_user_reviews(
     else:
         bm25_norm_val = max(0.0, min(1.0, bm25_norm_val))
 
-    community_score = _community_score_from_signals(profile.get('community_signals'), pills)
+    # Frasa pill/ekspansi yang muncul utuh (atau berdekatan) di review menambah relevansi BM25.
+    phrase_score = phrase_index.phrase_score(
+        [kw for pill in pills for kw in _expand_pill_to_keywords(pill)]
+        + list(search_keywords)
+        + list(llm_preference_keywords),
+        window=COFIND_BM25_PROXIMITY_WINDOW,
+        normalize_fn=_normalize_keyword_phrase,
+    )
+    if COFIND_BM25_PHRASE_BOOST > 0 and bm25_norm is not None:
+        bm25_norm_val = min(1.0, bm25_norm_val + COFIND_BM25_PHRASE_BOOST * phrase_score)
+
+    community_score = _community_score_from_signals(
+        profile.get('community_signals'),
+        pills,
+        bm25f_fields=COFIND_BM25_MODE == 'bm25f' and bm25_norm is not None,
+    )
     if community_score is not None:
         W_BM25, W_CATEGORY, W_RATING, W_COMMUNITY = 0.62, 0.16, 0.08, 0.14
         total = (
@@ -5656,6 +5955,7 @@ def _score_shop_by_user_reviews(
         'avg_user_rating': avg_user_rating,
         'has_quote_evidence': has_quote_evidence,
         'community_score': community_score,
+        'phrase_score': round(phrase_score, 4),
     }
 
 
@@ -5830,12 +6130,9 @@ def _pills_matching_review_text(text, pills):
     """Pill dari daftar pills yang punya minimal satu keyword cocok dengan teks review."""
     if not text or not pills:
         return set()
-    matched = set()
-    for pill in pills:
-        keywords = _expand_pill_to_keywords(pill)
-        if any(_matches_keyword_phrase(text, kw) for kw in keywords):
-            matched.add(pill)
-    return matched
+    keywords_by_pill = {pill: _expand_pill_to_keywords(pill) for pill in pills}
+    hits = set(_match_keyword_phrases(text, [kw for kws in keywords_by_pill.values() for kw in kws]))
+    return {pill for pill, keywords in keywords_by_pill.items() if any(kw in hits for kw in keywords)}
 
 
 def _topic_labels_for_shop_summary(pills, pill_stats, quote_text=None):
@@ -6050,24 +6347,30 @@ def _build_summary_output_entry(shop, summary, pills, search_keywords):
     }
 
 
-def _generate_llm_review_summary(top_shops, pills, search_keywords=None):
+def _generate_llm_review_summary(top_shops, pills, search_keywords=None, prefetched=None, use_llm=True):
     """
     NLP summary per shop dengan cache per (place_id + kombinasi pill + keyword ekspansi).
     Ringkasan ter-cache dipakai ulang (summary yang sama) sampai jumlah review
     coffee shop berubah atau keyword intent berbeda. Hanya shop tanpa cache valid
     yang dikirim ke LLM.
+    prefetched: {place_id: Future((summary, sumber), busy_ms)} dari _summary_for_shop
+    yang sudah berjalan paralel; toko lain diringkas dalam satu batch seperti biasa.
     Jika LLM tidak tersedia / gagal parse, pakai fallback deterministik.
+    use_llm=False: semua toko memakai ringkasan deterministik (tanpa cache/LLM).
     Shop tanpa kutipan relevan dibuang dari output.
     """
     if not top_shops:
         return []
 
     search_keywords = _light_keyword_phrase_list(search_keywords or [])
+    prefetched = prefetched or {}
 
     # 1) Pakai ulang ringkasan ter-cache (invalidasi otomatis saat review_count berubah).
     cached_summary_map = {}
     shops_to_generate = []
-    for shop in top_shops:
+    for shop in (top_shops if use_llm else []):
+        if shop['place_id'] in prefetched:
+            continue
         cached = _get_cached_recommendation_summary(
             shop['place_id'], pills, _summary_review_count_for_shop(shop),
             search_keywords=search_keywords,
@@ -6085,8 +6388,28 @@ def _generate_llm_review_summary(top_shops, pills, search_keywords=None):
     generated_summary_map = _llm_summaries_for_shops(
         shops_to_generate, pills, search_keywords,
     )
+    for shop in top_shops:
+        future = prefetched.get(shop['place_id'])
+        if future is None:
+            continue
+        try:
+            (summary, source), _ = future.result()
+        except Exception as e:
+            if COFIND_DEV_LLM_STRICT:
+                raise
+            print(f"[RECOMMEND] Summary paralel gagal untuk {shop.get('name')}: {e}", flush=True)
+            continue
+        if source == 'cache':
+            cached_summary_map[shop['place_id']] = summary
+        elif summary:
+            generated_summary_map[shop['place_id']] = summary
+            shops_to_generate.append(shop)
 
     # 3) Simpan ringkasan baru ke cache (per place_id + pill + keyword ekspansi).
+    # Saat circuit breaker LLM terbuka ringkasannya fallback deterministik: jangan
+    # di-cache supaya versi LLM dibuat lagi setelah router pulih.
+    if llm_is_configured() and not llm_is_available():
+        shops_to_generate = []
     _store_recommendation_summaries(
         [
             (
@@ -6267,8 +6590,62 @@ def _assign_llm_summaries_to_shops(parsed_items, top_shops):
     return assigned
 
 
-def _llm_summaries_for_shops(top_shops, pills, search_keywords=None):
-    """Kembalikan {place_id: summary} untuk shop yang diberikan (LLM atau fallback deterministik per toko)."""
+def _partial_json_string_field(raw, field='summary'):
+    """
+    Nilai string `field` dari JSON yang mungkin belum lengkap (respons LLM yang masih
+    di-stream). Berhenti di kutip penutup atau di escape yang belum utuh.
+    """
+    match = re.search(r'"' + re.escape(field) + r'"\s*:\s*"', raw or '')
+    if not match:
+        return ''
+    out = []
+    i = match.end()
+    escapes = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    while i < len(raw):
+        ch = raw[i]
+        if ch == '"':
+            break
+        if ch != '\\':
+            out.append(ch)
+            i += 1
+            continue
+        if i + 1 >= len(raw):
+            break
+        code = raw[i + 1]
+        if code == 'u':
+            hex_digits = raw[i + 2:i + 6]
+            if len(hex_digits) < 4:
+                break
+            try:
+                out.append(chr(int(hex_digits, 16)))
+            except ValueError:
+                pass
+            i += 6
+            continue
+        out.append(escapes.get(code, code))
+        i += 2
+    return ''.join(out)
+
+
+def _stream_summary_completion(*, on_delta, **kwargs):
+    """Chat completion streaming: teruskan delta field summary ke on_delta, kembalikan teks penuh."""
+    parts = []
+    emitted = ''
+    for delta in llm_chat_completions_stream(**kwargs):
+        parts.append(delta)
+        partial_summary = _partial_json_string_field(''.join(parts))
+        if len(partial_summary) > len(emitted):
+            on_delta(partial_summary[len(emitted):])
+            emitted = partial_summary
+    return ''.join(parts).strip()
+
+
+def _llm_summaries_for_shops(top_shops, pills, search_keywords=None, on_delta=None):
+    """
+    Kembalikan {place_id: summary} untuk shop yang diberikan (LLM atau fallback deterministik per toko).
+    on_delta(teks): respons LLM di-stream dan potongan teks summary (sebelum validasi)
+    diteruskan begitu tiba; hasil akhir tetap melewati validasi yang sama.
+    """
     if not top_shops:
         return {}
 
@@ -6423,7 +6800,10 @@ def _llm_summaries_for_shops(top_shops, pills, search_keywords=None):
     llm_t0 = time.perf_counter()
 
     try:
-        raw = llm_chat_completions_create(
+        summary_llm_call = llm_chat_completions_create
+        if on_delta is not None:
+            summary_llm_call = partial(_stream_summary_completion, on_delta=on_delta)
+        raw = summary_llm_call(
             model=(HF_MODEL or "meta-llama/Meta-Llama-3-8B").strip(),
             messages=[
                 {
@@ -6440,6 +6820,7 @@ def _llm_summaries_for_shops(top_shops, pills, search_keywords=None):
             ],
             max_tokens=900,
             temperature=0.2,
+            cache_site='recommendation_summary',
         )
         print(
             f"[RECOMMEND] Summary: LLM response diterima "
@@ -6540,6 +6921,746 @@ def _recommendation_progress(stage, **extra):
     return ('progress', payload)
 
 
+def _tokenize_review_batch(texts):
+    """Tokenisasi banyak review sekaligus untuk indeks BM25 (tanpa LRU per string)."""
+    return tokenize_texts(texts, processes=COFIND_NORMALIZE_PROCESSES)
+
+
+def _pill_result_events(
+    valid_pills,
+    stage_ms,
+    *,
+    excluded_place_ids=frozenset(),
+    user_taste_block='',
+    max_results=3,
+    use_llm=True,
+):
+    """
+    Lapisan hasil pill (Step 1-5): profil, BM25 + ekspansi keyword, scoring hybrid,
+    rerank, ringkasan. Generator: yield ('progress', payload) per tahap lalu `return`
+    dict hasil (dipakai lewat `yield from`):
+      {'error': (body, status)} bila gagal, selain itu search_keywords,
+      llm_preference_keywords, keyword_expansion, rerank, shortlisted, recommendations.
+    Tanpa eksklusi/taste user, hasilnya hanya bergantung pada pill + korpus + konfigurasi
+    sehingga bisa di-cache bersama (_pill_result_cache).
+    use_llm=False: tanpa ekspansi, rerank, dan ringkasan LLM (urutan hybrid + ringkasan
+    deterministik), dipakai prakomputasi offline.
+    """
+    stage_t0 = time.perf_counter()
+    # Query keywords: seed PILL_MAPPING; ekspansi LLM ditambahkan setelah korpus siap.
+    search_keywords = _seed_search_keywords(valid_pills)
+    stage_ms['keyword_seed_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    stage_t0 = time.perf_counter()
+    print(f"[RECOMMEND] Search keywords (seed pill): {search_keywords}")
+
+    all_place_ids = _load_all_place_ids()
+    if not all_place_ids:
+        return {'error': ({'status': 'error', 'message': 'Data coffee shop kosong.'}, 500)}
+
+    # Ekspansi keyword LLM tidak butuh korpus sampai validasi kosakata: dengan thread
+    # pool hanya panggilan LLM yang berjalan selama Step 1-2 (thread tidak menunggu
+    # korpus); validasi kosakata dilakukan di thread request setelah indeks siap.
+    expansion_future = None
+    if use_llm and llm_is_available() and _llm_stage_executor() is not None:
+        expansion_future = _submit_pipeline_stage(
+            _expand_pill_keywords_for_pipeline,
+            valid_pills,
+            search_keywords,
+            defer_grounding=True,
+        )
+    return (yield from _pill_result_stages(
+        valid_pills,
+        stage_ms,
+        search_keywords=search_keywords,
+        all_place_ids=all_place_ids,
+        stage_t0=stage_t0,
+        excluded_place_ids=excluded_place_ids,
+        user_taste_block=user_taste_block,
+        max_results=max_results,
+        expansion_future=expansion_future,
+        use_llm=use_llm,
+    ))
+
+
+def _expand_pill_keywords_for_pipeline(valid_pills, search_keywords, *, corpus_vocabulary=None, defer_grounding=False):
+    return expand_pill_keywords(
+        valid_pills,
+        pill_labels=PILL_LABELS,
+        pill_lexicon=search_keywords,
+        chat_fn=partial(_llm_chat_for_pipeline, cache_site='keyword_expansion'),
+        sanitize_keywords=_filter_negative_search_keywords,
+        corpus_vocabulary=corpus_vocabulary,
+        defer_grounding=defer_grounding,
+        parse_json_fn=_parse_llm_json_with_repair,
+    )
+
+
+def _summary_for_shop(shop, pills, search_keywords, on_delta=None):
+    """
+    Summary satu toko (cache dulu, lalu LLM): (summary, 'cache' | 'generated').
+    on_delta: teruskan potongan teks summary LLM yang di-stream (lihat _llm_summaries_for_shops).
+    """
+    search_keywords = _light_keyword_phrase_list(search_keywords or [])
+    cached = _get_cached_recommendation_summary(
+        shop['place_id'], pills, _summary_review_count_for_shop(shop),
+        search_keywords=search_keywords,
+    )
+    if cached:
+        return cached, 'cache'
+    summaries = _llm_summaries_for_shops([shop], pills, search_keywords, on_delta=on_delta)
+    return summaries.get(shop['place_id']), 'generated'
+
+
+def _bm25_sync_stamp(excluded_place_ids):
+    """
+    Versi korpus untuk sync_profiles: revisi lintas proses (corpus_state) + revisi hook
+    lokal/Redis + eksklusi (mengubah himpunan profil yang dimuat). None bila revisi lintas
+    proses tidak terbaca, sehingga indeks disinkronkan penuh.
+    """
+    stamp = corpus_stamp() if corpus_stamp_enabled() else 0
+    if stamp is None:
+        return None
+    return (stamp, corpus_revision(), frozenset(str(pid) for pid in excluded_place_ids or ()))
+
+
+def _pill_result_stages(
+    valid_pills,
+    stage_ms,
+    *,
+    search_keywords,
+    all_place_ids,
+    stage_t0,
+    excluded_place_ids,
+    user_taste_block,
+    max_results,
+    expansion_future,
+    use_llm=True,
+):
+    """Step 1-5 lapisan pill; lihat _pill_result_events."""
+    THRESHOLD = 0.05  # ambang minimal skor review-based
+    llm_preference_keywords = []
+    expansion_info = {}
+
+    # Versi korpus dibaca sebelum profil dimuat: indeks BM25 hanya disinkronkan penuh
+    # bila versi ini berubah (atau lewat COFIND_BM25_FULL_SYNC_SECONDS).
+    bm25_sync_stamp = _bm25_sync_stamp(excluded_place_ids)
+
+    # --- Step 1: Build profiles (batch DB) ---
+    print("[RECOMMEND] Step 1: batch load profil + reviews...", flush=True)
+    profiles, shops_without_reviews = _build_profiles_for_recommendation(
+        all_place_ids,
+        excluded_place_ids=excluded_place_ids,
+    )
+    print(
+        f"[RECOMMEND] Step 1 selesai: profiles={len(profiles)} "
+        f"tanpa_review={len(shops_without_reviews)}",
+        flush=True,
+    )
+    stage_ms['profile_load_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    profile_store_info = profile_store_stats() if COFIND_PROFILE_STORE else None
+    if profile_store_info:
+        stage_ms['profile_store_hit_rate'] = profile_store_info['hit_rate']
+    stage_t0 = time.perf_counter()
+    yield _recommendation_progress('profiles', shops_with_reviews=len(profiles))
+
+    # --- Step 2: BM25 index + ekspansi keyword LLM yang tervalidasi korpus ---
+    # Indeks bersama per proses: hanya review baru/berubah yang di-tokenisasi ulang.
+    bm25_raw_by_place = {}
+    bm25_norm_by_place = {}
+    bm25_place_ids, bm25_index = [], None
+    try:
+        bm25_index = get_shared_bm25_index(
+            tokenize_normalized,
+            snapshot_path=COFIND_BM25_SNAPSHOT_PATH or None,
+            batch_tokenize_fn=_tokenize_review_batch,
+        )
+        stage_ms['bm25_docs_synced'] = bm25_index.sync_profiles(
+            profiles,
+            keep_place_ids=excluded_place_ids,
+            stamp=bm25_sync_stamp,
+            max_age_seconds=COFIND_BM25_FULL_SYNC_SECONDS,
+        )
+        if COFIND_BM25_SNAPSHOT_PATH and stage_ms['bm25_docs_synced']:
+            publish_bm25_snapshot(bm25_index, COFIND_BM25_SNAPSHOT_PATH)
+        stage_ms['bm25_index_version'] = bm25_index.version
+        stage_ms['bm25_snapshot_generation'] = bm25_index.generation
+        bm25_place_ids = [p.get('place_id') for p in profiles if p.get('place_id')]
+    except Exception as bm25_err:
+        bm25_index = None
+        print(f"[RECOMMEND] BM25 gagal, fallback keyword scoring: {bm25_err}", flush=True)
+
+    corpus_vocabulary = bm25_index.vocabulary() if bm25_index is not None else None
+    if expansion_future is not None:
+        expansion_info = ground_expansion_keywords(expansion_future.result()[0], corpus_vocabulary)
+    elif use_llm and llm_is_available():
+        expansion_info = _expand_pill_keywords_for_pipeline(
+            valid_pills,
+            search_keywords,
+            corpus_vocabulary=corpus_vocabulary,
+        )
+    if expansion_info:
+        stage_ms['llm_keyword_expansion_busy_ms'] = expansion_info.get('latency_ms', 0.0)
+        llm_preference_keywords = _filter_overbroad_meeting_keywords(
+            expansion_info.get('keywords') or [],
+            valid_pills,
+        )
+        print(
+            f"[RECOMMEND] Ekspansi keyword LLM ({expansion_info.get('source')}): "
+            f"{llm_preference_keywords} "
+            f"(ditolak leksikon={expansion_info.get('rejected_lexicon')}, "
+            f"ditolak korpus={expansion_info.get('rejected_vocabulary')} "
+            f"contoh={expansion_info.get('rejected_vocabulary_sample')})",
+            flush=True,
+        )
+    stage_ms['llm_keyword_expansion_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    stage_t0 = time.perf_counter()
+    yield _recommendation_progress(
+        'keyword_expansion', keywords_added=len(llm_preference_keywords)
+    )
+
+    query_keywords = list(dict.fromkeys(list(search_keywords) + list(llm_preference_keywords)))
+    query_tokens = build_query_tokens(
+        valid_pills,
+        _expand_pill_to_keywords,
+        search_keywords=query_keywords,
+        tokenize_fn=tokenize_normalized,
+    )
+    # Toko di luar top-K BM25 tidak ikut scoring hybrid/evidence (None = semua toko).
+    bm25_candidate_ids = None
+    if bm25_index is not None:
+        bm25_cache_key = BM25ScoreCache.make_key(
+            bm25_index,
+            query_tokens,
+            bm25_place_ids,
+            fields=COFIND_BM25_FIELDS,
+            top_k=COFIND_BM25_TOP_K,
+        )
+        cached_scores = _bm25_score_cache.get(bm25_cache_key)
+        if cached_scores is not None:
+            bm25_raw_by_place, bm25_norm_by_place, bm25_candidate_ids, topk_docs_scored = cached_scores
+            if topk_docs_scored is not None:
+                stage_ms['bm25_topk_docs_scored'] = topk_docs_scored
+        else:
+            topk_docs_scored = None
+            if 0 < COFIND_BM25_TOP_K < len(bm25_place_ids):
+                retrieval = bm25_index.top_k(
+                    query_tokens, COFIND_BM25_TOP_K, place_ids=bm25_place_ids, fields=COFIND_BM25_FIELDS
+                )
+                # Top-K hanya dipakai bila benar-benar penuh dan skor minimum korpus diketahui;
+                # selain itu scoring penuh tetap murah dan hasilnya identik.
+                if len(retrieval['results']) >= COFIND_BM25_TOP_K and retrieval['floor'] is not None:
+                    bm25_raw_by_place = dict(retrieval['results'])
+                    bm25_norm_by_place = normalize_bm25_scores(bm25_raw_by_place, floor=retrieval['floor'])
+                    bm25_candidate_ids = frozenset(bm25_raw_by_place)
+                    topk_docs_scored = retrieval['docs_scored']
+                    stage_ms['bm25_topk_docs_scored'] = topk_docs_scored
+            if bm25_candidate_ids is None:
+                bm25_raw_by_place = score_shops_bm25(
+                    bm25_place_ids, bm25_index, query_tokens, fields=COFIND_BM25_FIELDS
+                )
+                bm25_norm_by_place = normalize_bm25_scores(bm25_raw_by_place)
+            _bm25_score_cache.put(
+                bm25_cache_key,
+                (bm25_raw_by_place, bm25_norm_by_place, bm25_candidate_ids, topk_docs_scored),
+            )
+        bm25_cache_stats = _bm25_score_cache.stats()
+        stage_ms['bm25_cache'] = 'hit' if cached_scores is not None else 'miss'
+        stage_ms['bm25_cache_hit_rate'] = bm25_cache_stats['hit_rate']
+        print(
+            f"[RECOMMEND] BM25 index v{bm25_index.version} ({COFIND_BM25_MODE}): shops={len(bm25_place_ids)} "
+            f"synced={stage_ms.get('bm25_docs_synced', 0)} "
+            f"query_tokens={len(query_tokens)} "
+            f"nonzero={sum(1 for v in bm25_raw_by_place.values() if v > 0)} "
+            f"top_k={len(bm25_candidate_ids) if bm25_candidate_ids is not None else 'off'}",
+            flush=True,
+        )
+
+    # --- Step 3: Hybrid scoring (70% BM25 + 20% kategori + 10% rating) ---
+    print(
+        f"[RECOMMEND] Step 3: hybrid scoring ({len(profiles)} profil)...",
+        flush=True,
+    )
+    scored_candidates = []
+    for profile in profiles:
+        pid = profile.get('place_id')
+        if bm25_candidate_ids is not None and pid not in bm25_candidate_ids:
+            continue
+        score_detail = _score_shop_by_user_reviews(
+            profile,
+            valid_pills,
+            search_keywords=search_keywords,
+            llm_preference_keywords=llm_preference_keywords,
+            bm25_norm=bm25_norm_by_place.get(pid),
+            bm25_raw=bm25_raw_by_place.get(pid),
+        )
+        total = score_detail['total_score']
+
+        if total < THRESHOLD:
+            if COFIND_RECOMMEND_VERBOSE:
+                print(
+                    f"[RECOMMEND]   skip {profile.get('name')}: score={total:.4f}",
+                    flush=True,
+                )
+            continue
+
+        evidence = _build_review_based_evidence(
+            profile,
+            score_detail,
+            valid_pills,
+            search_keywords=search_keywords,
+        )
+        # Tolak kandidat tanpa kutipan PENDUKUNG. Hanya caveat (keluhan pada
+        # konteks yang sama) tidak cukup untuk merekomendasikan toko.
+        if not _evidence_has_relevant_quotes(
+            evidence, valid_pills, search_keywords=query_keywords,
+        ):
+            if COFIND_RECOMMEND_VERBOSE:
+                print(
+                    f"[RECOMMEND]   skip {profile.get('name')}: score={total:.4f} tanpa kutipan relevan",
+                    flush=True,
+                )
+            continue
+
+        scored_candidates.append({
+            'place_id': pid,
+            'name': profile.get('name', ''),
+            'score': round(total, 4),
+            'profile': profile,
+            'score_detail': score_detail,
+            'evidence': evidence,
+        })
+        if COFIND_RECOMMEND_VERBOSE:
+            print(
+                f"[RECOMMEND]   keep {profile.get('name')}: score={total:.4f}",
+                flush=True,
+            )
+
+    scored_candidates.sort(key=lambda x: -x['score'])
+    stage_ms['review_scoring_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    stage_t0 = time.perf_counter()
+    print(
+        f"[RECOMMEND] Step 3 selesai: {len(scored_candidates)} kandidat berbukti di atas ambang "
+        f"(shops with reviews: {len(profiles)}) "
+        f"scoring_ms={stage_ms['review_scoring_ms']}",
+        flush=True,
+    )
+    yield _recommendation_progress('scoring', candidates=len(scored_candidates))
+
+    # --- Step 4: LLM rerank kandidat teratas (fallback: urutan skor hybrid) ---
+    rerank_backend = 'hybrid'
+    rerank_telemetry = {}
+    ranked_candidates = scored_candidates
+    # Opt-in COFIND_PARALLEL_SUMMARIES: summary per toko (thread pool) dimulai begitu toko
+    # pasti masuk daftar teratas, satu panggilan LLM per toko (lebih banyak panggilan/token
+    # daripada prompt batch). Default: semua toko diringkas dalam satu batch di Step 5.
+    summary_futures = {}
+    prefetch_summaries = use_llm and COFIND_PARALLEL_SUMMARIES and _llm_stage_executor() is not None
+    # Potongan teks summary yang di-stream LLM dari thread pool, diteruskan sebagai event
+    # ('summary_delta', ...) di Step 5.
+    summary_events = queue.Queue()
+
+    def _summary_delta_sink(shop):
+        def _emit(text):
+            summary_events.put(('summary_delta', {
+                'place_id': shop['place_id'],
+                'name': shop.get('name') or '',
+                'delta': text,
+            }))
+        return _emit
+
+    def _prefetch_summary(shop):
+        if prefetch_summaries and shop['place_id'] not in summary_futures:
+            summary_futures[shop['place_id']] = _submit_pipeline_stage(
+                _summary_for_shop, shop, valid_pills, query_keywords,
+                on_delta=_summary_delta_sink(shop) if COFIND_STREAM_SUMMARIES and llm_is_available() else None,
+            )
+
+    if use_llm and scored_candidates and llm_is_available() and llm_rerank_enabled():
+        # Rerank tidak membuang kandidat: bila kandidat berbukti <= max_results,
+        # semuanya pasti lolos dan summary bisa berjalan bersamaan dengan rerank.
+        if len(scored_candidates) <= max_results:
+            for shop in scored_candidates:
+                _prefetch_summary(shop)
+        rerank_result = llm_rerank_candidates(
+            scored_candidates,
+            valid_pills,
+            pill_labels=PILL_LABELS,
+            chat_fn=partial(_llm_chat_for_pipeline, cache_site='rerank'),
+            parse_json_fn=_parse_llm_json_with_repair,
+            user_taste_block=user_taste_block,
+            keyword_line=", ".join(query_keywords[:20]),
+        ) or {}
+        rerank_telemetry = rerank_result.get('telemetry') or {}
+        if rerank_result.get('ranked'):
+            ranked_candidates = rerank_result['ranked']
+            rerank_backend = 'llm'
+        else:
+            print(
+                f"[RECOMMEND] Step 4: LLM rerank tidak dipakai "
+                f"({rerank_telemetry.get('backend')}: {rerank_telemetry.get('error')})",
+                flush=True,
+            )
+            if COFIND_DEV_LLM_STRICT:
+                raise RuntimeError(
+                    f"LLM strict mode aktif: rerank gagal ({rerank_telemetry.get('error')})"
+                )
+
+    # Ambil hingga max_results, hanya yang masih punya bukti kutipan relevan.
+    # Tidak memaksa 3 hasil jika hanya 1–2 toko yang berbukti.
+    top_shops = []
+    for shop in ranked_candidates:
+        if len(top_shops) >= max_results:
+            break
+        evidence = shop.get('evidence') or {}
+        if not _evidence_has_relevant_quotes(
+            evidence, valid_pills, search_keywords=query_keywords,
+        ):
+            print(
+                f"[RECOMMEND]   drop {shop.get('name')}: tanpa kutipan relevan setelah rerank",
+                flush=True,
+            )
+            continue
+        top_shops.append(shop)
+        _prefetch_summary(shop)
+    # Summary yang sudah dimulai untuk toko yang akhirnya tidak lolos dibatalkan (yang
+    # terlanjur berjalan diabaikan); delta-nya tidak diteruskan ke klien.
+    confirmed_place_ids = {shop['place_id'] for shop in top_shops}
+    for place_id in [pid for pid in summary_futures if pid not in confirmed_place_ids]:
+        summary_futures.pop(place_id).cancel()
+    stage_ms['rerank_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    stage_ms['llm_rerank_busy_ms'] = rerank_telemetry.get('latency_ms', 0.0)
+    stage_ms['rerank_backend'] = rerank_backend
+    stage_t0 = time.perf_counter()
+    print(
+        f"[RECOMMEND] Step 4: {len(top_shops)}/{max_results} toko berbukti dari rerank={rerank_backend} "
+        f"(kandidat dinilai LLM={rerank_telemetry.get('scored_by_llm', 0)}, "
+        f"kutipan tidak tergrounding={rerank_telemetry.get('ungrounded_quotes', 0)})",
+        flush=True,
+    )
+    for rank, shop in enumerate(top_shops, 1):
+        fit = shop.get('llm_fit') or {}
+        print(
+            f"[RECOMMEND]   #{rank} {shop.get('name')} score={shop.get('score')} "
+            f"final={shop.get('final_score', shop.get('score'))} "
+            f"llm_fit={fit.get('fit_score')}",
+            flush=True,
+        )
+
+    yield _recommendation_progress('rerank', shortlisted=len(top_shops))
+
+    if not top_shops:
+        return {
+            'search_keywords': search_keywords,
+            'llm_preference_keywords': llm_preference_keywords,
+            'keyword_expansion': {
+                'source': expansion_info.get('source', 'disabled'),
+                'accepted': len(llm_preference_keywords),
+                'rejected_lexicon': expansion_info.get('rejected_lexicon', 0),
+                'rejected_vocabulary': expansion_info.get('rejected_vocabulary', 0),
+            },
+            'rerank': dict(rerank_telemetry, backend=rerank_backend),
+            'shortlisted': 0,
+            'recommendations': [],
+        }
+
+    # --- Step 5: LLM NLP summary wajib mengutip review ---
+    print(
+        f"[RECOMMEND] Step 5: generate summary untuk {len(top_shops)} shop...",
+        flush=True,
+    )
+    yield _recommendation_progress('summary', shortlisted=len(top_shops))
+    pending_summaries = set(summary_futures.values())
+    while pending_summaries or not summary_events.empty():
+        if pending_summaries:
+            _, pending_summaries = futures_wait(pending_summaries, timeout=0.05, return_when=FIRST_COMPLETED)
+        while True:
+            try:
+                event = summary_events.get_nowait()
+            except queue.Empty:
+                break
+            if event[1]['place_id'] in confirmed_place_ids:
+                yield event
+    recommendations = _generate_llm_review_summary(
+        top_shops,
+        valid_pills,
+        search_keywords=query_keywords,
+        prefetched=summary_futures,
+        use_llm=use_llm,
+    )
+    stage_ms['llm_summary_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+    # Wall-clock di atas vs jumlah waktu kerja summary per toko (paralel) di bawah.
+    stage_ms['llm_summary_busy_ms'] = (
+        round(sum(f.result()[1] for f in summary_futures.values() if not f.exception()), 1)
+        if summary_futures else stage_ms['llm_summary_ms']
+    )
+    stage_ms['llm_busy_ms'] = round(
+        stage_ms.get('llm_keyword_expansion_busy_ms', 0.0)
+        + stage_ms.get('llm_rerank_busy_ms', 0.0)
+        + stage_ms['llm_summary_busy_ms'],
+        1,
+    )
+    return {
+        'search_keywords': search_keywords,
+        'llm_preference_keywords': llm_preference_keywords,
+        'keyword_expansion': {
+            'source': expansion_info.get('source', 'disabled'),
+            'accepted': len(llm_preference_keywords),
+            'rejected_lexicon': expansion_info.get('rejected_lexicon', 0),
+            'rejected_vocabulary': expansion_info.get('rejected_vocabulary', 0),
+        },
+        'rerank': dict(rerank_telemetry, backend=rerank_backend),
+        'shortlisted': len(top_shops),
+        'recommendations': recommendations,
+    }
+
+
+def _pill_cache_config_fingerprint():
+    """Sidik konfigurasi yang memengaruhi hasil lapisan pill (bagian kunci _pill_result_cache)."""
+    return pipeline_fingerprint({
+        'llm_pipeline': llm_pipeline_config(),
+        # Keadaan circuit breaker sengaja tidak masuk sidik: hasil LLM yang sudah di-cache
+        # tetap dipakai saat router bermasalah; hasil fallback ditandai llm_degraded.
+        'llm_available': llm_is_configured(),
+        'rerank_backend': COFIND_RERANK_BACKEND,
+        'bm25_mode': COFIND_BM25_MODE,
+        'bm25_top_k': COFIND_BM25_TOP_K,
+        'bm25_phrase_boost': COFIND_BM25_PHRASE_BOOST,
+        'bm25_proximity_window': COFIND_BM25_PROXIMITY_WINDOW,
+        'slang_map_version': slang_map_version(),
+        'summary_cache_version': RECOMMENDATION_SUMMARY_CACHE_VERSION,
+        'max_results': _PILL_CACHE_MAX_RESULTS,
+    })
+
+
+def _rerank_pill_candidates(candidates, valid_pills, shared, *, user_taste_block=''):
+    """
+    Rerank LLM atas kandidat hasil bersama (sudah lolos evidence dan punya ringkasan).
+    Hanya urutan, final_score, dan llm_fit yang berubah; isi entri lain tetap.
+    Return (kandidat, telemetry); urutan semula bila rerank tidak bisa dipakai.
+    """
+    pool = [dict(rec, evidence=rec.get('supporting_evidence') or {}) for rec in candidates]
+    keywords = list(dict.fromkeys(
+        list(shared.get('search_keywords') or []) + list(shared.get('llm_preference_keywords') or [])
+    ))
+    result = llm_rerank_candidates(
+        pool,
+        valid_pills,
+        pill_labels=PILL_LABELS,
+        chat_fn=partial(_llm_chat_for_pipeline, cache_site='rerank'),
+        parse_json_fn=_parse_llm_json_with_repair,
+        user_taste_block=user_taste_block,
+        keyword_line=", ".join(keywords[:20]),
+        max_candidates=len(pool),
+    ) or {}
+    telemetry = result.get('telemetry') or {}
+    if not result.get('ranked'):
+        return candidates, dict(telemetry, backend=telemetry.get('backend', 'hybrid'))
+    by_place = {rec.get('place_id'): rec for rec in candidates}
+    ranked = []
+    for entry in result['ranked']:
+        rec = dict(by_place[entry.get('place_id')])
+        llm_fit = entry.get('llm_fit') if isinstance(entry.get('llm_fit'), dict) else None
+        rec['final_score'] = entry.get('final_score', rec.get('score', 0))
+        rec['llm_fit'] = llm_fit
+        rec['ranking_source'] = 'llm' if llm_fit else 'hybrid'
+        ranked.append(rec)
+    return ranked, dict(telemetry, backend='llm')
+
+
+def _personalize_pill_result(
+    shared,
+    valid_pills,
+    *,
+    excluded_place_ids=(),
+    favorite_place_ids=(),
+    user_taste_block='',
+    max_results=3,
+):
+    """
+    Lapisan per-user di atas hasil pill (dari cache atau baru dihitung): buang toko
+    yang ditandai not_helpful, rerank LLM kandidat tersisa dengan profil selera user
+    (bila ada histori), naikkan toko favorit COFIND_PILL_FAVORITE_RANK_BOOST posisi,
+    lalu potong ke max_results. Mengembalikan (body, status) seperti sebelumnya.
+    """
+    excluded = {str(pid) for pid in (excluded_place_ids or ())}
+    candidates = [
+        rec for rec in shared.get('recommendations') or []
+        if str(rec.get('place_id') or '') not in excluded
+    ]
+    rerank_info = shared['rerank']
+    personal_rerank = False
+    if (
+        user_taste_block
+        and COFIND_PILL_PERSONAL_RERANK
+        and len(candidates) > 1
+        and llm_is_available()
+        and llm_rerank_enabled()
+    ):
+        candidates, telemetry = _rerank_pill_candidates(
+            candidates, valid_pills, shared, user_taste_block=user_taste_block,
+        )
+        personal_rerank = telemetry.get('backend') == 'llm'
+        if personal_rerank:
+            rerank_info = dict(telemetry, personalized=True)
+        else:
+            print(
+                f"[RECOMMEND] Rerank personal tidak dipakai "
+                f"({telemetry.get('backend')}: {telemetry.get('error')})",
+                flush=True,
+            )
+    favorites = {str(pid or '').strip() for pid in (favorite_place_ids or ()) if pid}
+    boosted = False
+    if favorites and COFIND_PILL_FAVORITE_RANK_BOOST > 0:
+        ranked = []
+        for idx, rec in enumerate(candidates):
+            is_favorite = str(rec.get('place_id') or '') in favorites
+            boosted = boosted or (is_favorite and idx > 0)
+            # Favorit menang seri dengan toko yang dilewatinya (boost 1 = naik satu posisi).
+            ranked.append((idx - COFIND_PILL_FAVORITE_RANK_BOOST if is_favorite else idx, not is_favorite, idx, rec))
+        candidates = [item[-1] for item in sorted(ranked, key=lambda item: item[:3])]
+    recommendations = candidates[:max_results]
+
+    if not recommendations:
+        return {
+            'status': 'success',
+            'message': _MANUAL_UNCLEAR_MESSAGE,
+            'recommendations': [],
+        }, 200
+
+    return {
+        'status': 'success',
+        'preferences': valid_pills,
+        'search_keywords': shared['search_keywords'],
+        'llm_preference_keywords': shared['llm_preference_keywords'],
+        'llm_pipeline': {
+            'config': llm_pipeline_config(),
+            'keyword_expansion': shared['keyword_expansion'],
+            'rerank': rerank_info,
+            'personalization_used': bool(personal_rerank or boosted),
+        },
+        'recommendations': recommendations,
+    }, 200
+
+
+def _precompute_pill_combos(*, recent_first=True, recent_only=False, recent_days=30):
+    """
+    Semua kombinasi PILL_MAPPING (maks. 3 pill). recent_first: kombinasi yang sering
+    muncul di recommendation_feedback `recent_days` hari terakhir didahulukan;
+    recent_only: hanya kombinasi itu.
+    """
+    combos = pill_combinations(PILL_MAPPING.keys())
+    if recent_first or recent_only:
+        combos = order_combinations(
+            combos,
+            recent_feedback_preference_keys(days=recent_days),
+            only_priority=recent_only,
+        )
+    return combos
+
+
+_precompute_seen_stamp = [None]
+
+
+def _compute_precomputed_pill_result(pills):
+    """
+    Bagian deterministik lapisan pill untuk satu kombinasi: kandidat, evidence, dan
+    ringkasan deterministik tanpa panggilan LLM (rerank LLM ditambahkan online).
+    """
+    # Store profil proses ini (mis. worker Celery) tidak menerima hook tulis dari proses
+    # web; muat ulang penuh setiap revisi korpus lintas proses berubah.
+    stamp = corpus_stamp()
+    if COFIND_PROFILE_STORE and stamp != _precompute_seen_stamp[0]:
+        _recommendation_profile_store().invalidate_all()
+        _precompute_seen_stamp[0] = stamp
+    events = _pill_result_events(
+        pills, {}, max_results=_PILL_CACHE_MAX_RESULTS, use_llm=False,
+    )
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _precompute_pill_combination(pills):
+    """Hitung + simpan satu kombinasi pill (subtask Celery). Return status precompute_combination."""
+    if not COFIND_PILL_PRECOMPUTED:
+        return 'disabled'
+    return precompute_combination(
+        pills, _compute_precomputed_pill_result, fingerprint=_pill_cache_config_fingerprint(),
+    )
+
+
+def _precompute_pill_results(*, recent_first=True, recent_only=False, recent_days=30, progress_fn=None):
+    """
+    Prakomputasi bagian deterministik lapisan pill untuk semua kombinasi secara berurutan
+    di proses ini (CLI) dan simpan ke pill_precomputed_results; kombinasi yang barisnya
+    masih berlaku dilewati. progress_fn(dict) dipanggil setiap kombinasi selesai.
+    """
+    if not COFIND_PILL_PRECOMPUTED:
+        print("[PRECOMPUTE] COFIND_PILL_PRECOMPUTED=false: prakomputasi dilewati", flush=True)
+        return {'status': 'disabled'}
+    combos = _precompute_pill_combos(
+        recent_first=recent_first, recent_only=recent_only, recent_days=recent_days,
+    )
+    started = time.perf_counter()
+    print(f"[PRECOMPUTE] Mulai: {len(combos)} kombinasi pill", flush=True)
+    summary = precompute_combinations(
+        combos,
+        _compute_precomputed_pill_result,
+        fingerprint=_pill_cache_config_fingerprint(),
+        progress_fn=progress_fn,
+    )
+    summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[METRIC] precompute_pill_results {summary}", flush=True)
+    return summary
+
+
+def _rerank_precomputed_pill_result(shared, valid_pills):
+    """
+    Baris prakomputasi memakai urutan hybrid; tambahkan rerank LLM (non-personal) sekali
+    saat dibaca online. Return (hasil, lengkap): lengkap=False bila rerank seharusnya
+    jalan tapi gagal, supaya hasil tanpa rerank tidak disimpan di cache memori.
+    """
+    candidates = shared.get('recommendations') or []
+    if (
+        (shared.get('rerank') or {}).get('backend') == 'llm'
+        or len(candidates) < 2
+        or not llm_is_available()
+        or not llm_rerank_enabled()
+    ):
+        return shared, True
+    ranked, telemetry = _rerank_pill_candidates(candidates, valid_pills, shared)
+    if telemetry.get('backend') != 'llm':
+        print(
+            f"[RECOMMEND] Rerank hasil prakomputasi tidak dipakai "
+            f"({telemetry.get('backend')}: {telemetry.get('error')})",
+            flush=True,
+        )
+        return shared, False
+    return dict(shared, recommendations=ranked, rerank=telemetry), True
+
+
+def _load_recommendation_user_context(user_id, valid_pills):
+    """(excluded_place_ids, taste_profile, user_taste_block) untuk lapisan per user."""
+    # Soft personalization: jangan tampilkan shop yang user tandai tidak relevan
+    # untuk set preferensi yang sama (feedback thumbs-down).
+    excluded_place_ids = set()
+    try:
+        excluded_place_ids = get_not_helpful_place_ids(user_id, valid_pills)
+        if excluded_place_ids:
+            print(
+                f"[RECOMMEND] Exclude {len(excluded_place_ids)} shop dari feedback "
+                f"not_helpful user_id={user_id}"
+            )
+    except Exception as fb_excl_err:
+        print(f"[RECOMMEND] Gagal load feedback exclusion: {fb_excl_err}")
+
+    # Konteks personalisasi (review sendiri + favorit).
+    taste_profile = build_user_taste_profile(user_id)
+    return excluded_place_ids, taste_profile, format_user_taste_prompt_block(taste_profile)
+
+
 def _recommendation_pipeline_events(prefs, _auth_user):
     """
     Rekomendasi 100% berbasis user review dengan LLM sebagai pengambil keputusan.
@@ -6554,13 +7675,18 @@ def _recommendation_pipeline_events(prefs, _auth_user):
       6. LLM NLP summary merupakan ringkasan review user, kutipannya diverifikasi
          terhadap korpus review toko tersebut
 
+    Langkah 1-6 (lapisan pill, _pill_result_events) dihitung tanpa data user dan di-cache
+    bersama per kombinasi pill + revisi korpus + konfigurasi (COFIND_PILL_CACHE_SIZE=0:
+    tanpa cache, tetap lewat single-flight). Eksklusi feedback, rerank LLM dengan profil
+    selera user, dan boost favorit diterapkan di atasnya (_personalize_pill_result).
+
     Generator: yield ('progress', payload) di tiap batas tahap, lalu tepat satu
     ('result', (body_dict, status_code)) di akhir. Autentikasi dan parsing body
     dilakukan pemanggil supaya generator ini bebas dari request context Flask.
     """
     request_t0 = time.perf_counter()
-    stage_t0 = request_t0
     stage_ms = {}
+    llm_calls = track_llm_calls()
     try:
         if not prefs:
             yield ('result', ({
@@ -6588,294 +7714,105 @@ def _recommendation_pipeline_events(prefs, _auth_user):
         print(f"[RECOMMEND] Pills: {valid_pills}")
         yield _recommendation_progress('start')
 
-        # Soft personalization: jangan tampilkan shop yang user tandai tidak relevan
-        # untuk set preferensi yang sama (feedback thumbs-down).
-        excluded_place_ids = set()
-        try:
-            excluded_place_ids = get_not_helpful_place_ids(_auth_user.get('id'), valid_pills)
-            if excluded_place_ids:
-                print(
-                    f"[RECOMMEND] Exclude {len(excluded_place_ids)} shop dari feedback "
-                    f"not_helpful user_id={_auth_user.get('id')}"
-                )
-        except Exception as fb_excl_err:
-            print(f"[RECOMMEND] Gagal load feedback exclusion: {fb_excl_err}")
-
-        # Konteks personalisasi (review sendiri + favorit) untuk tahap keputusan LLM.
-        taste_profile = build_user_taste_profile(_auth_user.get('id'))
-        user_taste_block = format_user_taste_prompt_block(taste_profile)
-
-        # Query keywords: seed PILL_MAPPING; ekspansi LLM ditambahkan setelah korpus siap.
-        search_keywords = _seed_search_keywords(valid_pills)
-        llm_preference_keywords = []
-        expansion_info = {}
-        stage_ms['keyword_seed_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
-        stage_t0 = time.perf_counter()
-        print(f"[RECOMMEND] Search keywords (seed pill): {search_keywords}")
-
-        all_place_ids = _load_all_place_ids()
-        if not all_place_ids:
-            yield ('result', ({'status': 'error', 'message': 'Data coffee shop kosong.'}, 500))
-            return
-        facilities_index = _load_facilities_index()
-
-        MAX_REC = 3
-        THRESHOLD = 0.05  # ambang minimal skor review-based
-
-        # --- Step 1: Build profiles (batch DB) ---
-        print("[RECOMMEND] Step 1: batch load profil + reviews...", flush=True)
-        profiles, shops_without_reviews = _build_profiles_for_recommendation(
-            all_place_ids,
-            facilities_index=facilities_index,
-            excluded_place_ids=excluded_place_ids,
-        )
-        print(
-            f"[RECOMMEND] Step 1 selesai: profiles={len(profiles)} "
-            f"tanpa_review={len(shops_without_reviews)}",
-            flush=True,
-        )
-        stage_ms['profile_load_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
-        stage_t0 = time.perf_counter()
-        yield _recommendation_progress('profiles', shops_with_reviews=len(profiles))
-
-        # --- Step 2: BM25 index + ekspansi keyword LLM yang tervalidasi korpus ---
-        bm25_raw_by_place = {}
-        bm25_norm_by_place = {}
-        bm25_place_ids, bm25_model, corpus_tokens = [], None, []
-        try:
-            bm25_place_ids, bm25_model, corpus_tokens = build_bm25_index(
-                profiles,
-                tokenize_fn=tokenize_normalized,
-            )
-        except Exception as bm25_err:
-            print(f"[RECOMMEND] BM25 gagal, fallback keyword scoring: {bm25_err}", flush=True)
-
-        if llm_is_available():
-            expansion_info = expand_pill_keywords(
-                valid_pills,
-                pill_labels=PILL_LABELS,
-                pill_lexicon=search_keywords,
-                chat_fn=_llm_chat_for_pipeline,
-                sanitize_keywords=_filter_negative_search_keywords,
-                corpus_vocabulary=corpus_vocabulary_from_tokens(corpus_tokens),
-                parse_json_fn=_parse_llm_json_with_repair,
+        # Data per user (eksklusi feedback + profil selera) dimuat di thread pool,
+        # paralel dengan lapisan pill bersama (Step 1-5), dan baru ditunggu setelahnya.
+        # Tanpa thread pool dimuat setelah lapisan pill supaya tidak menunda load profil.
+        def _load_user_context():
+            return _submit_pipeline_stage(
+                _load_recommendation_user_context, _auth_user.get('id'), valid_pills,
             )
-            llm_preference_keywords = _filter_overbroad_meeting_keywords(
-                expansion_info.get('keywords') or [],
-                valid_pills,
-            )
-            print(
-                f"[RECOMMEND] Ekspansi keyword LLM ({expansion_info.get('source')}): "
-                f"{llm_preference_keywords} "
-                f"(ditolak leksikon={expansion_info.get('rejected_lexicon')}, "
-                f"ditolak korpus={expansion_info.get('rejected_vocabulary')} "
-                f"contoh={expansion_info.get('rejected_vocabulary_sample')})",
-                flush=True,
-            )
-        stage_ms['llm_keyword_expansion_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
-        stage_t0 = time.perf_counter()
-        yield _recommendation_progress(
-            'keyword_expansion', keywords_added=len(llm_preference_keywords)
-        )
 
-        query_keywords = list(dict.fromkeys(list(search_keywords) + list(llm_preference_keywords)))
-        query_tokens = build_query_tokens(
-            valid_pills,
-            _expand_pill_to_keywords,
-            search_keywords=query_keywords,
-            tokenize_fn=tokenize_normalized,
-        )
-        if bm25_model is not None:
-            bm25_raw_by_place = score_shops_bm25(bm25_place_ids, bm25_model, query_tokens)
-            bm25_norm_by_place = normalize_bm25_scores(bm25_raw_by_place)
-            print(
-                f"[RECOMMEND] BM25 index: shops={len(bm25_place_ids)} "
-                f"query_tokens={len(query_tokens)} "
-                f"nonzero={sum(1 for v in bm25_raw_by_place.values() if v > 0)}",
-                flush=True,
-            )
-
-        # --- Step 3: Hybrid scoring (70% BM25 + 20% kategori + 10% rating) ---
-        print(
-            f"[RECOMMEND] Step 3: hybrid scoring ({len(profiles)} profil)...",
-            flush=True,
-        )
-        scored_candidates = []
-        for profile in profiles:
-            pid = profile.get('place_id')
-            score_detail = _score_shop_by_user_reviews(
-                profile,
-                valid_pills,
-                search_keywords=search_keywords,
-                llm_preference_keywords=llm_preference_keywords,
-                bm25_norm=bm25_norm_by_place.get(pid),
-                bm25_raw=bm25_raw_by_place.get(pid),
-            )
-            total = score_detail['total_score']
-
-            if total < THRESHOLD:
-                if COFIND_RECOMMEND_VERBOSE:
-                    print(
-                        f"[RECOMMEND]   skip {profile.get('name')}: score={total:.4f}",
-                        flush=True,
-                    )
-                continue
-
-            evidence = _build_review_based_evidence(
-                profile,
-                score_detail,
-                valid_pills,
-                search_keywords=search_keywords,
-            )
-            # Tolak kandidat tanpa kutipan PENDUKUNG. Hanya caveat (keluhan pada
-            # konteks yang sama) tidak cukup untuk merekomendasikan toko.
-            if not _evidence_has_relevant_quotes(
-                evidence, valid_pills, search_keywords=query_keywords,
-            ):
-                if COFIND_RECOMMEND_VERBOSE:
-                    print(
-                        f"[RECOMMEND]   skip {profile.get('name')}: score={total:.4f} tanpa kutipan relevan",
-                        flush=True,
-                    )
-                continue
-
-            scored_candidates.append({
-                'place_id': pid,
-                'name': profile.get('name', ''),
-                'score': round(total, 4),
-                'profile': profile,
-                'score_detail': score_detail,
-                'evidence': evidence,
-            })
-            if COFIND_RECOMMEND_VERBOSE:
-                print(
-                    f"[RECOMMEND]   keep {profile.get('name')}: score={total:.4f}",
-                    flush=True,
+        user_context_future = _load_user_context() if _llm_stage_executor() is not None else None
+
+        # Revisi korpus lintas proses (corpus_state di DB) supaya tulis lewat worker lain
+        # ikut membatalkan cache proses ini; revisi lokal menutup jeda sampai stamp naik.
+        # Stamp tidak terbaca / tidak dipakai: cache dilewati (hasil dihitung, tidak disimpan).
+        stamp = corpus_stamp() if corpus_stamp_enabled() else None
+        cache_key = pill_cache_key(valid_pills, (stamp, corpus_revision()), _pill_cache_config_fingerprint())
+        cacheable = stamp is not None
+        shared = _pill_result_cache.get(cache_key) if cacheable else None
+        if not _pill_result_cache.enabled:
+            stage_ms['pill_cache'] = 'off'
+        else:
+            stage_ms['pill_cache'] = 'hit' if shared is not None else ('miss' if cacheable else 'bypass')
+        preferences_key = '+'.join(cache_key[0])
+        if shared is None and cacheable and COFIND_PILL_PRECOMPUTED:
+            shared = load_precomputed(preferences_key, cache_key[2], stamp)
+            if shared is not None:
+                stage_ms['pill_cache'] = 'precomputed'
+                shared, complete = _rerank_precomputed_pill_result(shared, list(cache_key[0]))
+                if complete:
+                    _pill_result_cache.put(cache_key, shared)
+        if shared is None:
+            # Lapisan bersama: pill terurut, tanpa eksklusi/taste user, dengan cadangan
+            # kandidat supaya eksklusi per-user masih menyisakan MAX_RECOMMENDATIONS.
+            def _compute_shared():
+                result = yield from _pill_result_events(
+                    list(cache_key[0]),
+                    stage_ms,
+                    max_results=_PILL_CACHE_MAX_RESULTS,
                 )
-
-        scored_candidates.sort(key=lambda x: -x['score'])
-        stage_ms['review_scoring_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
-        stage_t0 = time.perf_counter()
-        print(
-            f"[RECOMMEND] Step 3 selesai: {len(scored_candidates)} kandidat berbukti di atas ambang "
-            f"(shops with reviews: {len(profiles)}) "
-            f"scoring_ms={stage_ms['review_scoring_ms']}",
-            flush=True,
-        )
-        yield _recommendation_progress('scoring', candidates=len(scored_candidates))
-
-        # --- Step 4: LLM rerank kandidat teratas (fallback: urutan skor hybrid) ---
-        rerank_backend = 'hybrid'
-        rerank_telemetry = {}
-        ranked_candidates = scored_candidates
-        if scored_candidates and llm_is_available() and llm_rerank_enabled():
-            rerank_result = llm_rerank_candidates(
-                scored_candidates,
-                valid_pills,
-                pill_labels=PILL_LABELS,
-                chat_fn=_llm_chat_for_pipeline,
-                parse_json_fn=_parse_llm_json_with_repair,
-                user_taste_block=user_taste_block,
-                keyword_line=", ".join(query_keywords[:20]),
-            ) or {}
-            rerank_telemetry = rerank_result.get('telemetry') or {}
-            if rerank_result.get('ranked'):
-                ranked_candidates = rerank_result['ranked']
-                rerank_backend = 'llm'
+                if llm_calls['short_circuited'] and 'error' not in result:
+                    # Sebagian tahap LLM diganti fallback (circuit breaker terbuka): layani,
+                    # tapi jangan di-cache/dibagi supaya hasil penuh dihitung lagi nanti.
+                    result['llm_degraded'] = True
+                return result
+
+            single_flight = _recommendation_single_flight()
+            if single_flight is None:
+                shared = yield from _compute_shared()
             else:
-                print(
-                    f"[RECOMMEND] Step 4: LLM rerank tidak dipakai "
-                    f"({rerank_telemetry.get('backend')}: {rerank_telemetry.get('error')})",
-                    flush=True,
-                )
-                if COFIND_DEV_LLM_STRICT:
-                    raise RuntimeError(
-                        f"LLM strict mode aktif: rerank gagal ({rerank_telemetry.get('error')})"
-                    )
-
-        # Ambil hingga MAX_REC, hanya yang masih punya bukti kutipan relevan.
-        # Tidak memaksa 3 hasil jika hanya 1–2 toko yang berbukti.
-        top_shops = []
-        for shop in ranked_candidates:
-            if len(top_shops) >= MAX_REC:
-                break
-            evidence = shop.get('evidence') or {}
-            if not _evidence_has_relevant_quotes(
-                evidence, valid_pills, search_keywords=query_keywords,
-            ):
-                print(
-                    f"[RECOMMEND]   drop {shop.get('name')}: tanpa kutipan relevan setelah rerank",
-                    flush=True,
+                # Kunci lintas worker memakai revisi korpus DB (revisi lokal beda per proses).
+                shared, flight_role = yield from single_flight.run(
+                    cache_key,
+                    _compute_shared,
+                    shared_key=(
+                        f"{preferences_key}|{cache_key[2]}|{stamp}" if stamp is not None else None
+                    ),
+                    share_result=lambda result: 'error' not in result and not result.get('llm_degraded'),
+                    wait_event=_recommendation_progress('profiles', coalesced=True),
                 )
-                continue
-            top_shops.append(shop)
-        stage_ms['rerank_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
-        stage_ms['rerank_backend'] = rerank_backend
-        stage_t0 = time.perf_counter()
-        print(
-            f"[RECOMMEND] Step 4: {len(top_shops)}/{MAX_REC} toko berbukti dari rerank={rerank_backend} "
-            f"(kandidat dinilai LLM={rerank_telemetry.get('scored_by_llm', 0)}, "
-            f"kutipan tidak tergrounding={rerank_telemetry.get('ungrounded_quotes', 0)})",
-            flush=True,
+                stage_ms['single_flight'] = flight_role
+            if cacheable and 'error' not in shared and not shared.get('llm_degraded'):
+                _pill_result_cache.put(cache_key, shared)
+        else:
+            stage_ms['rerank_backend'] = shared['rerank'].get('backend', 'none')
+            print(f"[RECOMMEND] Pill cache {stage_ms['pill_cache']}: {list(cache_key[0])}", flush=True)
+        stage_ms['pill_cache_hit_rate'] = _pill_result_cache.stats()['hit_rate']
+        (excluded_place_ids, taste_profile, user_taste_block), stage_ms['user_context_busy_ms'] = (
+            (user_context_future or _load_user_context()).result()
         )
-        for rank, shop in enumerate(top_shops, 1):
-            fit = shop.get('llm_fit') or {}
-            print(
-                f"[RECOMMEND]   #{rank} {shop.get('name')} score={shop.get('score')} "
-                f"final={shop.get('final_score', shop.get('score'))} "
-                f"llm_fit={fit.get('fit_score')}",
-                flush=True,
-            )
-
-        yield _recommendation_progress('rerank', shortlisted=len(top_shops))
 
-        if not top_shops:
-            yield _recommendation_progress('done', shortlisted=0)
-            yield ('result', ({
-                'status': 'success',
-                'message': _MANUAL_UNCLEAR_MESSAGE,
-                'recommendations': [],
-            }, 200))
+        if 'error' in shared:
+            yield ('result', shared['error'])
             return
 
-        # --- Step 5: LLM NLP summary wajib mengutip review ---
-        print(
-            f"[RECOMMEND] Step 5: generate summary untuk {len(top_shops)} shop...",
-            flush=True,
-        )
-        yield _recommendation_progress('summary', shortlisted=len(top_shops))
-        recommendations = _generate_llm_review_summary(
-            top_shops,
+        personalize_t0 = time.perf_counter()
+        body, status = _personalize_pill_result(
+            shared,
             valid_pills,
-            search_keywords=query_keywords,
+            excluded_place_ids=excluded_place_ids,
+            favorite_place_ids=(taste_profile or {}).get('favorite_place_ids') or (),
+            user_taste_block=user_taste_block,
+            max_results=MAX_RECOMMENDATIONS,
         )
-        stage_ms['llm_summary_ms'] = round((time.perf_counter() - stage_t0) * 1000, 1)
+        stage_ms['personalize_ms'] = round((time.perf_counter() - personalize_t0) * 1000, 1)
+        delivered = len(body.get('recommendations') or [])
+        stage_ms['llm_queue_wait_ms'] = llm_calls['queue_wait_ms']
+        stage_ms['llm_queue_waits'] = llm_calls['queue_waits']
+        stage_ms['llm_short_circuited'] = llm_calls['short_circuited']
         stage_ms['total_ms'] = round((time.perf_counter() - request_t0) * 1000, 1)
         print(f"[METRIC] recommend_by_preferences {stage_ms}", flush=True)
         print(
-            f"[RECOMMEND] Selesai: {len(recommendations)} rekomendasi dikirim ke client",
+            f"[RECOMMEND] Selesai: {delivered} rekomendasi dikirim ke client",
             flush=True,
         )
 
-        yield _recommendation_progress('done', delivered=len(recommendations))
-        yield ('result', ({
-            'status': 'success',
-            'preferences': valid_pills,
-            'search_keywords': search_keywords,
-            'llm_preference_keywords': llm_preference_keywords,
-            'llm_pipeline': {
-                'config': llm_pipeline_config(),
-                'keyword_expansion': {
-                    'source': expansion_info.get('source', 'disabled'),
-                    'accepted': len(llm_preference_keywords),
-                    'rejected_lexicon': expansion_info.get('rejected_lexicon', 0),
-                    'rejected_vocabulary': expansion_info.get('rejected_vocabulary', 0),
-                },
-                'rerank': dict(rerank_telemetry, backend=rerank_backend),
-                'personalization_used': bool(user_taste_block),
-            },
-            'recommendations': recommendations,
-        }, 200))
+        if shared.get('shortlisted'):
+            yield _recommendation_progress('done', delivered=delivered)
+        else:
+            yield _recommendation_progress('done', shortlisted=0)
+        yield ('result', (body, status))
 
     except Exception as e:
         import traceback
@@ -6886,6 +7823,9 @@ def _recommendation_pipeline_events(prefs, _auth_user):
         try:
             if 'total_ms' not in stage_ms:
                 stage_ms['total_ms'] = round((time.perf_counter() - request_t0) * 1000, 1)
+            stage_ms['llm_queue_wait_ms'] = llm_calls['queue_wait_ms']
+            stage_ms['llm_queue_waits'] = llm_calls['queue_waits']
+            stage_ms['llm_short_circuited'] = llm_calls['short_circuited']
             stage_ms.setdefault('rerank_backend', 'none')
             print(f"[METRIC] recommend_by_preferences_final {stage_ms}")
         except Exception:
@@ -6924,9 +7864,10 @@ def _sse_pack(event, payload):
 def api_recommend_by_preferences_stream():
     """
     Versi streaming dari rekomendasi pill: mengirim event `progress` tiap tahap
-    pipeline, lalu satu event `result` berisi payload yang identik dengan endpoint
-    JSON biasa. Klien memakai fetch + ReadableStream (bukan EventSource) karena
-    butuh header Authorization.
+    pipeline, event `summary_delta` ({place_id, name, delta}) berisi potongan teks
+    summary per toko selama LLM menulis (draf, belum divalidasi), lalu satu event
+    `result` berisi payload yang identik dengan endpoint JSON biasa. Klien memakai
+    fetch + ReadableStream (bukan EventSource) karena butuh header Authorization.
     """
     prefs = _read_recommendation_preferences()
     auth_user, auth_error = _require_authenticated_user()
@@ -6939,8 +7880,8 @@ def api_recommend_by_preferences_stream():
         delivered_result = False
         try:
             for kind, payload in _recommendation_pipeline_events(prefs, auth_user):
-                if kind == 'progress':
-                    yield _sse_pack('progress', payload)
+                if kind in ('progress', 'summary_delta'):
+                    yield _sse_pack(kind, payload)
                 elif kind == 'result':
                     body, status = payload
                     delivered_result = True
@@ -7193,6 +8134,15 @@ def health_check():
         'llm_backend': LLM_BACKEND,
         'rerank_backend': COFIND_RERANK_BACKEND,
         'llm_pipeline': llm_pipeline_config(),
+        'db_pool': db_pool_stats(),
+        'db_sql_translation_cache': sql_translation_cache_stats(),
+        'bm25_score_cache': _bm25_score_cache.stats(),
+        'profile_store': profile_store_stats(),
+        'pill_cache': _pill_result_cache.stats(),
+        'llm_response_cache': llm_response_cache_stats(),
+        'llm_limiter': llm_limiter_stats(),
+        'llm_circuit': llm_circuit_stats(),
+        'single_flight': _pill_single_flight.stats() if _pill_single_flight is not None else None,
     }
     try:
         from redis_utils import get_redis_url, ping_redis
@@ -3,10 +3,56 @@ BM25 scoring untuk rekomendasi berbasis review.
 
 Setiap coffee shop = satu dokumen (gabungan teks review yang sudah dinormalisasi slang).
 Query = token dari PILL_MAPPING + search_keywords.
+
+IncrementalBM25Index menyimpan indeks sepanjang umur proses dan diperbarui per review
+(tambah/ubah/hapus) sehingga pipeline tidak perlu men-tokenisasi ulang seluruh korpus
+tiap request. Skornya identik dengan rank_bm25.BM25Okapi (k1, b, epsilon sama).
+
+SparseBM25Scorer (butuh numpy + scipy) menyimpan korpus sebagai matriks CSR term x dokumen
+berisi bobot BM25 yang sudah dihitung, jadi skor satu query = ambil baris token query lalu
+jumlahkan; banyak query sekaligus = satu perkalian matriks.
+
+InvertedBM25Index menyimpan posting list per term beserta batas atas skornya, lalu
+top_k() memakai algoritme MaxScore: dokumen yang batas atas skornya tidak mungkin
+menembus ambang top-K tidak pernah dihitung penuh.
+
+Mode BM25F (argumen `fields`): teks review, teks fasilitas, dan pros hasil vote komunitas
+diindeks sebagai field terpisah dengan boost dan normalisasi panjang masing-masing, lalu
+digabung jadi satu skor per toko dalam satu lintasan.
+
+BM25Snapshot: indeks diserialisasi ke satu file biner (place_id, kosakata, posting list
+berbobot, panjang dokumen, digest + term frequency per review) yang dibuka proses lain
+lewat mmap read-only, jadi semua worker gunicorn/Celery berbagi page cache yang sama.
+Tiap file punya nomor generasi; worker pindah ke generasi yang lebih baru tanpa restart.
+Perubahan lokal di atas snapshot disimpan sebagai overlay per dokumen; posting list
+gabungan dihitung per term query, tanpa menyalin isi snapshot ke memori proses.
+
+KeywordPhraseMatcher: satu set keyword dikompilasi sekali jadi trie token, lalu tiap
+review cukup dipindai sekali untuk semua keyword. PhraseIndex memakai matcher yang sama
+untuk frasa utuh di review satu toko, plus posisi token per review untuk kedekatan
+(span per dokumen), dipakai sebagai boost frasa di atas skor BM25 bag-of-words. SpanIntervals menjawab
+"ada span (mis. fragmen kelemahan) dalam jendela token di sekitar anchor?" lewat bisect.
+
+BM25ScoreCache: LRU hasil scoring per query (raw + ternormalisasi), dikunci oleh
+generasi/versi indeks dan token query terurut; kombinasi pill yang sama tidak dihitung ulang.
 """
 
 from __future__ import annotations
 
+import hashlib
+import heapq
+import itertools
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
 from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 try:
@@ -14,6 +60,13 @@ try:
 except Exception:  # pragma: no cover
     BM25Okapi = None
 
+try:
+    import numpy as np
+    from scipy import sparse as sp
+except Exception:  # pragma: no cover
+    np = None
+    sp = None
+
 
 def build_query_tokens(
     pills: Sequence[str],
@@ -86,13 +139,21 @@ def score_shops_bm25(
     place_ids: Sequence[str],
     bm25_model,
     query_tokens: Sequence[str],
+    fields: Optional[Dict[str, Tuple[float, float]]] = None,
 ) -> Dict[str, float]:
-    """Raw BM25 score per place_id. Kosong jika model/query tidak valid."""
-    if not bm25_model or not place_ids:
+    """
+    Raw BM25 score per place_id. Kosong jika model/query tidak valid.
+    `fields` (mode BM25F) hanya berlaku untuk IncrementalBM25Index.
+    """
+    if bm25_model is None or not place_ids:
         return {}
     q = [t for t in (query_tokens or []) if t]
     if not q:
         return {pid: 0.0 for pid in place_ids}
+    if isinstance(bm25_model, IncrementalBM25Index):
+        return bm25_model.score_places(q, place_ids, fields=fields)
+    if isinstance(bm25_model, SparseBM25Scorer):
+        return bm25_model.score_places(q, place_ids)
     raw_scores = bm25_model.get_scores(list(q))
     out: Dict[str, float] = {}
     for idx, pid in enumerate(place_ids):
@@ -103,13 +164,19 @@ def score_shops_bm25(
     return out
 
 
-def normalize_bm25_scores(raw_by_place: Dict[str, float]) -> Dict[str, float]:
-    """Min-max ke rentang 0..1 terhadap korpus saat ini."""
+def normalize_bm25_scores(raw_by_place: Dict[str, float], floor: Optional[float] = None) -> Dict[str, float]:
+    """
+    Min-max ke rentang 0..1 terhadap korpus saat ini.
+    `floor`: skor minimum korpus bila `raw_by_place` hanya memuat sebagian dokumen
+    (mis. hasil top-K), supaya normalisasinya sama dengan scoring penuh.
+    """
     if not raw_by_place:
         return {}
     values = list(raw_by_place.values())
     max_v = max(values) if values else 0.0
     min_v = min(values) if values else 0.0
+    if floor is not None:
+        min_v = min(min_v, floor)
     if max_v <= 0:
         return {pid: 0.0 for pid in raw_by_place}
     if abs(max_v - min_v) < 1e-12:
@@ -120,3 +187,1986 @@ def normalize_bm25_scores(raw_by_place: Dict[str, float]) -> Dict[str, float]:
         pid: max(0.0, min(1.0, (v - min_v) / span))
         for pid, v in raw_by_place.items()
     }
+
+
+_EMPTY_DOC_TOKEN = '__empty__'
+_MAXSCORE_EPS = 1e-12
+
+# Field BM25F: nama -> (boost, b). Field 'review' = token review (isi utama indeks).
+REVIEW_FIELD = 'review'
+DEFAULT_BM25F_FIELDS: Dict[str, Tuple[float, float]] = {
+    REVIEW_FIELD: (1.0, 0.75),
+    'facilities': (0.6, 0.3),
+    'pros': (0.8, 0.5),
+}
+
+
+def profile_field_texts(profile: dict) -> Dict[str, str]:
+    """Teks field non-review dari profil rekomendasi (fasilitas + pros komunitas)."""
+    pros = ((profile.get('community_signals') or {}).get('top_pros')) or []
+    return {
+        'facilities': str(profile.get('facilities_tab_text') or '').strip(),
+        'pros': ' '.join(str(item.get('text') or '').strip() for item in pros if isinstance(item, dict)).strip(),
+    }
+
+
+def okapi_idf(df: Dict[str, int], n_docs: int, epsilon: float = 0.25) -> Dict[str, float]:
+    """IDF persis seperti BM25Okapi: idf negatif diganti epsilon * rata-rata idf."""
+    idf: Dict[str, float] = {}
+    negative = []
+    idf_sum = 0.0
+    for token, freq in df.items():
+        value = math.log(n_docs - freq + 0.5) - math.log(freq + 0.5)
+        idf[token] = value
+        idf_sum += value
+        if value < 0:
+            negative.append(token)
+    if idf:
+        eps = epsilon * (idf_sum / len(idf))
+        for token in negative:
+            idf[token] = eps
+    return idf
+
+
+def okapi_doc_weights(
+    doc_term_freqs: Sequence[Dict[str, int]],
+    idf: Dict[str, float],
+    *,
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> List[Dict[str, float]]:
+    """Bobot BM25 Okapi per (dokumen, term): kontribusi term itu ke skor dokumen."""
+    doc_lens = [sum(freqs.values()) for freqs in doc_term_freqs]
+    avgdl = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+    out: List[Dict[str, float]] = []
+    for freqs, dl in zip(doc_term_freqs, doc_lens):
+        norm = k1 * (1 - b + b * dl / avgdl) if avgdl > 0 else k1
+        out.append({
+            token: (idf.get(token) or 0.0) * (tf * (k1 + 1) / (tf + norm))
+            for token, tf in freqs.items()
+        })
+    return out
+
+
+def bm25f_doc_weights(
+    field_term_freqs: Dict[str, Sequence[Dict[str, int]]],
+    fields: Dict[str, Tuple[float, float]],
+    *,
+    k1: float = 1.5,
+    epsilon: float = 0.25,
+) -> List[Dict[str, float]]:
+    """
+    Bobot BM25F per (dokumen, term). Semua list di `field_term_freqs` sejajar per dokumen.
+      tf~ = sum_f boost_f * tf_f / (1 - b_f + b_f * len_f / avglen_f)
+      w   = idf * tf~ * (k1 + 1) / (tf~ + k1)
+    idf dihitung dari dokumen yang memuat term di field mana pun. Dengan satu field
+    ber-boost 1 hasilnya sama persis dengan okapi_doc_weights.
+    """
+    active = [(name, fields[name]) for name in fields if name in field_term_freqs and fields[name][0] > 0]
+    if not active:
+        return []
+    n_docs = len(field_term_freqs[active[0][0]])
+    field_lens = {}
+    field_avg = {}
+    for name, _cfg in active:
+        lens = [sum(freqs.values()) for freqs in field_term_freqs[name]]
+        field_lens[name] = lens
+        field_avg[name] = (sum(lens) / n_docs) if n_docs else 0.0
+
+    pseudo: List[Dict[str, float]] = []
+    df: Counter = Counter()
+    for doc_id in range(n_docs):
+        acc: Dict[str, float] = {}
+        for name, (boost, b) in active:
+            freqs = field_term_freqs[name][doc_id]
+            if not freqs:
+                continue
+            avg = field_avg[name]
+            norm = (1 - b + b * field_lens[name][doc_id] / avg) if avg > 0 else 1.0
+            for token, tf in freqs.items():
+                acc[token] = acc.get(token, 0.0) + boost * tf / norm
+        df.update(acc.keys())
+        pseudo.append(acc)
+
+    idf = okapi_idf(df, n_docs, epsilon)
+    return [
+        {token: idf[token] * (tf * (k1 + 1) / (tf + k1)) for token, tf in acc.items()}
+        for acc in pseudo
+    ]
+
+
+def sparse_scoring_available() -> bool:
+    return np is not None and sp is not None
+
+
+class SparseBM25Scorer:
+    """
+    Snapshot korpus BM25 sebagai matriks CSR (baris = term, kolom = dokumen) yang
+    selnya sudah berisi bobot idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)).
+
+    - score(query): jumlah baris token query (token berulang dihitung berulang, sama
+      seperti BM25Okapi.get_scores).
+    - score_many(queries): matriks hitungan query (q x V) dikali matriks bobot (V x N).
+    """
+
+    def __init__(self, place_ids: Sequence[str], vocab: Dict[str, int], matrix):
+        self.place_ids: List[str] = list(place_ids)
+        self._col_by_place = {pid: idx for idx, pid in enumerate(self.place_ids)}
+        self.vocab = vocab
+        self.matrix = matrix
+
+    @classmethod
+    def from_term_freqs(
+        cls,
+        place_ids: Sequence[str],
+        doc_term_freqs: Sequence[Dict[str, int]],
+        idf: Dict[str, float],
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> 'SparseBM25Scorer':
+        """Bobot Okapi dihitung vektor (numpy) dari term frequency per dokumen."""
+        if not sparse_scoring_available():
+            raise RuntimeError('numpy/scipy belum terpasang. Jalankan: pip install numpy scipy')
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[float] = []
+        idfs: List[float] = []
+        n_docs = len(place_ids)
+        doc_len = np.zeros(n_docs, dtype=np.float64)
+        for col, freqs in enumerate(doc_term_freqs):
+            for token, tf in freqs.items():
+                rows.append(vocab.setdefault(token, len(vocab)))
+                cols.append(col)
+                tfs.append(float(tf))
+                idfs.append(float(idf.get(token) or 0.0))
+                doc_len[col] += tf
+        avgdl = float(doc_len.sum() / n_docs) if n_docs else 0.0
+
+        tf_arr = np.asarray(tfs, dtype=np.float64)
+        col_arr = np.asarray(cols, dtype=np.int64)
+        if avgdl > 0:
+            norm = k1 * (1 - b + b * doc_len[col_arr] / avgdl)
+        else:
+            norm = np.full(len(tfs), k1, dtype=np.float64)
+        weights = np.asarray(idfs, dtype=np.float64) * (tf_arr * (k1 + 1) / (tf_arr + norm))
+        matrix = sp.csr_matrix(
+            (weights, (np.asarray(rows, dtype=np.int64), col_arr)),
+            shape=(len(vocab), n_docs),
+        )
+        return cls(place_ids, vocab, matrix)
+
+    @classmethod
+    def from_doc_weights(
+        cls,
+        place_ids: Sequence[str],
+        doc_weights: Sequence[Dict[str, float]],
+    ) -> 'SparseBM25Scorer':
+        """Bangun dari bobot term per dokumen yang sudah jadi (mis. BM25F)."""
+        if not sparse_scoring_available():
+            raise RuntimeError('numpy/scipy belum terpasang. Jalankan: pip install numpy scipy')
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        data: List[float] = []
+        for col, weights in enumerate(doc_weights):
+            for token, weight in weights.items():
+                rows.append(vocab.setdefault(token, len(vocab)))
+                cols.append(col)
+                data.append(float(weight))
+        matrix = sp.csr_matrix((data, (rows, cols)), shape=(len(vocab), len(place_ids)))
+        return cls(place_ids, vocab, matrix)
+
+    @classmethod
+    def from_tokenized_corpus(
+        cls,
+        place_ids: Sequence[str],
+        tokenized_corpus: Sequence[Sequence[str]],
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> 'SparseBM25Scorer':
+        """Bangun dari keluaran build_bm25_index (place_ids + corpus token)."""
+        freqs = [Counter(doc) for doc in tokenized_corpus]
+        df: Counter = Counter()
+        for doc in freqs:
+            df.update(doc.keys())
+        return cls.from_term_freqs(place_ids, freqs, okapi_idf(df, len(freqs), epsilon), k1=k1, b=b)
+
+    def _query_rows(self, query_tokens: Sequence[str]) -> List[int]:
+        return [self.vocab[t] for t in (query_tokens or []) if t in self.vocab]
+
+    def score(self, query_tokens: Sequence[str]):
+        """Array skor (panjang = jumlah dokumen, urutan `place_ids`)."""
+        rows = self._query_rows(query_tokens)
+        if not rows:
+            return np.zeros(len(self.place_ids), dtype=np.float64)
+        return np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+
+    def score_many(self, queries: Sequence[Sequence[str]]):
+        """Matriks skor (jumlah query x jumlah dokumen)."""
+        data: List[float] = []
+        q_rows: List[int] = []
+        t_cols: List[int] = []
+        for qi, query in enumerate(queries or []):
+            for row in self._query_rows(query):
+                q_rows.append(qi)
+                t_cols.append(row)
+                data.append(1.0)
+        counts = sp.csr_matrix(
+            (data, (q_rows, t_cols)),
+            shape=(len(queries or []), len(self.vocab)),
+        )
+        return (counts @ self.matrix).toarray()
+
+    def get_scores(self, query_tokens: Sequence[str]):
+        """Kompatibel BM25Okapi.get_scores."""
+        return self.score(query_tokens)
+
+    def score_places(self, query_tokens: Sequence[str], place_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        scores = self.score(query_tokens)
+        targets = self.place_ids if place_ids is None else place_ids
+        out: Dict[str, float] = {}
+        for pid in targets:
+            col = self._col_by_place.get(pid)
+            out[pid] = float(scores[col]) if col is not None else 0.0
+        return out
+
+
+class InvertedBM25Index:
+    """
+    Posting list BM25 untuk retrieval top-K dengan early termination (MaxScore).
+
+    Tiap term menyimpan (doc_ids terurut, bobot BM25 per dokumen, bobot maksimum).
+    Term query diurutkan menurut batas atasnya; term yang jumlah batas atasnya
+    (bersama term lebih kecil) tidak bisa melampaui skor ke-K saat ini menjadi
+    "non-essential": hanya dicek lewat binary search untuk dokumen yang sudah
+    dimunculkan term essential, dan berhenti begitu sisa batas atas tidak cukup.
+    """
+
+    def __init__(self, place_ids: Sequence[str], doc_weights: Sequence[Dict[str, float]]):
+        self.place_ids: List[str] = list(place_ids)
+        self._doc_by_place = {pid: idx for idx, pid in enumerate(self.place_ids)}
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc_id, weights in enumerate(doc_weights):
+            for token, weight in weights.items():
+                docs, values = postings.setdefault(token, ([], []))
+                docs.append(doc_id)
+                values.append(weight)
+        # doc_id naik monoton karena dokumen diproses berurutan.
+        self._postings: Dict[str, Tuple[List[int], List[float], float]] = {
+            token: (docs, values, max(values))
+            for token, (docs, values) in postings.items()
+        }
+
+    @classmethod
+    def from_term_freqs(
+        cls,
+        place_ids: Sequence[str],
+        doc_term_freqs: Sequence[Dict[str, int]],
+        idf: Dict[str, float],
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> 'InvertedBM25Index':
+        return cls(place_ids, okapi_doc_weights(doc_term_freqs, idf, k1=k1, b=b))
+
+    @classmethod
+    def from_postings(cls, place_ids: Sequence[str], postings) -> 'InvertedBM25Index':
+        """Bungkus posting list yang sudah jadi (mis. view mmap BM25Snapshot) tanpa menyalin."""
+        index = cls.__new__(cls)
+        index.place_ids = list(place_ids)
+        index._doc_by_place = {pid: idx for idx, pid in enumerate(index.place_ids)}
+        index._postings = postings
+        return index
+
+    def score_places(self, query_tokens: Sequence[str], place_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """Skor penuh term-at-a-time (fallback tanpa numpy/scipy)."""
+        acc = [0.0] * len(self.place_ids)
+        for token in query_tokens or []:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            for doc_id, weight in zip(posting[0], posting[1]):
+                acc[doc_id] += weight
+        targets = self.place_ids if place_ids is None else place_ids
+        return {
+            pid: (acc[self._doc_by_place[pid]] if pid in self._doc_by_place else 0.0)
+            for pid in targets
+        }
+
+    def _covers_all(self, terms: Sequence[str], allowed: Optional[set]) -> bool:
+        """True bila setiap dokumen target memuat minimal satu term query."""
+        target = len(allowed) if allowed is not None else len(self.place_ids)
+        if sum(len(self._postings[t][0]) for t in terms) < target:
+            return False
+        union = set()
+        for t in terms:
+            union.update(self._postings[t][0])
+        if allowed is not None:
+            union &= allowed
+        return len(union) >= target
+
+    def top_k(
+        self,
+        query_tokens: Sequence[str],
+        k: int,
+        place_ids: Optional[Sequence[str]] = None,
+    ) -> Dict[str, object]:
+        """
+        Top-K place_id berdasar skor BM25 (hanya dokumen dengan skor > 0).
+        Return dict:
+          results    [(place_id, raw_score), ...] urut skor menurun
+          floor      skor minimum korpus target (0.0 bila ada dokumen tanpa term query,
+                     None bila semua dokumen memuat term query)
+          docs_scored / postings_total  berapa dokumen yang benar-benar dihitung
+        """
+        counts = Counter(t for t in (query_tokens or []) if t and t in self._postings)
+        allowed = None
+        if place_ids is not None:
+            allowed = {self._doc_by_place[pid] for pid in place_ids if pid in self._doc_by_place}
+        out: Dict[str, object] = {
+            'results': [],
+            'floor': 0.0,
+            'docs_scored': 0,
+            'postings_total': 0,
+        }
+        if not counts or k <= 0:
+            return out
+
+        terms = sorted(counts, key=lambda t: self._postings[t][2] * counts[t])
+        docs_l = [self._postings[t][0] for t in terms]
+        weights_l = [self._postings[t][1] for t in terms]
+        mult = [counts[t] for t in terms]
+        ubs = [self._postings[t][2] * counts[t] for t in terms]
+        prefix = []
+        running = 0.0
+        for ub in ubs:
+            running += ub
+            prefix.append(running)
+        n = len(terms)
+        ptr = [0] * n
+        out['postings_total'] = sum(len(d) for d in docs_l)
+        out['floor'] = None if self._covers_all(terms, allowed) else 0.0
+
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        first_essential = 0
+        docs_scored = 0
+        while first_essential < n:
+            cand = None
+            for i in range(first_essential, n):
+                if ptr[i] < len(docs_l[i]):
+                    d = docs_l[i][ptr[i]]
+                    if cand is None or d < cand:
+                        cand = d
+            if cand is None:
+                break
+
+            score = 0.0
+            for i in range(first_essential, n):
+                p = ptr[i]
+                if p < len(docs_l[i]) and docs_l[i][p] == cand:
+                    score += weights_l[i][p] * mult[i]
+                    ptr[i] = p + 1
+            if allowed is not None and cand not in allowed:
+                continue
+
+            full = len(heap) >= k
+            pruned = False
+            for i in range(first_essential - 1, -1, -1):
+                if full and score + prefix[i] <= threshold - _MAXSCORE_EPS:
+                    pruned = True
+                    break
+                docs = docs_l[i]
+                p = bisect_left(docs, cand, ptr[i])
+                ptr[i] = p
+                if p < len(docs) and docs[p] == cand:
+                    score += weights_l[i][p] * mult[i]
+            if pruned:
+                continue
+            docs_scored += 1
+            if score <= 0:
+                continue
+
+            entry = (score, -cand)
+            if not full:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+            if len(heap) >= k:
+                threshold = heap[0][0]
+                while first_essential < n and prefix[first_essential] <= threshold - _MAXSCORE_EPS:
+                    first_essential += 1
+
+        ranked = sorted(heap, reverse=True)
+        out['results'] = [(self.place_ids[-neg_doc], score) for score, neg_doc in ranked]
+        out['docs_scored'] = docs_scored
+        return out
+
+
+class KeywordPhraseMatcher:
+    """
+    Matcher multi-frasa terkompilasi untuk satu set keyword.
+
+    Keyword dipecah jadi token lalu dimasukkan ke trie token. Token review dicocokkan
+    lewat lemmanya (`lemma_fn(token)`, atau tabel lemma tersimpan per review), jadi satu
+    lintasan atas token review cukup untuk menemukan semua keyword beserta span-nya
+    (biaya ~ panjang review x panjang frasa terpanjang).
+    """
+
+    def __init__(
+        self,
+        keywords: Sequence[str],
+        *,
+        normalize_fn: Optional[Callable[[str], str]] = None,
+        lemma_fn: Optional[Callable[[str], Iterable[str]]] = None,
+    ):
+        self.keywords: List[str] = list(keywords or [])
+        self._normalize = normalize_fn
+        self._lemma_fn = lemma_fn
+        # node: token keyword -> (anak, keyword yang berakhir di node ini)
+        self._root: Dict[str, Tuple[dict, List[str]]] = {}
+        self._vocab: set = set()
+        for keyword in dict.fromkeys(self.keywords):
+            text = normalize_fn(keyword) if normalize_fn else str(keyword or '')
+            tokens = text.split()
+            if not tokens:
+                continue
+            node = self._root
+            for depth, token in enumerate(tokens):
+                children, terminals = node.setdefault(token, ({}, []))
+                if depth == len(tokens) - 1:
+                    terminals.append(keyword)
+                node = children
+                self._vocab.add(token)
+
+    def match_tokens(
+        self,
+        tokens: Sequence[str],
+        lemmas: Optional[Mapping] = None,
+    ) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        keyword -> span token inklusif (awal, akhir) di `tokens`.
+        `lemmas`: tabel lemma tersimpan untuk token ini (token tak tercantum = dirinya sendiri).
+        """
+        out: Dict[str, List[Tuple[int, int]]] = {}
+        vocab = self._vocab
+        per_token: List[Tuple[str, ...]] = []
+        for token in tokens:
+            if lemmas is not None:
+                forms = lemmas.get(token) or (token,)
+            else:
+                forms = self._lemma_fn(token) if self._lemma_fn else (token,)
+            per_token.append(tuple(form for form in forms if form in vocab))
+        n = len(per_token)
+        for i in range(n):
+            if not per_token[i]:
+                continue
+            active = [self._root]
+            j = i
+            while active and j < n:
+                candidates = per_token[j]
+                if not candidates:
+                    break
+                next_active = []
+                for children in active:
+                    for token in candidates:
+                        entry = children.get(token)
+                        if entry is None:
+                            continue
+                        next_active.append(entry[0])
+                        for keyword in entry[1]:
+                            out.setdefault(keyword, []).append((i, j))
+                active = next_active
+                j += 1
+        return out
+
+    def match_text(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Normalisasi teks (normalize_fn) lalu match_tokens dengan lemma_fn."""
+        normalized = self._normalize(text) if self._normalize else str(text or '')
+        return self.match_tokens(normalized.split()) if normalized else {}
+
+    def matched_keywords(self, matches: Dict[str, List[Tuple[int, int]]]) -> List[str]:
+        """Keyword yang cocok, urut sesuai input (duplikat input ikut dipertahankan)."""
+        return [kw for kw in self.keywords if kw in matches]
+
+
+class PhraseIndex:
+    """
+    Review satu toko (token + tabel lemma per dokumen) untuk pencocokan frasa dan kedekatan.
+
+    Frasa utuh dicocokkan lewat KeywordPhraseMatcher (satu engine dengan pencocokan
+    keyword per review): satu lintasan per dokumen untuk semua frasa. Untuk kedekatan,
+    tiap token menyimpan posisi kemunculannya per dokumen di bawah semua lemma tokennya
+    (`lemma_fn(token)`, atau tabel lemma tersimpan per dokumen di `docs_lemmas`), jadi
+    token query cukup dicari langsung sebagai bentuk dasar.
+    """
+
+    def __init__(
+        self,
+        docs_tokens: Sequence[Sequence[str]],
+        lemma_fn: Optional[Callable[[str], Iterable[str]]] = None,
+        docs_lemmas: Optional[Sequence[Optional[Mapping]]] = None,
+    ):
+        self._docs: List[Tuple[List[str], Mapping]] = []
+        self._postings: Dict[str, Dict[int, List[int]]] = {}
+        for doc_id, tokens in enumerate(docs_tokens or []):
+            table = docs_lemmas[doc_id] if docs_lemmas is not None and doc_id < len(docs_lemmas) else None
+            tokens = list(tokens or [])
+            if table is None:
+                # Lemma dihitung sekali per token unik; tabel yang sama dipakai matcher.
+                table = {token: tuple(lemma_fn(token)) for token in set(tokens)} if lemma_fn else {}
+            self._docs.append((tokens, table))
+            for pos, token in enumerate(tokens):
+                for lemma in table.get(token) or (token,):
+                    self._postings.setdefault(lemma, {}).setdefault(doc_id, []).append(pos)
+        self.n_docs = len(self._docs)
+        self._position_cache: Dict[str, Dict[int, set]] = {}
+
+    def _positions(self, token: str) -> Dict[int, set]:
+        """doc_id -> posisi token review yang punya `token` sebagai lemma."""
+        cached = self._position_cache.get(token)
+        if cached is None:
+            cached = {doc_id: set(positions) for doc_id, positions in (self._postings.get(token) or {}).items()}
+            self._position_cache[token] = cached
+        return cached
+
+    def match(self, matcher: 'KeywordPhraseMatcher') -> Dict[int, Dict[str, List[Tuple[int, int]]]]:
+        """
+        doc_id -> {keyword: span} untuk matcher terkompilasi, memakai tabel lemma dokumen
+        yang sama dengan posisi terindeks (lemma_fn matcher tidak dipakai).
+        """
+        out: Dict[int, Dict[str, List[Tuple[int, int]]]] = {}
+        for doc_id, (tokens, table) in enumerate(self._docs):
+            if not tokens:
+                continue
+            matches = matcher.match_tokens(tokens, lemmas=table)
+            if matches:
+                out[doc_id] = matches
+        return out
+
+    def phrase_spans(self, phrase_tokens: Sequence[str]) -> Dict[int, List[Tuple[int, int]]]:
+        """doc_id -> span token inklusif (awal, akhir) tempat frasa muncul berurutan."""
+        phrase = ' '.join(t for t in (phrase_tokens or []) if t)
+        if not phrase:
+            return {}
+        return {doc_id: matches[phrase] for doc_id, matches in self.match(KeywordPhraseMatcher([phrase])).items()}
+
+    def proximity_spans(self, tokens: Sequence[str], window: int) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        doc_id -> span minimum (urutan bebas) yang memuat semua `tokens` dan panjangnya
+        paling banyak `window` token.
+        """
+        unique = list(dict.fromkeys(t for t in (tokens or []) if t))
+        if not unique or window <= 0:
+            return {}
+        per_token = [self._positions(t) for t in unique]
+        docs = set(per_token[0])
+        for positions in per_token[1:]:
+            docs &= positions.keys()
+        need = len(unique)
+        out: Dict[int, List[Tuple[int, int]]] = {}
+        for doc_id in sorted(docs):
+            events = sorted((p, idx) for idx, positions in enumerate(per_token) for p in positions[doc_id])
+            counts = [0] * need
+            covered = 0
+            left = 0
+            spans: List[Tuple[int, int]] = []
+            for right, (pos, idx) in enumerate(events):
+                counts[idx] += 1
+                if counts[idx] == 1:
+                    covered += 1
+                while covered == need:
+                    start, start_idx = events[left]
+                    if counts[start_idx] == 1:
+                        if pos - start + 1 <= window:
+                            spans.append((start, pos))
+                        counts[start_idx] -= 1
+                        covered -= 1
+                        left += 1
+                        break
+                    counts[start_idx] -= 1
+                    left += 1
+            if spans:
+                out[doc_id] = spans
+        return out
+
+    def match_phrases(
+        self,
+        phrases: Sequence[str],
+        normalize_fn: Optional[Callable[[str], str]] = None,
+        matcher: Optional['KeywordPhraseMatcher'] = None,
+    ) -> Dict[int, List[str]]:
+        """
+        doc_id -> frasa (urutan input) yang muncul utuh di dokumen itu.
+        matcher: KeywordPhraseMatcher terkompilasi untuk `phrases` (mis. dari cache
+        pemanggil); tanpa itu dikompilasi di sini dengan normalize_fn.
+        """
+        if matcher is None:
+            matcher = KeywordPhraseMatcher(phrases or [], normalize_fn=normalize_fn)
+        out: Dict[int, List[str]] = {}
+        for doc_id, matches in self.match(matcher).items():
+            matched = matcher.matched_keywords(matches)
+            if matched:
+                out[doc_id] = matched
+        return out
+
+    def phrase_score(
+        self,
+        phrases: Sequence[str],
+        *,
+        window: int = 5,
+        normalize_fn: Optional[Callable[[str], str]] = None,
+    ) -> float:
+        """
+        Rata-rata per frasa multi-kata: 1.0 bila frasa utuh muncul di salah satu dokumen,
+        0.5 bila semua katanya muncul berdekatan (<= `window` token), selain itu 0.
+        """
+        multiword = {}
+        for phrase in dict.fromkeys(phrases or []):
+            tokens = (normalize_fn(phrase) if normalize_fn else str(phrase or '')).split()
+            if len(tokens) >= 2:
+                multiword[' '.join(tokens)] = tokens
+        if not multiword:
+            return 0.0
+        exact = set()
+        for matches in self.match(KeywordPhraseMatcher(list(multiword))).values():
+            exact.update(matches)
+        scores = [
+            1.0 if phrase in exact else (0.5 if self.proximity_spans(tokens, window) else 0.0)
+            for phrase, tokens in multiword.items()
+        ]
+        return sum(scores) / len(scores)
+
+
+class SpanIntervals:
+    """
+    Kumpulan span token inklusif (awal, akhir) terurut menurut awal, plus prefix-max akhir.
+    intersects(lo, hi) = ada span yang beririsan dengan [lo, hi], O(log n) per cek.
+    """
+
+    __slots__ = ('n_tokens', '_starts', '_max_ends')
+
+    def __init__(self, spans: Iterable[Tuple[int, int]], n_tokens: int):
+        ordered = sorted(set(spans or ()))
+        self.n_tokens = int(n_tokens)
+        self._starts = [start for start, _ in ordered]
+        self._max_ends = list(itertools.accumulate((end for _, end in ordered), max))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def intersects(self, lo: int, hi: int) -> bool:
+        idx = bisect_right(self._starts, hi)
+        return idx > 0 and self._max_ends[idx - 1] >= lo
+
+    def near_any(self, anchors: Iterable[Tuple[int, int]], window: int) -> bool:
+        """True bila ada span dalam +-window token dari salah satu anchor (dipotong ke batas teks)."""
+        if not self._starts or self.n_tokens <= 0:
+            return False
+        last = self.n_tokens - 1
+        return any(
+            self.intersects(max(0, a0 - window), min(last, a1 + window))
+            for a0, a1 in anchors
+        )
+
+
+def review_text_digest(text: str) -> bytes:
+    """Digest teks review (16 byte) untuk deteksi perubahan tanpa menyimpan teksnya."""
+    return hashlib.blake2b(str(text or '').encode('utf-8'), digest_size=16).digest()
+
+
+_SNAPSHOT_MAGIC = b'CFBM25S\x00'
+# Format 2: term frequency per posting (post_tf) untuk overlay perubahan lokal.
+_SNAPSHOT_FORMAT = 2
+_SNAPSHOT_DIGEST_SIZE = 16
+# magic, format, little-endian?, reserved, generation, created_at, k1, b, epsilon,
+# n_docs, n_terms, n_reviews, n_postings
+_SNAPSHOT_HEADER = struct.Struct('<8sHHIQddddIIII')
+_SNAPSHOT_SECTIONS = (
+    ('place_off', 'I'), ('place_blob', 'B'),
+    ('term_off', 'I'), ('term_blob', 'B'),
+    ('doc_len', 'I'),
+    ('term_ptr', 'I'), ('post_docs', 'I'), ('post_weights', 'd'), ('post_tf', 'I'), ('term_max', 'd'),
+    ('doc_review_ptr', 'I'),
+    ('review_key_off', 'I'), ('review_key_blob', 'B'), ('review_digest', 'B'),
+    ('review_tf_ptr', 'I'), ('review_tf_terms', 'I'), ('review_tf_counts', 'I'),
+)
+_SNAPSHOT_TABLE = struct.Struct('<' + 'QQ' * len(_SNAPSHOT_SECTIONS))
+
+
+def _pack_strings(values: Sequence[bytes]) -> Tuple[array, bytes]:
+    offsets = array('I', [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return offsets, b''.join(values)
+
+
+def read_bm25_snapshot_generation(path: str) -> int:
+    """Generasi snapshot di `path` (0 bila file tidak ada / bukan snapshot valid)."""
+    try:
+        with open(path, 'rb') as fh:
+            head = fh.read(_SNAPSHOT_HEADER.size)
+    except OSError:
+        return 0
+    if len(head) < _SNAPSHOT_HEADER.size:
+        return 0
+    fields = _SNAPSHOT_HEADER.unpack(head)
+    if fields[0] != _SNAPSHOT_MAGIC or fields[1] != _SNAPSHOT_FORMAT:
+        return 0
+    return int(fields[4])
+
+
+class _SnapshotPostings(Mapping):
+    """Posting list snapshot sebagai Mapping term -> (doc_ids, bobot, bobot maks), tanpa salin."""
+
+    def __init__(self, snapshot: 'BM25Snapshot'):
+        self._snap = snapshot
+
+    def __getitem__(self, token: str):
+        tid = self._snap.term_id(token)
+        if tid < 0:
+            raise KeyError(token)
+        snap = self._snap
+        start, end = snap._term_ptr[tid], snap._term_ptr[tid + 1]
+        return snap._post_docs[start:end], snap._post_weights[start:end], snap._term_max[tid]
+
+    def __contains__(self, token: object) -> bool:
+        return isinstance(token, str) and self._snap.term_id(token) >= 0
+
+    def __iter__(self):
+        return iter(self._snap.terms())
+
+    def __len__(self) -> int:
+        return self._snap.n_terms
+
+
+class BM25Snapshot:
+    """
+    Snapshot indeks BM25 read-only di atas mmap.
+
+    Array numerik (posting list, bobot, panjang dokumen, term frequency review) dibaca
+    langsung dari halaman file lewat memoryview, jadi beberapa proses yang membuka file
+    yang sama berbagi memori lewat page cache. Yang disalin ke memori proses hanya tabel
+    place_id (kecil, dipakai untuk lookup). File diganti secara atomik oleh penulis
+    (os.replace), sehingga mmap yang sudah terbuka tetap valid sampai dilepas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _SNAPSHOT_HEADER.size + _SNAPSHOT_TABLE.size:
+            raise ValueError('snapshot BM25 terpotong')
+        (magic, fmt, little, _reserved, generation, created_at, k1, b, epsilon,
+         n_docs, n_terms, n_reviews, n_postings) = _SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+        if magic != _SNAPSHOT_MAGIC or fmt != _SNAPSHOT_FORMAT:
+            raise ValueError('bukan snapshot BM25 yang dikenali')
+        if bool(little) != (sys.byteorder == 'little'):
+            raise ValueError('byte order snapshot BM25 tidak cocok dengan mesin ini')
+        self.generation = int(generation)
+        self.created_at = float(created_at)
+        self.k1, self.b, self.epsilon = float(k1), float(b), float(epsilon)
+        self.n_docs, self.n_terms = int(n_docs), int(n_terms)
+        self.n_reviews, self.n_postings = int(n_reviews), int(n_postings)
+
+        view = memoryview(self._mm)
+        table = _SNAPSHOT_TABLE.unpack_from(self._mm, _SNAPSHOT_HEADER.size)
+        sections = {}
+        for idx, (name, fmt_code) in enumerate(_SNAPSHOT_SECTIONS):
+            offset, length = table[2 * idx], table[2 * idx + 1]
+            if offset + length > len(self._mm):
+                raise ValueError(f'section {name} di luar batas file')
+            sections[name] = view[offset:offset + length].cast(fmt_code)
+        self._place_off = sections['place_off']
+        self._place_blob = sections['place_blob']
+        self._term_off = sections['term_off']
+        self._term_blob = sections['term_blob']
+        self.doc_len = sections['doc_len']
+        self._term_ptr = sections['term_ptr']
+        self._post_docs = sections['post_docs']
+        self._post_weights = sections['post_weights']
+        self._post_tf = sections['post_tf']
+        self._term_max = sections['term_max']
+        self._doc_review_ptr = sections['doc_review_ptr']
+        self._review_key_off = sections['review_key_off']
+        self._review_key_blob = sections['review_key_blob']
+        self._review_digest = sections['review_digest']
+        self._review_tf_ptr = sections['review_tf_ptr']
+        self._review_tf_terms = sections['review_tf_terms']
+        self._review_tf_counts = sections['review_tf_counts']
+
+        self.place_ids: List[str] = [
+            bytes(self._place_blob[self._place_off[i]:self._place_off[i + 1]]).decode('utf-8')
+            for i in range(self.n_docs)
+        ]
+        self._doc_by_place = {pid: idx for idx, pid in enumerate(self.place_ids)}
+        self.total_len = sum(self.doc_len)
+        self._terms: Optional[List[str]] = None
+        self._vocabulary: Optional[set] = None
+        self._inverted: Optional[InvertedBM25Index] = None
+
+    @property
+    def avgdl(self) -> float:
+        return (self.total_len / self.n_docs) if self.n_docs else 0.0
+
+    def _term_bytes(self, tid: int) -> bytes:
+        return bytes(self._term_blob[self._term_off[tid]:self._term_off[tid + 1]])
+
+    def term_id(self, token: str) -> int:
+        """Binary search term (urut byte UTF-8); -1 bila tidak ada."""
+        target = token.encode('utf-8')
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_terms and self._term_bytes(lo) == target:
+            return lo
+        return -1
+
+    def terms(self) -> List[str]:
+        if self._terms is None:
+            self._terms = [self._term_bytes(i).decode('utf-8') for i in range(self.n_terms)]
+        return self._terms
+
+    def vocabulary(self) -> set:
+        if self._vocabulary is None:
+            self._vocabulary = {t for t in self.terms() if t != _EMPTY_DOC_TOKEN}
+        return self._vocabulary
+
+    def document_frequencies(self) -> Counter:
+        ptr = self._term_ptr
+        return Counter({term: ptr[i + 1] - ptr[i] for i, term in enumerate(self.terms())})
+
+    def has_document(self, place_id: str) -> bool:
+        return place_id in self._doc_by_place
+
+    def term_postings(self, token: str):
+        """(doc_ids, term frequency) untuk satu term sebagai view mmap; None bila tidak ada."""
+        tid = self.term_id(token)
+        if tid < 0:
+            return None
+        start, end = self._term_ptr[tid], self._term_ptr[tid + 1]
+        return self._post_docs[start:end], self._post_tf[start:end]
+
+    def term_frequency(self, place_id: str, token: str) -> int:
+        doc_id = self._doc_by_place.get(place_id)
+        tid = self.term_id(token) if doc_id is not None else -1
+        if tid < 0:
+            return 0
+        start, end = self._term_ptr[tid], self._term_ptr[tid + 1]
+        pos = bisect_left(self._post_docs, doc_id, start, end)
+        if pos < end and self._post_docs[pos] == doc_id:
+            return self._post_tf[pos]
+        return 0
+
+    def inverted_index(self) -> InvertedBM25Index:
+        if self._inverted is None:
+            self._inverted = InvertedBM25Index.from_postings(self.place_ids, _SnapshotPostings(self))
+        return self._inverted
+
+    def _review_range(self, place_id: str) -> Optional[Tuple[int, int]]:
+        doc_id = self._doc_by_place.get(place_id)
+        if doc_id is None:
+            return None
+        return self._doc_review_ptr[doc_id], self._doc_review_ptr[doc_id + 1]
+
+    def _review_key(self, rid: int) -> str:
+        return bytes(self._review_key_blob[self._review_key_off[rid]:self._review_key_off[rid + 1]]).decode('utf-8')
+
+    def _digest(self, rid: int) -> bytes:
+        start = rid * _SNAPSHOT_DIGEST_SIZE
+        return bytes(self._review_digest[start:start + _SNAPSHOT_DIGEST_SIZE])
+
+    def review_digests(self, place_id: str) -> Dict[str, bytes]:
+        """review_key -> digest teks, untuk membandingkan dengan data DB tanpa tokenisasi."""
+        rng = self._review_range(place_id)
+        if rng is None:
+            return {}
+        return {self._review_key(rid): self._digest(rid) for rid in range(*rng)}
+
+    def doc_reviews(self, place_id: str) -> Dict[str, Tuple[bytes, Counter]]:
+        """review_key -> (digest, Counter token), bentuk yang sama dengan IncrementalBM25Index._reviews."""
+        rng = self._review_range(place_id)
+        if rng is None:
+            return {}
+        terms = self.terms()
+        out: Dict[str, Tuple[bytes, Counter]] = {}
+        for rid in range(*rng):
+            start, end = self._review_tf_ptr[rid], self._review_tf_ptr[rid + 1]
+            tf = Counter({
+                terms[self._review_tf_terms[j]]: self._review_tf_counts[j]
+                for j in range(start, end)
+            })
+            out[self._review_key(rid)] = (self._digest(rid), tf)
+        return out
+
+    def doc_length(self, place_id: str) -> int:
+        return self.doc_len[self._doc_by_place[place_id]]
+
+    def review_count(self, place_id: str) -> int:
+        rng = self._review_range(place_id)
+        return (rng[1] - rng[0]) if rng is not None else 0
+
+
+def write_bm25_snapshot(index: 'IncrementalBM25Index', path: str) -> int:
+    """
+    Tulis isi `index` ke `path` sebagai snapshot baru (atomik: file sementara + os.replace).
+    Generasi = max(generasi file lama, generasi index) + 1. Index yang masih menempel
+    ke snapshot tanpa perubahan lokal tidak ditulis ulang. Return generasi snapshot.
+    """
+    with index._lock:
+        if index._base is not None and not index._has_overlay():
+            return index.generation
+        place_ids = index.place_ids
+        freqs = [index._doc_freqs(pid) or {_EMPTY_DOC_TOKEN: 1} for pid in place_ids]
+        weights = okapi_doc_weights(freqs, index._idf(), k1=index.k1, b=index.b)
+        doc_reviews = [list(index._doc_review_entries(pid).items()) for pid in place_ids]
+        doc_len = array('I', (index._doc_length(pid) for pid in place_ids))
+        k1, b, epsilon = index.k1, index.b, index.epsilon
+        generation = max(read_bm25_snapshot_generation(path), index.generation) + 1
+
+    terms = sorted({t for doc in weights for t in doc}, key=lambda t: t.encode('utf-8'))
+    term_ids = {t: i for i, t in enumerate(terms)}
+    posting_docs: List[List[int]] = [[] for _ in terms]
+    posting_weights: List[List[float]] = [[] for _ in terms]
+    posting_tf: List[List[int]] = [[] for _ in terms]
+    for doc_id, doc in enumerate(weights):
+        for token, weight in doc.items():
+            tid = term_ids[token]
+            posting_docs[tid].append(doc_id)
+            posting_weights[tid].append(weight)
+            posting_tf[tid].append(freqs[doc_id][token])
+    term_ptr = array('I', [0])
+    post_docs = array('I')
+    post_weights = array('d')
+    post_tf = array('I')
+    for docs, values, tfs in zip(posting_docs, posting_weights, posting_tf):
+        post_docs.extend(docs)
+        post_weights.extend(values)
+        post_tf.extend(tfs)
+        term_ptr.append(len(post_docs))
+    term_max = array('d', (max(values) for values in posting_weights))
+
+    doc_review_ptr = array('I', [0])
+    review_keys: List[bytes] = []
+    review_digest = bytearray()
+    review_tf_ptr = array('I', [0])
+    review_tf_terms = array('I')
+    review_tf_counts = array('I')
+    for reviews in doc_reviews:
+        for key, (digest, tf) in reviews:
+            review_keys.append(key.encode('utf-8'))
+            review_digest += digest
+            for token, count in tf.items():
+                review_tf_terms.append(term_ids[token])
+                review_tf_counts.append(count)
+            review_tf_ptr.append(len(review_tf_terms))
+        doc_review_ptr.append(len(review_keys))
+
+    place_off, place_blob = _pack_strings([pid.encode('utf-8') for pid in place_ids])
+    term_off, term_blob = _pack_strings([t.encode('utf-8') for t in terms])
+    review_key_off, review_key_blob = _pack_strings(review_keys)
+    payloads = {
+        'place_off': place_off.tobytes(), 'place_blob': place_blob,
+        'term_off': term_off.tobytes(), 'term_blob': term_blob,
+        'doc_len': doc_len.tobytes(),
+        'term_ptr': term_ptr.tobytes(), 'post_docs': post_docs.tobytes(),
+        'post_weights': post_weights.tobytes(), 'post_tf': post_tf.tobytes(),
+        'term_max': term_max.tobytes(),
+        'doc_review_ptr': doc_review_ptr.tobytes(),
+        'review_key_off': review_key_off.tobytes(), 'review_key_blob': review_key_blob,
+        'review_digest': bytes(review_digest),
+        'review_tf_ptr': review_tf_ptr.tobytes(), 'review_tf_terms': review_tf_terms.tobytes(),
+        'review_tf_counts': review_tf_counts.tobytes(),
+    }
+
+    table: List[int] = []
+    chunks: List[bytes] = []
+    offset = _SNAPSHOT_HEADER.size + _SNAPSHOT_TABLE.size
+    for name, _fmt in _SNAPSHOT_SECTIONS:
+        pad = (-offset) % 8  # section numerik selalu rata 8 byte
+        chunks.append(b'\0' * pad)
+        offset += pad
+        data = payloads[name]
+        table.extend((offset, len(data)))
+        chunks.append(data)
+        offset += len(data)
+    header = _SNAPSHOT_HEADER.pack(
+        _SNAPSHOT_MAGIC, _SNAPSHOT_FORMAT, int(sys.byteorder == 'little'), 0,
+        generation, time.time(), k1, b, epsilon,
+        len(place_ids), len(terms), len(review_keys), len(post_docs),
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}.{threading.get_ident()}'
+    try:
+        with open(tmp_path, 'wb') as fh:
+            fh.write(header)
+            fh.write(_SNAPSHOT_TABLE.pack(*table))
+            for chunk in chunks:
+                fh.write(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    with index._lock:
+        index.generation = max(index.generation, generation)
+    return generation
+
+
+class _LazyPostings(Mapping):
+    """
+    Posting list term -> (doc_ids, bobot, bobot maks) yang dihitung saat term pertama kali
+    diminta lalu di-cache. `compute_fn(term)` mengembalikan None bila term tidak ada.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, compute_fn: Callable[[str], Optional[tuple]], terms: Callable[[], Iterable[str]]):
+        self._compute = compute_fn
+        self._terms = terms
+        self._cache: Dict[str, object] = {}
+
+    def __getitem__(self, token: str):
+        posting = self._cache.get(token)
+        if posting is None:
+            posting = self._compute(token) if isinstance(token, str) else None
+            self._cache[token] = self._MISSING if posting is None else posting
+        if posting is self._MISSING or posting is None:
+            raise KeyError(token)
+        return posting
+
+    def __contains__(self, token: object) -> bool:
+        try:
+            self[token]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._terms())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._terms())
+
+
+_index_instance_ids = itertools.count(1)
+# Minimal teks berubah dalam satu sync sebelum tokenisasi dialihkan ke batch_tokenize_fn.
+_BATCH_TOKENIZE_MIN = 64
+
+
+class IncrementalBM25Index:
+    """
+    Indeks BM25 Okapi yang bisa diperbarui per review.
+
+    Dokumen = satu toko (place_id), isinya gabungan token semua review toko itu.
+    Term frequency disimpan per review supaya ubah/hapus satu review cukup
+    menggeser statistik dokumen itu (df, panjang dokumen, total panjang korpus)
+    tanpa menyentuh toko lain. `version` naik setiap kali isi indeks berubah.
+
+    Catatan: token dihitung per review lalu dijumlahkan, jadi frasa slang multi-kata
+    yang kebetulan terpotong batas dua review tidak digabung (beda kecil dari
+    tokenisasi satu string gabungan di build_bm25_index).
+
+    Index yang dibuat dari BM25Snapshot (from_snapshot) membaca statistik langsung dari
+    mmap. Perubahan di atasnya disimpan sebagai overlay: dokumen yang berubah disalin
+    sendiri-sendiri ke memori proses (copy-on-write per toko, `_shadowed`), df disimpan
+    sebagai selisih terhadap snapshot, dan posting list gabungan (BM25 maupun BM25F)
+    dihitung per term query dari posting snapshot + overlay (_LazyPostings).
+    """
+
+    def __init__(
+        self,
+        tokenize_fn: Callable[[str], List[str]],
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        batch_tokenize_fn: Optional[Callable[[List[str]], List[List[str]]]] = None,
+    ):
+        self._tokenize = tokenize_fn
+        # Dipakai sync_profiles bila banyak review perlu di-tokenisasi sekaligus (rebuild korpus).
+        self._batch_tokenize = batch_tokenize_fn
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self._lock = threading.RLock()
+        # place_id -> {review_key: (digest teks, Counter token)}
+        self._reviews: Dict[str, Dict[str, Tuple[bytes, Counter]]] = {}
+        # place_id -> Counter token dokumen (tanpa placeholder __empty__). Dengan snapshot
+        # (_base): hanya dokumen overlay (baru, atau salinan dokumen snapshot yang berubah).
+        self._doc_tf: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        # df; dengan snapshot berisi selisih terhadap df snapshot (boleh negatif).
+        self._df: Counter = Counter()
+        self._total_len = 0
+        # place_id dokumen snapshot yang tidak berlaku lagi (diganti overlay / dihapus).
+        self._shadowed: set = set()
+        self._full_df_cache: Optional[Tuple[int, Counter]] = None
+        # field BM25F tambahan: field -> place_id -> (text, Counter token)
+        self._field_docs: Dict[str, Dict[str, Tuple[str, Counter]]] = {}
+        self._idf_cache: Optional[Tuple[int, Dict[str, float]]] = None
+        # Snapshot scoring (CSR / posting list) per versi, kunci = (jenis, konfigurasi field).
+        self._snapshots: Dict[tuple, object] = {}
+        # Snapshot mmap dasar (None = semua data di memori proses).
+        self._base: Optional[BM25Snapshot] = None
+        # Generasi snapshot terakhir yang dimuat/ditulis index ini (0 = belum pernah).
+        self.generation = 0
+        # Identitas objek index (cache skor tidak boleh tertukar antar index setelah hot-swap).
+        self.instance_id = next(_index_instance_ids)
+        self.version = 0
+        # Naik bila hanya teks field BM25F non-review yang berubah (skor Okapi biasa tetap).
+        self.field_version = 0
+        self.updated_at = 0.0
+        # (stamp korpus, waktu) sync_profiles penuh terakhir; lihat sync_profiles(stamp=...).
+        self._synced: Optional[Tuple[object, float]] = None
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        tokenize_fn: Callable[[str], List[str]],
+        snapshot: BM25Snapshot,
+        batch_tokenize_fn: Optional[Callable[[List[str]], List[List[str]]]] = None,
+    ) -> 'IncrementalBM25Index':
+        index = cls(
+            tokenize_fn,
+            k1=snapshot.k1,
+            b=snapshot.b,
+            epsilon=snapshot.epsilon,
+            batch_tokenize_fn=batch_tokenize_fn,
+        )
+        index._base = snapshot
+        index._total_len = snapshot.total_len
+        index.generation = snapshot.generation
+        index.updated_at = snapshot.created_at
+        return index
+
+    # ------------------------------------------------------------------
+    # Snapshot + overlay (semua dipanggil di bawah lock)
+    # ------------------------------------------------------------------
+
+    def _has_overlay(self) -> bool:
+        return bool(self._doc_tf or self._shadowed)
+
+    def _in_base(self, place_id: str) -> bool:
+        base = self._base
+        return base is not None and place_id not in self._shadowed and base.has_document(place_id)
+
+    def _copy_on_write(self, place_id: str) -> None:
+        """Salin satu dokumen snapshot ke overlay sebelum diubah (statistik korpus tetap)."""
+        if not self._in_base(place_id):
+            return
+        base = self._base
+        reviews = base.doc_reviews(place_id)
+        doc_tf: Counter = Counter()
+        for _digest, tf in reviews.values():
+            doc_tf.update(tf)
+        self._reviews[place_id] = reviews
+        self._doc_tf[place_id] = doc_tf
+        self._doc_len[place_id] = base.doc_length(place_id)
+        self._shadowed.add(place_id)
+
+    def _doc_freqs(self, place_id: str) -> Counter:
+        if place_id in self._doc_tf:
+            return self._doc_tf[place_id]
+        doc_tf: Counter = Counter()
+        if self._in_base(place_id):
+            for _digest, tf in self._base.doc_reviews(place_id).values():
+                doc_tf.update(tf)
+        return doc_tf
+
+    def _doc_review_entries(self, place_id: str) -> Dict[str, Tuple[bytes, Counter]]:
+        if place_id in self._reviews:
+            return self._reviews[place_id]
+        return self._base.doc_reviews(place_id) if self._in_base(place_id) else {}
+
+    def _doc_length(self, place_id: str) -> int:
+        if place_id in self._doc_len:
+            return self._doc_len[place_id]
+        return self._base.doc_length(place_id)
+
+    def _review_digests(self, place_id: str) -> Dict[str, bytes]:
+        if place_id in self._reviews:
+            return {key: entry[0] for key, entry in self._reviews[place_id].items()}
+        return self._base.review_digests(place_id) if self._in_base(place_id) else {}
+
+    def _full_df(self) -> Counter:
+        """df seluruh korpus (snapshot + selisih overlay)."""
+        base = self._base
+        if base is None:
+            return self._df
+        cached = self._full_df_cache
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        df = base.document_frequencies()
+        for token, delta in self._df.items():
+            value = df.get(token, 0) + delta
+            if value > 0:
+                df[token] = value
+            else:
+                df.pop(token, None)
+        self._full_df_cache = (self.version, df)
+        return df
+
+    # ------------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        base = self._base
+        if base is None:
+            return len(self._doc_tf)
+        return base.n_docs - len(self._shadowed) + len(self._doc_tf)
+
+    @property
+    def place_ids(self) -> List[str]:
+        with self._lock:
+            base = self._base
+            if base is None:
+                return list(self._doc_tf.keys())
+            if not self._has_overlay():
+                return list(base.place_ids)
+            # Dokumen snapshot tetap di posisinya (termasuk yang diganti overlay); dokumen baru di akhir.
+            return [
+                pid for pid in base.place_ids
+                if pid not in self._shadowed or pid in self._doc_tf
+            ] + [pid for pid in self._doc_tf if not base.has_document(pid)]
+
+    @property
+    def avgdl(self) -> float:
+        n = len(self)
+        return (self._total_len / n) if n else 0.0
+
+    def vocabulary(self) -> set:
+        """Kosakata korpus (tanpa placeholder dokumen kosong)."""
+        with self._lock:
+            if self._base is not None and not self._df:
+                return set(self._base.vocabulary())
+            return {t for t, df in self._full_df().items() if df > 0 and t != _EMPTY_DOC_TOKEN}
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            base = self._base
+            overlay_reviews = sum(len(r) for r in self._reviews.values())
+            if base is None:
+                reviews, vocabulary = overlay_reviews, len(self._df)
+            else:
+                reviews = base.n_reviews - sum(base.review_count(pid) for pid in self._shadowed) + overlay_reviews
+                vocabulary = base.n_terms if not self._df else len(self._full_df())
+            return {
+                'version': self.version,
+                'field_version': self.field_version,
+                'generation': self.generation,
+                'mmap_snapshot': base is not None,
+                'overlay_documents': len(self._doc_tf) if base is not None else 0,
+                'documents': len(self),
+                'reviews': reviews,
+                'vocabulary': vocabulary,
+                'avgdl': round(self.avgdl, 2),
+                'updated_at': self.updated_at,
+            }
+
+    # ------------------------------------------------------------------
+    # Mutasi (semua dipanggil di bawah lock)
+    # ------------------------------------------------------------------
+
+    def _touch(self) -> None:
+        self.version += 1
+        self.updated_at = time.time()
+        self._idf_cache = None
+        self._full_df_cache = None
+        self._snapshots = {}
+
+    def _df_add(self, token: str, delta: int) -> None:
+        value = self._df.get(token, 0) + delta
+        if value:
+            self._df[token] = value
+        else:
+            self._df.pop(token, None)
+
+    def _touch_field(self, field: str) -> None:
+        """Perubahan field non-review: hanya snapshot BM25F yang memakai field itu yang dibuang."""
+        self.field_version += 1
+        self.updated_at = time.time()
+        self._snapshots = {
+            key: snapshot for key, snapshot in self._snapshots.items()
+            if not (key[1] and dict(key[1]).get(field, (0.0, 0.0))[0] > 0)
+        }
+
+    def _ensure_doc(self, place_id: str) -> None:
+        self._copy_on_write(place_id)
+        if place_id in self._doc_tf:
+            return
+        self._doc_tf[place_id] = Counter()
+        self._reviews[place_id] = {}
+        # Dokumen tanpa token tetap ikut korpus lewat placeholder, sama seperti build_bm25_index.
+        self._doc_len[place_id] = 1
+        self._df_add(_EMPTY_DOC_TOKEN, 1)
+        self._total_len += 1
+
+    def _apply_delta(self, place_id: str, remove_tf: Optional[Counter], add_tf: Optional[Counter]) -> None:
+        raw = self._doc_tf[place_id]
+        was_empty = not raw
+        for token, count in (remove_tf or {}).items():
+            left = raw.get(token, 0) - count
+            if left > 0:
+                raw[token] = left
+            elif token in raw:
+                del raw[token]
+                self._df_add(token, -1)
+        for token, count in (add_tf or {}).items():
+            if token not in raw:
+                self._df_add(token, 1)
+            raw[token] = raw.get(token, 0) + count
+        is_empty = not raw
+        if was_empty and not is_empty:
+            self._df_add(_EMPTY_DOC_TOKEN, -1)
+        elif is_empty and not was_empty:
+            self._df_add(_EMPTY_DOC_TOKEN, 1)
+        new_len = sum(raw.values()) or 1
+        self._total_len += new_len - self._doc_len[place_id]
+        self._doc_len[place_id] = new_len
+
+    def _drop_doc(self, place_id: str) -> None:
+        self._copy_on_write(place_id)
+        raw = self._doc_tf.pop(place_id, None)
+        if raw is None:
+            return
+        self._reviews.pop(place_id, None)
+        for docs in self._field_docs.values():
+            docs.pop(place_id, None)
+        for token in (raw.keys() if raw else (_EMPTY_DOC_TOKEN,)):
+            self._df_add(token, -1)
+        self._total_len -= self._doc_len.pop(place_id, 0)
+
+    def _upsert_review_locked(
+        self,
+        place_id: str,
+        review_key: str,
+        text: str,
+        tokens: Optional[List[str]] = None,
+    ) -> bool:
+        digest = review_text_digest(text)
+        self._copy_on_write(place_id)
+        existing = self._reviews.get(place_id, {}).get(review_key)
+        if existing is not None and existing[0] == digest:
+            return False
+        self._ensure_doc(place_id)
+        if tokens is None:
+            tokens = self._tokenize(text) if text else []
+        new_tf = Counter(tokens)
+        self._apply_delta(place_id, existing[1] if existing else None, new_tf)
+        self._reviews[place_id][review_key] = (digest, new_tf)
+        return True
+
+    def _remove_review_locked(self, place_id: str, review_key: str) -> bool:
+        self._copy_on_write(place_id)
+        reviews = self._reviews.get(place_id)
+        if not reviews or review_key not in reviews:
+            return False
+        _text, old_tf = reviews.pop(review_key)
+        if not reviews:
+            # Toko tanpa review sama sekali tidak ikut korpus (REVIEW_BASED_MIN_REVIEWS).
+            self._drop_doc(place_id)
+        else:
+            self._apply_delta(place_id, old_tf, None)
+        return True
+
+    # ------------------------------------------------------------------
+    # API publik
+    # ------------------------------------------------------------------
+
+    def upsert_review(self, place_id: object, review_id: object, text: object) -> bool:
+        """Tambah atau ganti satu review. Return True bila indeks berubah."""
+        pid = str(place_id or '').strip()
+        if not pid or review_id is None:
+            return False
+        with self._lock:
+            changed = self._upsert_review_locked(pid, str(review_id), str(text or '').strip())
+            if changed:
+                self._touch()
+            return changed
+
+    def remove_review(self, place_id: object, review_id: object) -> bool:
+        pid = str(place_id or '').strip()
+        if not pid or review_id is None:
+            return False
+        with self._lock:
+            changed = self._remove_review_locked(pid, str(review_id))
+            if changed:
+                self._touch()
+            return changed
+
+    def remove_document(self, place_id: object) -> bool:
+        pid = str(place_id or '').strip()
+        with self._lock:
+            self._copy_on_write(pid)
+            if pid not in self._doc_tf:
+                return False
+            self._drop_doc(pid)
+            self._touch()
+            return True
+
+    def replace_document(
+        self,
+        place_id: object,
+        reviews: Iterable[dict],
+        tokens_by_text: Optional[Dict[str, List[str]]] = None,
+    ) -> bool:
+        """
+        Samakan isi satu toko dengan daftar review terkini (dict dengan 'id' & 'text').
+        Hanya review yang baru/berubah yang di-tokenisasi ulang. Token yang sudah ada
+        dipakai langsung: 'tokens' di dict review (tersimpan di DB) atau `tokens_by_text`
+        (hasil batch di depan).
+        """
+        pid = str(place_id or '').strip()
+        if not pid:
+            return False
+        desired: Dict[str, str] = {}
+        stored_tokens: Dict[str, List[str]] = {}
+        for idx, review in enumerate(reviews or []):
+            key = review.get('id')
+            key = str(key) if key is not None else f'#{idx}'
+            desired[key] = str(review.get('text') or '').strip()
+            if isinstance(review.get('tokens'), list):
+                stored_tokens[key] = review['tokens']
+        with self._lock:
+            if self._in_base(pid):
+                wanted = {key: review_text_digest(text) for key, text in desired.items()}
+                if self._base.review_digests(pid) == wanted:
+                    return False
+                self._copy_on_write(pid)
+            changed = False
+            current = self._reviews.get(pid) or {}
+            for key in [k for k in current if k not in desired]:
+                changed = self._remove_review_locked(pid, key) or changed
+            for key, text in desired.items():
+                tokens = stored_tokens.get(key)
+                if tokens is None and tokens_by_text:
+                    tokens = tokens_by_text.get(text)
+                changed = self._upsert_review_locked(pid, key, text, tokens=tokens) or changed
+            if changed:
+                self._touch()
+            return changed
+
+    def set_field_text(self, place_id: object, field: str, text: object) -> bool:
+        """Isi field BM25F non-review (mis. 'facilities', 'pros') untuk satu toko."""
+        pid = str(place_id or '').strip()
+        if not pid or field == REVIEW_FIELD:
+            return False
+        value = str(text or '').strip()
+        with self._lock:
+            docs = self._field_docs.setdefault(field, {})
+            existing = docs.get(pid)
+            if existing is not None and existing[0] == value:
+                return False
+            if existing is None and not value:
+                return False
+            if value:
+                docs[pid] = (value, Counter(self._tokenize(value)))
+            else:
+                docs.pop(pid, None)
+            self._touch_field(field)
+            return True
+
+    def _pretokenize_changed(self, profiles: Sequence[dict]) -> Dict[str, List[str]]:
+        """
+        Kumpulkan teks review yang belum ada / berubah di indeks lalu tokenisasi sekaligus
+        lewat batch_tokenize_fn. Di bawah _BATCH_TOKENIZE_MIN teks, jalur per review biasa.
+        """
+        if self._batch_tokenize is None:
+            return {}
+        pending: Dict[str, None] = {}
+        with self._lock:
+            for profile in profiles or []:
+                pid = str(profile.get('place_id') or '').strip()
+                if not pid:
+                    continue
+                current = self._review_digests(pid)
+                for idx, review in enumerate(profile.get('reviews') or []):
+                    key = review.get('id')
+                    key = str(key) if key is not None else f'#{idx}'
+                    text = str(review.get('text') or '').strip()
+                    if isinstance(review.get('tokens'), list):
+                        continue
+                    if text and current.get(key) != review_text_digest(text):
+                        pending[text] = None
+        if len(pending) < _BATCH_TOKENIZE_MIN:
+            return {}
+        texts = list(pending)
+        return dict(zip(texts, self._batch_tokenize(texts)))
+
+    def sync_profiles(
+        self,
+        profiles: Sequence[dict],
+        keep_place_ids: Iterable[str] = (),
+        *,
+        stamp: object = None,
+        max_age_seconds: float = 0.0,
+    ) -> int:
+        """
+        Cocokkan indeks dengan profil rekomendasi (hasil load DB terkini), termasuk
+        field BM25F fasilitas/pros. Menangkap perubahan yang tidak lewat hook proses
+        ini (worker lain, admin). Dokumen yang tidak ada di `profiles` (toko dihapus
+        atau kehilangan semua review) dibuang, kecuali yang ada di `keep_place_ids`
+        (mis. toko yang dieksklusi per user, masih ada di DB tapi tidak dimuat).
+        Return jumlah dokumen yang review-nya berubah/dihapus; perubahan field BM25F
+        saja tidak dihitung (tidak ikut snapshot, lihat field_version).
+
+        stamp: versi korpus yang dibaca sebelum `profiles` dimuat (mis. revisi korpus
+        lintas proses). Bila sama dengan stamp sync penuh terakhir dan umurnya belum
+        melewati max_age_seconds (0 = tanpa batas), sync dilewati (return 0): perubahan
+        di proses ini sudah masuk lewat hook tulis (notify_review_*). None = selalu penuh.
+        """
+        if stamp is not None:
+            synced = self._synced
+            if (
+                synced is not None
+                and synced[0] == stamp
+                and (not max_age_seconds or time.time() - synced[1] < max_age_seconds)
+            ):
+                return 0
+        synced_at = time.time()
+        changed = 0
+        seen = set(str(pid or '').strip() for pid in keep_place_ids or ())
+        tokens_by_text = self._pretokenize_changed(profiles)
+        for profile in profiles or []:
+            pid = str(profile.get('place_id') or '').strip()
+            if not pid:
+                continue
+            seen.add(pid)
+            if self.replace_document(pid, profile.get('reviews') or [], tokens_by_text):
+                changed += 1
+            for field, text in profile_field_texts(profile).items():
+                self.set_field_text(pid, field, text)
+        with self._lock:
+            stale = [pid for pid in self.place_ids if pid not in seen]
+            if stale:
+                for pid in stale:
+                    self._drop_doc(pid)
+                self._touch()
+                changed += len(stale)
+            self._synced = (stamp, synced_at) if stamp is not None else None
+        return changed
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _idf(self) -> Dict[str, float]:
+        cached = self._idf_cache
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        idf = okapi_idf(self._full_df(), len(self), self.epsilon)
+        self._idf_cache = (self.version, idf)
+        return idf
+
+    def _doc_weights(self, place_ids: Sequence[str], fields: Dict[str, Tuple[float, float]]) -> List[Dict[str, float]]:
+        field_freqs: Dict[str, List[Dict[str, int]]] = {
+            REVIEW_FIELD: [self._doc_tf[pid] or {_EMPTY_DOC_TOKEN: 1} for pid in place_ids],
+        }
+        for field in fields:
+            if field == REVIEW_FIELD:
+                continue
+            docs = self._field_docs.get(field) or {}
+            field_freqs[field] = [(docs.get(pid) or ('', {}))[1] for pid in place_ids]
+        return bm25f_doc_weights(field_freqs, fields, k1=self.k1, epsilon=self.epsilon)
+
+    def _overlay_index(self, fields: Optional[Dict[str, Tuple[float, float]]]) -> InvertedBM25Index:
+        """
+        Posting list snapshot mmap + overlay untuk versi saat ini. Statistik korpus dan
+        salinan kecil dokumen overlay diambil sekarang; bobot tiap term baru dihitung saat
+        term itu dipakai query, dengan rumus yang sama seperti okapi_doc_weights /
+        bm25f_doc_weights atas seluruh korpus.
+        """
+        base = self._base
+        place_ids = self.place_ids
+        order = {pid: idx for idx, pid in enumerate(place_ids)}
+        shadowed = frozenset(self._shadowed)
+        local_tf = {pid: Counter(tf or {_EMPTY_DOC_TOKEN: 1}) for pid, tf in self._doc_tf.items()}
+        local_len = dict(self._doc_len)
+        n_docs = len(place_ids)
+        avgdl = (self._total_len / n_docs) if n_docs else 0.0
+        k1, b = self.k1, self.b
+
+        def review_postings(token: str) -> List[Tuple[str, int, int]]:
+            out = []
+            hit = base.term_postings(token)
+            if hit is not None:
+                for doc_id, tf in zip(*hit):
+                    pid = base.place_ids[doc_id]
+                    if pid not in shadowed:
+                        out.append((pid, tf, base.doc_len[doc_id]))
+            for pid, tf in local_tf.items():
+                count = tf.get(token)
+                if count:
+                    out.append((pid, count, local_len[pid]))
+            return out
+
+        def posting(pairs: List[Tuple[int, float]]):
+            if not pairs:
+                return None
+            pairs.sort()
+            values = [weight for _doc, weight in pairs]
+            return [doc for doc, _weight in pairs], values, max(values)
+
+        if not fields:
+            idf = self._idf()
+
+            def compute(token: str):
+                weight = idf.get(token)
+                if weight is None:
+                    return None
+                pairs = []
+                for pid, tf, dl in review_postings(token):
+                    norm = k1 * (1 - b + b * dl / avgdl) if avgdl > 0 else k1
+                    pairs.append((order[pid], (weight or 0.0) * (tf * (k1 + 1) / (tf + norm))))
+                return posting(pairs)
+
+            return InvertedBM25Index.from_postings(place_ids, _LazyPostings(compute, idf.keys))
+
+        active = [(name, fields[name]) for name in fields if fields[name][0] > 0]
+        field_docs: Dict[str, Dict[str, Counter]] = {}
+        field_len: Dict[str, Dict[str, int]] = {}
+        field_avg: Dict[str, float] = {}
+        for name, _cfg in active:
+            if name == REVIEW_FIELD:
+                continue
+            docs = {
+                pid: entry[1] for pid, entry in (self._field_docs.get(name) or {}).items()
+                if pid in order and entry[1]
+            }
+            field_docs[name] = docs
+            field_len[name] = {pid: sum(tf.values()) for pid, tf in docs.items()}
+            field_avg[name] = (sum(field_len[name].values()) / n_docs) if n_docs else 0.0
+        review_active = any(name == REVIEW_FIELD for name, _cfg in active)
+
+        def review_has(pid: str, token: str) -> bool:
+            if pid in local_tf:
+                return token in local_tf[pid]
+            return pid not in shadowed and base.term_frequency(pid, token) > 0
+
+        # df BM25F: dokumen yang memuat term di field aktif mana pun.
+        df: Counter = Counter(self._full_df()) if review_active else Counter()
+        for pid in set().union(*field_docs.values()) if field_docs else ():
+            tokens = set()
+            for docs in field_docs.values():
+                tokens.update((docs.get(pid) or {}).keys())
+            df.update(t for t in tokens if not (review_active and review_has(pid, t)))
+        idf_f = okapi_idf(df, n_docs, self.epsilon) if active else {}
+
+        def compute_f(token: str):
+            weight = idf_f.get(token)
+            if weight is None:
+                return None
+            review_tf = {pid: (tf, dl) for pid, tf, dl in review_postings(token)} if review_active else {}
+            acc: Dict[str, float] = {}
+            for name, (boost, fb) in active:
+                if name == REVIEW_FIELD:
+                    for pid, (tf, dl) in review_tf.items():
+                        norm = (1 - fb + fb * dl / avgdl) if avgdl > 0 else 1.0
+                        acc[pid] = acc.get(pid, 0.0) + boost * tf / norm
+                    continue
+                avg = field_avg[name]
+                for pid, tf_doc in field_docs[name].items():
+                    tf = tf_doc.get(token)
+                    if tf:
+                        norm = (1 - fb + fb * field_len[name][pid] / avg) if avg > 0 else 1.0
+                        acc[pid] = acc.get(pid, 0.0) + boost * tf / norm
+            return posting([
+                (order[pid], weight * (value * (k1 + 1) / (value + k1))) for pid, value in acc.items()
+            ])
+
+        return InvertedBM25Index.from_postings(place_ids, _LazyPostings(compute_f, idf_f.keys))
+
+    def _snapshot(self, kind: str, fields: Optional[Dict[str, Tuple[float, float]]]):
+        key = (kind, tuple(sorted(fields.items())) if fields else None)
+        with self._lock:
+            cached = self._snapshots.get(key)
+            if cached is not None:
+                return cached
+            if self._base is not None:
+                # Di atas snapshot mmap hanya posting list (tanpa matriks CSR penuh).
+                if kind == 'sparse':
+                    return None
+                if not fields and not self._has_overlay():
+                    snapshot = self._base.inverted_index()
+                else:
+                    snapshot = self._overlay_index(fields)
+                self._snapshots[key] = snapshot
+                return snapshot
+            place_ids = list(self._doc_tf.keys())
+            if fields:
+                weights = self._doc_weights(place_ids, fields)
+                if kind == 'sparse':
+                    snapshot = SparseBM25Scorer.from_doc_weights(place_ids, weights)
+                else:
+                    snapshot = InvertedBM25Index(place_ids, weights)
+            else:
+                freqs = [self._doc_tf[pid] or {_EMPTY_DOC_TOKEN: 1} for pid in place_ids]
+                builder = SparseBM25Scorer if kind == 'sparse' else InvertedBM25Index
+                snapshot = builder.from_term_freqs(place_ids, freqs, self._idf(), k1=self.k1, b=self.b)
+            self._snapshots[key] = snapshot
+            return snapshot
+
+    def sparse_scorer(self, fields: Optional[Dict[str, Tuple[float, float]]] = None) -> Optional[SparseBM25Scorer]:
+        """
+        Snapshot CSR untuk versi indeks saat ini (dibangun ulang hanya bila versi berubah).
+        None tanpa numpy/scipy atau selama indeks berada di atas snapshot mmap.
+        """
+        if not sparse_scoring_available():
+            return None
+        return self._snapshot('sparse', fields)
+
+    def inverted_index(self, fields: Optional[Dict[str, Tuple[float, float]]] = None) -> InvertedBM25Index:
+        """Snapshot posting list untuk versi indeks saat ini."""
+        return self._snapshot('inverted', fields)
+
+    def top_k(
+        self,
+        query_tokens: Sequence[str],
+        k: int,
+        place_ids: Optional[Sequence[str]] = None,
+        fields: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> Dict[str, object]:
+        """Top-K MaxScore atas dokumen di indeks (lihat InvertedBM25Index.top_k)."""
+        return self.inverted_index(fields).top_k(query_tokens, k, place_ids=place_ids)
+
+    def score_places(
+        self,
+        query_tokens: Sequence[str],
+        place_ids: Optional[Sequence[str]] = None,
+        fields: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> Dict[str, float]:
+        """Raw BM25 (atau BM25F bila `fields` diisi) per place_id (default: semua dokumen)."""
+        with self._lock:
+            targets = list(place_ids) if place_ids is not None else self.place_ids
+            q = [t for t in (query_tokens or []) if t]
+            if not q or not len(self):
+                return {pid: 0.0 for pid in targets}
+            if self._base is not None:
+                return self.inverted_index(fields).score_places(q, targets)
+            scorer = self.sparse_scorer(fields)
+            if scorer is not None:
+                return scorer.score_places(q, targets)
+            if fields:
+                return self.inverted_index(fields).score_places(q, targets)
+            idf = self._idf()
+            avgdl = self.avgdl
+            k1, b = self.k1, self.b
+            out: Dict[str, float] = {}
+            for pid in targets:
+                raw = self._doc_tf.get(pid)
+                if raw is None:
+                    out[pid] = 0.0
+                    continue
+                norm = k1 * (1 - b + b * self._doc_len[pid] / avgdl)
+                score = 0.0
+                for token in q:
+                    tf = raw.get(token, 0)
+                    if tf:
+                        score += (idf.get(token) or 0.0) * (tf * (k1 + 1) / (tf + norm))
+                out[pid] = score
+            return out
+
+    def get_scores(self, query_tokens: Sequence[str]) -> List[float]:
+        """Kompatibel BM25Okapi.get_scores: urutan mengikuti `place_ids`."""
+        scores = self.score_places(query_tokens)
+        return [scores.get(pid, 0.0) for pid in self.place_ids]
+
+    def state_key(self, fields: Optional[Dict[str, Tuple[float, float]]] = None) -> Tuple[int, int, int, int]:
+        """
+        (instance, generasi snapshot, versi, versi field): berubah setiap kali skor bisa
+        berubah. Tanpa `fields` (BM25 biasa) perubahan field BM25F tidak ikut dihitung.
+        """
+        with self._lock:
+            return self.instance_id, self.generation, self.version, (self.field_version if fields else 0)
+
+
+class BM25ScoreCache:
+    """
+    LRU hasil scoring BM25 per query. Kunci = (state_key index, token query terurut,
+    konfigurasi scoring, daftar toko target). Begitu state index berubah (review baru,
+    hot-swap snapshot) seluruh isi cache dibuang karena skor lama tidak berlaku lagi.
+    Nilai yang disimpan dianggap read-only oleh pemanggil.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = max(0, int(maxsize))
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[tuple, object]' = OrderedDict()
+        self._state: Optional[tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+        index: IncrementalBM25Index,
+        query_tokens: Sequence[str],
+        place_ids: Sequence[str],
+        *,
+        fields: Optional[Dict[str, Tuple[float, float]]] = None,
+        top_k: int = 0,
+    ) -> tuple:
+        targets = hashlib.blake2b('\x1f'.join(str(pid) for pid in place_ids).encode('utf-8'), digest_size=16).digest()
+        return (
+            index.state_key(fields),
+            tuple(sorted(t for t in (query_tokens or []) if t)),
+            tuple(sorted(fields.items())) if fields else None,
+            int(top_k or 0),
+            len(place_ids),
+            targets,
+        )
+
+    def _observe_state(self, state: tuple) -> None:
+        if state != self._state:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._state = state
+
+    def get(self, key: tuple):
+        with self._lock:
+            self._observe_state(key[0])
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._observe_state(key[0])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_shared_index: Optional[IncrementalBM25Index] = None
+_shared_index_lock = threading.Lock()
+# (path, inode, mtime_ns, size) file snapshot terakhir yang sudah diperiksa proses ini.
+_snapshot_seen: Optional[Tuple[str, int, int, int]] = None
+
+
+def _maybe_swap_to_snapshot(
+    tokenize_fn: Callable[[str], List[str]],
+    snapshot_path: str,
+    batch_tokenize_fn: Optional[Callable[[List[str]], List[List[str]]]] = None,
+) -> None:
+    """Ganti indeks bersama dengan snapshot di disk bila generasinya lebih baru."""
+    global _shared_index, _snapshot_seen
+    try:
+        st = os.stat(snapshot_path)
+    except OSError:
+        return
+    signature = (snapshot_path, st.st_ino, st.st_mtime_ns, st.st_size)
+    if signature == _snapshot_seen:
+        return
+    with _shared_index_lock:
+        if signature == _snapshot_seen:
+            return
+        _snapshot_seen = signature
+        current = _shared_index
+        if current is not None and read_bm25_snapshot_generation(snapshot_path) <= current.generation:
+            return
+        try:
+            snapshot = BM25Snapshot(snapshot_path)
+        except Exception as e:
+            print(f"[BM25] Snapshot {snapshot_path} tidak bisa dibuka: {e}", flush=True)
+            return
+        # Perubahan lokal yang belum masuk snapshot dikejar lagi oleh sync_profiles berikutnya.
+        _shared_index = IncrementalBM25Index.from_snapshot(tokenize_fn, snapshot, batch_tokenize_fn)
+        print(
+            f"[BM25] Snapshot generasi {snapshot.generation} dimuat via mmap "
+            f"(toko={snapshot.n_docs}, term={snapshot.n_terms})",
+            flush=True,
+        )
+
+
+def get_shared_bm25_index(
+    tokenize_fn: Callable[[str], List[str]],
+    snapshot_path: Optional[str] = None,
+    batch_tokenize_fn: Optional[Callable[[List[str]], List[List[str]]]] = None,
+) -> IncrementalBM25Index:
+    """
+    Indeks BM25 bersama per proses; dibuat sekali, diisi lewat sync_profiles / hook review.
+    Dengan `snapshot_path`, indeks dimuat dari snapshot mmap dan otomatis pindah ke
+    generasi yang lebih baru begitu file snapshot diganti proses lain.
+    `batch_tokenize_fn` (mis. slang_normalize.tokenize_texts) dipakai saat sync massal.
+    """
+    global _shared_index
+    if snapshot_path:
+        _maybe_swap_to_snapshot(tokenize_fn, snapshot_path, batch_tokenize_fn)
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = IncrementalBM25Index(tokenize_fn, batch_tokenize_fn=batch_tokenize_fn)
+    return _shared_index
+
+
+def publish_bm25_snapshot(index: IncrementalBM25Index, snapshot_path: str) -> Optional[int]:
+    """Tulis snapshot dari indeks ini untuk dipakai worker lain. Error hanya di-log."""
+    try:
+        t0 = time.perf_counter()
+        generation = write_bm25_snapshot(index, snapshot_path)
+        print(
+            f"[BM25] Snapshot generasi {generation} ditulis ke {snapshot_path} "
+            f"({round((time.perf_counter() - t0) * 1000, 1)} ms)",
+            flush=True,
+        )
+        return generation
+    except Exception as e:
+        print(f"[BM25] Gagal menulis snapshot {snapshot_path}: {e}", flush=True)
+        return None
+
+
+def notify_review_upserted(place_id: object, review_id: object, text: object) -> None:
+    """Hook tulis review: no-op sampai indeks bersama pertama kali dipakai."""
+    index = _shared_index
+    if index is not None:
+        index.upsert_review(place_id, review_id, text)
+
+
+def notify_review_deleted(place_id: object, review_id: object) -> None:
+    index = _shared_index
+    if index is not None:
+        index.remove_review(place_id, review_id)
+
+
+def notify_place_deleted(place_id: object) -> None:
+    index = _shared_index
+    if index is not None:
+        index.remove_document(place_id)
@@ -3,12 +3,34 @@ Backend database: Supabase (PostgreSQL).
 - DATABASE_URL (atau SUPABASE_DB_URL) wajib ter-set.
 - Kode aplikasi menulis SQL bergaya SQLite (placeholder `?`), lalu diadaptasi
   ke sintaks Postgres oleh AdaptingCursor/AdaptingConnection di modul ini.
+- get_connection() meminjam koneksi dari pool per proses; AdaptingConnection.close()
+  mengembalikannya ke pool (bukan menutup socket).
+
+Env pool:
+  COFIND_DB_POOL_ENABLED            pakai pool (default: true)
+  COFIND_DB_POOL_SIZE               koneksi idle yang disimpan per proses
+                                    (default: GUNICORN_THREADS atau 4, selaras --threads di Procfile)
+  COFIND_DB_POOL_MAX_OVERFLOW       koneksi tambahan saat burst, ditutup saat dikembalikan (default: = size)
+  COFIND_DB_POOL_TIMEOUT_SECONDS    lama menunggu koneksi bebas sebelum error (default: 10)
+  COFIND_DB_POOL_MAX_LIFETIME_SECONDS  umur maksimum koneksi sebelum didaur ulang (default: 1800)
+  COFIND_DB_POOL_PING_IDLE_SECONDS  koneksi idle lebih lama dari ini dicek `SELECT 1` dulu (default: 30)
+  COFIND_SQL_TRANSLATION_CACHE_SIZE jumlah string SQL hasil adaptasi yang di-cache (default: 1024)
+
+Env streaming (opt-in):
+  COFIND_DB_STREAM_RESULTS          query besar dibaca lewat server-side cursor (default: false)
+  COFIND_DB_STREAM_ITERSIZE         baris per round-trip server-side cursor (default: 500)
 """
 from __future__ import annotations
 
 import os
 import re
-from typing import Any, Optional
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 
@@ -34,6 +56,26 @@ def use_postgres() -> bool:
     return bool(DATABASE_URL)
 
 
+def _env_int(name: str, default: int, *, min_value: int = 0) -> int:
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        return max(min_value, int(raw))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float, *, min_value: float = 0.0) -> float:
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        return max(min_value, float(raw))
+    except ValueError:
+        return default
+
+
 def _adapt_sql_postgres(sql: str) -> str:
     s = sql.replace("?", "%s")
     s = s.replace("datetime('now')", "NOW()")
@@ -78,6 +120,38 @@ def _needs_returning_id(original_sql: str, adapted_sql: str) -> bool:
     return bool(table and table in _INSERT_RETURNING_TABLES)
 
 
+# Aplikasi mengirim beberapa ratus string SQL yang sama berulang-ulang; hasil adaptasi
+# dialek disimpan supaya jalur panas tidak menjalankan replace/regex tiap query.
+# Nilai env tidak valid jatuh ke default (bukan error saat import).
+_SQL_TRANSLATION_CACHE_SIZE = _env_int("COFIND_SQL_TRANSLATION_CACHE_SIZE", 1024)
+
+
+@lru_cache(maxsize=_SQL_TRANSLATION_CACHE_SIZE)
+def _translate_sql(sql: str) -> tuple:
+    """
+    Return (sql_postgres, sql_returning_id) untuk satu string SQL gaya SQLite.
+    sql_returning_id = versi dengan `RETURNING id` bila INSERT perlu lastrowid, selain itu None.
+    """
+    adapted = _adapt_sql_postgres(sql)
+    returning = None
+    if _needs_returning_id(sql, adapted):
+        returning = adapted.rstrip().rstrip(";") + " RETURNING id"
+    return adapted, returning
+
+
+def sql_translation_cache_stats() -> Dict[str, Any]:
+    """Hit/miss cache terjemahan SQL untuk monitoring."""
+    info = _translate_sql.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
 def dict_from_row(cursor: Any, row: Any) -> Optional[dict]:
     if row is None:
         return None
@@ -95,17 +169,18 @@ def dict_from_row(cursor: Any, row: Any) -> Optional[dict]:
 
 
 class AdaptingCursor:
-    def __init__(self, raw: Any):
+    def __init__(self, raw: Any, conn: Optional["AdaptingConnection"] = None):
         self._cur = raw
+        # Referensi ke koneksi pemilik supaya koneksi pool tidak dikembalikan
+        # (lewat finalizer) selama cursor-nya masih dipakai.
+        self._conn = conn
         self._last_insert_id: Optional[int] = None
 
     def execute(self, sql: str, params: Optional[tuple] = None):
         params = params or ()
-        original = sql
-        sql_adapted = _adapt_sql_postgres(sql)
-        if _needs_returning_id(original, sql_adapted):
-            sql_adapted = sql_adapted.rstrip().rstrip(";") + " RETURNING id"
-            self._cur.execute(sql_adapted, params)
+        sql_adapted, sql_returning = _translate_sql(sql)
+        if sql_returning is not None:
+            self._cur.execute(sql_returning, params)
             row = self._cur.fetchone()
             self._last_insert_id = int(row[0]) if row and row[0] is not None else None
         else:
@@ -114,7 +189,7 @@ class AdaptingCursor:
         return self
 
     def executemany(self, sql: str, seq_of_params):
-        sql = _adapt_sql_postgres(sql)
+        sql = _translate_sql(sql)[0]
         return self._cur.executemany(sql, seq_of_params)
 
     def fetchone(self):
@@ -123,6 +198,14 @@ class AdaptingCursor:
     def fetchall(self):
         return self._cur.fetchall()
 
+    def fetchmany(self, size: Optional[int] = None):
+        if size is None:
+            return self._cur.fetchmany()
+        return self._cur.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cur)
+
     @property
     def description(self):
         return self._cur.description
@@ -136,8 +219,17 @@ class AdaptingCursor:
 
 
 class AdaptingConnection:
-    def __init__(self, raw: Any):
+    def __init__(self, raw: Any, pool: Optional["ConnectionPool"] = None):
         self._raw = raw
+        self._pool = pool
+        self._closed = False
+        # Koneksi yang lupa di-close (mis. early return tanpa close) tetap kembali
+        # ke pool saat objek ini dibuang garbage collector (lewat antrean, lihat
+        # ConnectionPool._enqueue_return).
+        if pool is not None:
+            self._finalizer = weakref.finalize(self, pool._enqueue_return, raw)
+        else:
+            self._finalizer = None
 
     def __enter__(self):
         self._raw.__enter__()
@@ -147,13 +239,23 @@ class AdaptingConnection:
         return self._raw.__exit__(exc_type, exc, tb)
 
     def cursor(self, *args, **kwargs):
-        return AdaptingCursor(self._raw.cursor(*args, **kwargs))
+        return AdaptingCursor(self._raw.cursor(*args, **kwargs), self)
 
     def execute(self, sql, params=None):
         cur = self.cursor()
         cur.execute(sql, params or ())
         return cur
 
+    def streaming_cursor(self, *, itersize: Optional[int] = None, name: Optional[str] = None) -> AdaptingCursor:
+        """
+        Server-side cursor (named cursor psycopg2): saat diiterasi, baris diambil per
+        `itersize` dari server alih-alih seluruh hasil dimuat ke memori sekaligus.
+        Hanya untuk SELECT, dan harus dihabiskan sebelum commit/rollback/close.
+        """
+        raw_cur = self._raw.cursor(name=name or f"cofind_stream_{uuid.uuid4().hex[:12]}")
+        raw_cur.itersize = int(itersize or stream_itersize())
+        return AdaptingCursor(raw_cur, self)
+
     def commit(self):
         return self._raw.commit()
 
@@ -161,8 +263,19 @@ class AdaptingConnection:
         return self._raw.rollback()
 
     def close(self):
+        if self._closed:
+            return None
+        self._closed = True
+        if self._finalizer is not None:
+            if self._finalizer.detach() is not None:
+                self._pool._release(self._raw)
+            return None
         return self._raw.close()
 
+    @property
+    def closed(self) -> bool:
+        return self._closed or bool(getattr(self._raw, "closed", False))
+
     @property
     def row_factory(self):
         return getattr(self._raw, "row_factory", None)
@@ -173,9 +286,45 @@ class AdaptingConnection:
             self._raw.row_factory = value
 
 
-def get_connection() -> AdaptingConnection:
-    import time
+def _gunicorn_threads() -> Optional[int]:
+    """Jumlah thread per worker gunicorn bila diketahui dari env."""
+    raw = (os.getenv("GUNICORN_THREADS") or "").strip()
+    if raw.isdigit() and int(raw) > 0:
+        return int(raw)
+    m = re.search(r"--threads[=\s]+(\d+)", os.getenv("GUNICORN_CMD_ARGS") or "")
+    if m and int(m.group(1)) > 0:
+        return int(m.group(1))
+    return None
+
+
+def streaming_enabled() -> bool:
+    raw = (os.getenv("COFIND_DB_STREAM_RESULTS") or "").strip().lower()
+    return raw in ("1", "true", "yes", "on")
+
+
+def stream_itersize() -> int:
+    return _env_int("COFIND_DB_STREAM_ITERSIZE", 500, min_value=1)
+
 
+def pool_enabled() -> bool:
+    raw = (os.getenv("COFIND_DB_POOL_ENABLED") or "").strip().lower()
+    if not raw:
+        return True
+    return raw in ("1", "true", "yes", "on")
+
+
+_TRANSIENT_CONNECT_ERRORS = (
+    "could not translate host name",
+    "name or service not known",
+    "temporary failure in name resolution",
+    "could not connect to server",
+    "timeout expired",
+    "connection timed out",
+    "network is unreachable",
+)
+
+
+def _connect_raw():
     import psycopg2
     from psycopg2 import OperationalError
 
@@ -186,24 +335,315 @@ def get_connection() -> AdaptingConnection:
     last_err: Optional[BaseException] = None
     for attempt in range(3):
         try:
-            raw = psycopg2.connect(DATABASE_URL, connect_timeout=10)
-            return AdaptingConnection(raw)
+            return psycopg2.connect(DATABASE_URL, connect_timeout=10)
         except OperationalError as e:
             last_err = e
             msg = str(e).lower()
-            transient = any(
-                s in msg
-                for s in (
-                    "could not translate host name",
-                    "name or service not known",
-                    "temporary failure in name resolution",
-                    "could not connect to server",
-                    "timeout expired",
-                    "connection timed out",
-                    "network is unreachable",
-                )
-            )
+            transient = any(s in msg for s in _TRANSIENT_CONNECT_ERRORS)
             if not transient or attempt == 2:
                 raise
             time.sleep(0.5 * (2 ** attempt))
     raise last_err  # pragma: no cover
+
+
+class PoolTimeout(RuntimeError):
+    """Semua koneksi pool sedang dipakai melewati batas waktu tunggu."""
+
+
+class ConnectionPool:
+    """
+    Pool koneksi psycopg2 thread-safe per proses.
+
+    - `size` koneksi idle disimpan untuk dipakai ulang; saat semua terpakai pool boleh
+      membuka sampai `max_overflow` koneksi tambahan yang ditutup begitu dikembalikan.
+    - Koneksi idle lebih lama dari `ping_idle_seconds` dicek `SELECT 1` sebelum dipinjamkan.
+    - Koneksi yang umurnya melewati `max_lifetime_seconds` ditutup dan diganti baru.
+    - Koneksi yang dikembalikan finalizer GC masuk antrean tanpa lock, lalu diproses
+      (_drain_returns) di luar critical section oleh acquire/_release berikutnya.
+    """
+
+    # Batas satu kali tunggu acquire supaya koneksi dari finalizer tetap terlihat.
+    _RETURN_POLL_SECONDS = 0.1
+
+    def __init__(
+        self,
+        connect_fn,
+        *,
+        size: int,
+        max_overflow: int,
+        timeout_seconds: float,
+        max_lifetime_seconds: float,
+        ping_idle_seconds: float,
+    ):
+        self._connect_fn = connect_fn
+        self.size = max(1, int(size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout_seconds = float(timeout_seconds)
+        self.max_lifetime_seconds = float(max_lifetime_seconds)
+        self.ping_idle_seconds = float(ping_idle_seconds)
+        self._cond = threading.Condition(threading.Lock())
+        # Finalizer AdaptingConnection bisa jalan saat GC di thread yang sedang memegang
+        # lock pool; karena itu finalizer hanya menaruh koneksi di antrean ini (deque:
+        # append/popleft atomik) dan tidak pernah menunggu lock.
+        self._pending_returns: deque = deque()
+        # LIFO: koneksi yang baru dipakai lebih mungkin masih sehat.
+        self._idle: List[tuple] = []  # (raw, created_at, returned_at)
+        self._created_at: Dict[int, float] = {}
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "recycled_lifetime": 0,
+            "ping_failures": 0,
+            "broken_on_return": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "in_use_peak": 0,
+        }
+
+    @property
+    def max_connections(self) -> int:
+        return self.size + self.max_overflow
+
+    def _reset_after_fork(self) -> None:
+        # Socket hasil fork milik proses induk: buang referensinya tanpa close()
+        # supaya pesan Terminate tidak memutus koneksi milik induk.
+        self._idle = []
+        self._created_at = {}
+        self._in_use = 0
+        self._pending_returns = deque()
+        self._pid = os.getpid()
+
+    def _close_raw(self, raw) -> None:
+        self._created_at.pop(id(raw), None)
+        self._stats["closed"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.max_lifetime_seconds > 0 and (now - created_at) >= self.max_lifetime_seconds
+
+    def _is_healthy(self, raw) -> bool:
+        try:
+            if raw.closed:
+                return False
+            cur = raw.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _take_idle(self) -> Optional[tuple]:
+        """Ambil satu koneksi idle yang masih layak; yang kedaluwarsa ditutup. Dipanggil di bawah lock."""
+        now = time.monotonic()
+        while self._idle:
+            raw, created_at, returned_at = self._idle.pop()
+            if getattr(raw, "closed", False):
+                self._close_raw(raw)
+                continue
+            if self._expired(created_at, now):
+                self._stats["recycled_lifetime"] += 1
+                self._close_raw(raw)
+                continue
+            return raw, returned_at
+        return None
+
+    def acquire(self) -> AdaptingConnection:
+        deadline = time.monotonic() + self.timeout_seconds
+        wait_started: Optional[float] = None
+        self._drain_returns()
+        self._cond.acquire()
+        try:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+            while True:
+                picked = self._take_idle()
+                if picked is not None or self._in_use < self.max_connections:
+                    self._in_use += 1
+                    break
+                if self._pending_returns:
+                    # Koneksi dari finalizer menunggu diproses: lepas lock dulu.
+                    self._cond.release()
+                    try:
+                        self._drain_returns()
+                    finally:
+                        self._cond.acquire()
+                    continue
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._stats["wait_ms_total"] += (time.monotonic() - wait_started) * 1000
+                    raise PoolTimeout(
+                        f"Pool koneksi DB penuh ({self.max_connections} dipakai) "
+                        f"setelah menunggu {self.timeout_seconds:.1f}s"
+                    )
+                # Dibatasi: finalizer tidak selalu bisa membangunkan penunggu (lock terpegang).
+                self._cond.wait(min(remaining, self._RETURN_POLL_SECONDS))
+            self._stats["checkouts"] += 1
+            self._stats["in_use_peak"] = max(self._stats["in_use_peak"], self._in_use)
+            if wait_started is not None:
+                waited_ms = (time.monotonic() - wait_started) * 1000
+                self._stats["wait_ms_total"] += waited_ms
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+        finally:
+            self._cond.release()
+
+        # I/O (ping / connect) di luar lock supaya thread lain tidak ikut tertahan.
+        try:
+            raw = None
+            if picked is not None:
+                raw, returned_at = picked
+                idle_for = time.monotonic() - returned_at
+                if idle_for >= self.ping_idle_seconds and not self._is_healthy(raw):
+                    with self._cond:
+                        self._stats["ping_failures"] += 1
+                        self._close_raw(raw)
+                    raw = None
+            if raw is None:
+                raw = self._connect_fn()
+                with self._cond:
+                    self._created_at[id(raw)] = time.monotonic()
+                    self._stats["created"] += 1
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return AdaptingConnection(raw, self)
+
+    def _enqueue_return(self, raw) -> None:
+        """
+        Target finalizer AdaptingConnection: antrekan koneksi tanpa menunggu lock (GC bisa
+        terpicu di thread yang sedang memegangnya). Penunggu acquire dibangunkan bila lock
+        sedang bebas; selain itu antrean diproses acquire/_release berikutnya.
+        """
+        self._pending_returns.append(raw)
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify()
+            finally:
+                self._cond.release()
+
+    def _drain_returns(self) -> None:
+        """Proses koneksi antrean finalizer. Dipanggil tanpa memegang lock pool."""
+        while True:
+            try:
+                raw = self._pending_returns.popleft()
+            except IndexError:
+                return
+            self._return(raw)
+
+    def _release(self, raw) -> None:
+        """Kembalikan koneksi ke pool (AdaptingConnection.close), lalu proses antrean finalizer."""
+        self._return(raw)
+        self._drain_returns()
+
+    def _return(self, raw) -> None:
+        reusable = False
+        try:
+            if not raw.closed:
+                from psycopg2 import extensions
+
+                status = raw.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    reusable = False
+                else:
+                    # Transaksi yang belum di-commit tidak boleh bocor ke peminjam berikutnya.
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        raw.rollback()
+                    reusable = True
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._in_use = max(0, self._in_use - 1)
+            created_at = self._created_at.get(id(raw), time.monotonic())
+            now = time.monotonic()
+            if not reusable:
+                self._stats["broken_on_return"] += 1
+                self._close_raw(raw)
+            elif self._expired(created_at, now):
+                self._stats["recycled_lifetime"] += 1
+                self._close_raw(raw)
+            elif len(self._idle) >= self.size:
+                # Koneksi overflow: tutup, jangan simpan melebihi ukuran pool.
+                self._close_raw(raw)
+            else:
+                self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def close_idle(self) -> int:
+        """Tutup semua koneksi idle (mis. saat shutdown). Return jumlah yang ditutup."""
+        self._drain_returns()
+        with self._cond:
+            idle, self._idle = self._idle, []
+            for raw, _created, _returned in idle:
+                self._close_raw(raw)
+            return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        self._drain_returns()
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out["size"] = self.size
+            out["max_overflow"] = self.max_overflow
+            out["in_use"] = self._in_use
+            out["idle"] = len(self._idle)
+            out["pending_returns"] = len(self._pending_returns)
+        out["wait_ms_total"] = round(out["wait_ms_total"], 1)
+        out["wait_ms_max"] = round(out["wait_ms_max"], 1)
+        out["wait_ms_avg"] = round(out["wait_ms_total"] / out["waits"], 1) if out["waits"] else 0.0
+        return out
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool per proses; dibuat malas saat koneksi pertama diminta."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = _env_int("COFIND_DB_POOL_SIZE", _gunicorn_threads() or 4, min_value=1)
+                _pool = ConnectionPool(
+                    _connect_raw,
+                    size=size,
+                    max_overflow=_env_int("COFIND_DB_POOL_MAX_OVERFLOW", size),
+                    timeout_seconds=_env_float("COFIND_DB_POOL_TIMEOUT_SECONDS", 10.0),
+                    max_lifetime_seconds=_env_float("COFIND_DB_POOL_MAX_LIFETIME_SECONDS", 1800.0),
+                    ping_idle_seconds=_env_float("COFIND_DB_POOL_PING_IDLE_SECONDS", 30.0),
+                )
+    return _pool
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Metrik pool (checkout, wait, pemakaian) untuk /health dan log [METRIC]."""
+    if not pool_enabled():
+        return {"enabled": False}
+    if _pool is None:
+        return {"enabled": True, "initialized": False}
+    return dict(_pool.stats(), enabled=True, initialized=True)
+
+
+def get_connection() -> AdaptingConnection:
+    if not pool_enabled():
+        return AdaptingConnection(_connect_raw())
+    return get_pool().acquire()
@@ -48,6 +48,8 @@ async function requestPlainJson({ apiBase, token, preferences, signal }) {
 /**
  * Jalankan pipeline rekomendasi sambil melaporkan progress tiap tahap.
  * @param {(progress: {stage: string, label?: string, percent?: number}) => void} onProgress
+ * @param {(delta: {place_id: string, name: string, delta: string}) => void} [onSummaryDelta]
+ *   Potongan teks summary per toko selama LLM menulis (draf; teks final ada di event `result`).
  * @returns {Promise<{statusCode: number, body: object|null, streamed: boolean}>}
  */
 export async function streamRecommendations({
@@ -55,6 +57,7 @@ export async function streamRecommendations({
     token,
     preferences,
     onProgress,
+    onSummaryDelta,
     signal,
 }) {
     if (typeof window === 'undefined' || !window.ReadableStream || !window.TextDecoder) {
@@ -112,6 +115,8 @@ export async function streamRecommendations({
                 if (parsed) {
                     if (parsed.event === 'progress') {
                         onProgress?.(parsed.data);
+                    } else if (parsed.event === 'summary_delta') {
+                        onSummaryDelta?.(parsed.data);
                     } else if (parsed.event === 'result') {
                         result = {
                             statusCode: parsed.data?.status_code ?? 200,
@@ -12,12 +12,38 @@ Lingkungan:
   HF_LLM_DEFAULT_REPETITION_PENALTY — default repetition penalty (default: 1.1)
   HF_LLM_MAX_RETRIES — retry maksimum per request (default: 1)
   HF_LLM_BACKOFF_FACTOR — backoff factor retry (default: 0.8)
+  HF_LLM_RESPONSE_CACHE — cache respons: off | memory | sqlite | redis (default: off, lihat llm_cache.py)
+  HF_LLM_RESPONSE_CACHE_TTL_SECONDS — umur entri cache respons (default: 86400)
+  HF_LLM_RESPONSE_CACHE_MAX_ENTRIES — batas jumlah entri cache respons (default: 2000)
+  HF_LLM_RESPONSE_CACHE_PATH — file SQLite untuk store sqlite (default: data/llm_response_cache.sqlite3)
+  HF_LLM_MAX_IN_FLIGHT — batas request bersamaan ke router per proses (default: 4, 0 = tanpa batas)
+  HF_LLM_TOKENS_PER_MINUTE — anggaran token/menit, estimasi prompt + max_tokens (default: 0 = tanpa batas)
+  HF_LLM_LIMITER_PRIORITIES — prioritas antrean per call site, kecil = duluan (lihat _DEFAULT_LIMITER_PRIORITIES)
+  HF_LLM_LIMITER_AGING_SECONDS — tiap N detik menunggu menaikkan prioritas satu tingkat (default: 5)
+  HF_LLM_LIMITER_MAX_WAIT_SECONDS — batas tunggu antrean sebelum LLMRateLimitTimeout (default: 30)
+  HF_LLM_LIMITER_REDIS — bagi batas in-flight/token/jeda 429 lintas proses lewat Redis (default: false)
+  HF_LLM_CIRCUIT_BREAKER — circuit breaker router (default: true, lihat llm_circuit.py)
+  HF_LLM_CIRCUIT_FAILURE_THRESHOLD — kegagalan/respons lambat berturut-turut sebelum terbuka (default: 5)
+  HF_LLM_CIRCUIT_OPEN_SECONDS — lama circuit terbuka sebelum probe half-open (default: 30)
+  HF_LLM_CIRCUIT_HALF_OPEN_PROBES — request probe bersamaan saat half-open (default: 1)
+  HF_LLM_LATENCY_SLO_SECONDS — respons sukses di atas ini dihitung pelanggaran SLO (default: 30, 0 = nonaktif)
+  HF_LLM_ADAPTIVE_TIMEOUT — timeout per call site dari p95/p99 latensi, termasuk percobaan yang timeout (default: true)
+  HF_LLM_TIMEOUT_MIN_SECONDS — batas bawah timeout adaptif (default: 10; batas atas HF_LLM_TIMEOUT_SECONDS)
+  HF_LLM_TIMEOUT_P95_MULTIPLIER — timeout adaptif = max(p95 x multiplier, p99) (default: 2.0)
+  HF_LLM_TIMEOUT_MIN_SAMPLES — sampel latensi minimal sebelum timeout adaptif dipakai (default: 20)
 """
 from __future__ import annotations
 
+import contextvars
 import os
+import threading
 import time
-from typing import Dict, List, Optional
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from llm_cache import build_response_cache_from_env, response_cache_key
+from llm_circuit import CircuitBreaker, LatencyTracker, LLMCircuitOpenError
+from llm_limiter import LLMLimiter, LLMRateLimitTimeout, estimate_request_tokens, parse_priorities
 
 HF_API_TOKEN = (os.getenv("HF_API_TOKEN") or os.getenv("HF_TOKEN") or "").strip()
 HF_MODEL = os.getenv("HF_MODEL", "meta-llama/Llama-3.1-8B-Instruct:novita").strip()
@@ -33,6 +59,15 @@ _BACKOFF_FACTOR = float(os.getenv("HF_LLM_BACKOFF_FACTOR", "0.8"))
 # Satu percobaan yang dibiarkan selesai lebih berguna daripada dua percobaan yang
 # sama-sama dipotong di tengah: prompt ringkasan besar dan retry mengulang dari nol.
 _TIMEOUT_SECONDS = float(os.getenv("HF_LLM_TIMEOUT_SECONDS", "60"))
+_MAX_IN_FLIGHT = max(0, int(os.getenv("HF_LLM_MAX_IN_FLIGHT", "4") or 0))
+_TOKENS_PER_MINUTE = max(0, int(os.getenv("HF_LLM_TOKENS_PER_MINUTE", "0") or 0))
+_DEFAULT_LIMITER_PRIORITIES = (
+    "rerank:0,keyword_expansion:0,json_repair:0,"
+    "recommendation_summary:1,modal_summary:1,"
+    "review_analysis:2,pros_cons:2"
+)
+_CIRCUIT_BREAKER = os.getenv("HF_LLM_CIRCUIT_BREAKER", "true").strip().lower() in ("1", "true", "yes", "on")
+_ADAPTIVE_TIMEOUT = os.getenv("HF_LLM_ADAPTIVE_TIMEOUT", "true").strip().lower() in ("1", "true", "yes", "on")
 
 hf_client = None
 if HF_API_TOKEN:
@@ -42,6 +77,9 @@ if HF_API_TOKEN:
             base_url="https://router.huggingface.co/v1",
             api_key=HF_API_TOKEN,
             timeout=_TIMEOUT_SECONDS,
+            # Retry ditangani _call_with_retry (sadar pembatas + circuit breaker); retry
+            # internal SDK bisa melipatgandakan waktu tunggu saat router bermasalah.
+            max_retries=0,
         )
         print(f"[INFO] LLM: OpenAI-compatible HF Router (timeout={_TIMEOUT_SECONDS}s)")
     except Exception as e:
@@ -50,6 +88,59 @@ if HF_API_TOKEN:
 else:
     print("[WARNING] HF_API_TOKEN/HF_TOKEN kosong. Backend HF Router tidak aktif.")
 
+_response_cache = build_response_cache_from_env()
+
+
+def _build_limiter() -> Optional[LLMLimiter]:
+    if not (_MAX_IN_FLIGHT or _TOKENS_PER_MINUTE):
+        return None
+    redis_client = None
+    if os.getenv("HF_LLM_LIMITER_REDIS", "false").strip().lower() in ("1", "true", "yes", "on"):
+        try:
+            from redis_utils import redis_from_url
+            redis_client = redis_from_url(socket_connect_timeout=1.0, socket_timeout=1.0)
+        except Exception as e:
+            print(f"[WARN] LLM limiter: Redis tidak tersedia ({e}); pembatasan hanya lokal.")
+    limiter = LLMLimiter(
+        max_in_flight=_MAX_IN_FLIGHT,
+        tokens_per_minute=_TOKENS_PER_MINUTE,
+        site_priorities=parse_priorities(os.getenv("HF_LLM_LIMITER_PRIORITIES", _DEFAULT_LIMITER_PRIORITIES)),
+        aging_seconds=float(os.getenv("HF_LLM_LIMITER_AGING_SECONDS", "5") or 5),
+        max_wait_seconds=float(os.getenv("HF_LLM_LIMITER_MAX_WAIT_SECONDS", "30") or 30),
+        redis_client=redis_client,
+    )
+    print(
+        f"[INFO] LLM limiter: max_in_flight={_MAX_IN_FLIGHT} tokens_per_minute={_TOKENS_PER_MINUTE}"
+        f" redis={redis_client is not None}"
+    )
+    return limiter
+
+
+_limiter = _build_limiter()
+
+_breaker = (
+    CircuitBreaker(
+        failure_threshold=int(os.getenv("HF_LLM_CIRCUIT_FAILURE_THRESHOLD", "5") or 5),
+        open_seconds=float(os.getenv("HF_LLM_CIRCUIT_OPEN_SECONDS", "30") or 30),
+        half_open_probes=int(os.getenv("HF_LLM_CIRCUIT_HALF_OPEN_PROBES", "1") or 1),
+        slow_call_ms=float(os.getenv("HF_LLM_LATENCY_SLO_SECONDS", "30") or 0) * 1000,
+    )
+    if _CIRCUIT_BREAKER else None
+)
+_latency = (
+    LatencyTracker(
+        min_timeout=float(os.getenv("HF_LLM_TIMEOUT_MIN_SECONDS", "10") or 10),
+        max_timeout=_TIMEOUT_SECONDS,
+        multiplier=float(os.getenv("HF_LLM_TIMEOUT_P95_MULTIPLIER", "2.0") or 2.0),
+        min_samples=int(os.getenv("HF_LLM_TIMEOUT_MIN_SAMPLES", "20") or 20),
+    )
+    if _ADAPTIVE_TIMEOUT else None
+)
+
+# Akumulator telemetri LLM per request (lihat track_llm_calls).
+_call_sink: contextvars.ContextVar = contextvars.ContextVar("llm_call_sink", default=None)
+_call_sink_lock = threading.Lock()
+
 
 def _clamp_int(value: int, *, min_value: int, max_value: int) -> int:
     return max(min_value, min(max_value, int(value)))
@@ -67,24 +158,198 @@ def _normalize_repetition_penalty(value: float) -> float:
     return max(1.0, min(2.0, float(value)))
 
 
-def _call_with_retry(func, *args, **kwargs):
+@contextmanager
+def _llm_permit(site: str, tokens: int):
+    """Slot pembatas untuk satu request router; waktu tunggu dicatat ke akumulator request."""
+    if _limiter is None:
+        yield
+        return
+    permit = _limiter.acquire(site, tokens)
+    sink = _call_sink.get()
+    if sink is not None:
+        with _call_sink_lock:
+            sink["queue_wait_ms"] = round(sink["queue_wait_ms"] + permit.wait_ms, 1)
+            sink["queue_waits"] += 1
+    try:
+        yield
+    finally:
+        _limiter.release(permit)
+
+
+def _rate_limit_retry_after(err: Exception) -> Optional[float]:
+    """Detik Retry-After bila err adalah 429 dari router (0 bila header tidak ada), selain itu None."""
+    if getattr(err, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after") or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _note_short_circuit() -> None:
+    sink = _call_sink.get()
+    if sink is not None:
+        with _call_sink_lock:
+            sink["short_circuited"] += 1
+
+
+def _is_router_failure(err: Exception) -> bool:
+    """Kegagalan yang menandakan router tidak sehat (timeout/koneksi/5xx); 4xx & 429 tidak."""
+    status = getattr(err, "status_code", None)
+    return status is None or int(status) >= 500
+
+
+def _is_timeout(err: Exception) -> bool:
+    """Timeout request (openai.APITimeoutError / httpx timeout), dikenali tanpa impor openai."""
+    return isinstance(err, TimeoutError) or type(err).__name__ in ("APITimeoutError", "ReadTimeout", "TimeoutException")
+
+
+def _call_with_retry(func, *args, site: str, limiter_tokens: int = 0, **kwargs):
+    """
+    Panggil router dengan retry. Tiap percobaan:
+      - ditolak langsung (LLMCircuitOpenError) bila circuit breaker terbuka
+      - memakai timeout adaptif call site (p95/p99 latensi) sebagai timeout request;
+        percobaan yang timeout ikut dicatat supaya timeout tidak terus menyusut
+      - mengambil slot pembatas sendiri (backoff dijalani tanpa memegang slot); untuk
+        stream=True slot dipegang pemanggil selama stream dibaca
+    429 menjeda pembatas untuk semua pemanggil (Retry-After atau backoff) alih-alih
+    hanya me-retry request ini.
+    """
+    streaming = bool(kwargs.get("stream"))
     last_err = None
     for attempt in range(_MAX_RETRIES + 1):
+        if _breaker is not None and not _breaker.allow():
+            _note_short_circuit()
+            raise LLMCircuitOpenError(f"Circuit breaker HF Router terbuka ({site})")
+        if _latency is not None:
+            kwargs["timeout"] = _latency.timeout_for(site)
         try:
-            return func(*args, **kwargs)
+            if streaming:
+                started = time.perf_counter()
+                resp = func(*args, **kwargs)
+            else:
+                with _llm_permit(site, limiter_tokens):
+                    started = time.perf_counter()
+                    resp = func(*args, **kwargs)
+            latency_ms = (time.perf_counter() - started) * 1000
+        except LLMRateLimitTimeout:
+            if _breaker is not None:
+                _breaker.record_ignored()
+            raise
         except Exception as err:
             last_err = err
+            if _latency is not None and not streaming and _is_timeout(err):
+                _latency.observe_timeout(site, kwargs["timeout"])
+            if _breaker is not None:
+                if _is_router_failure(err):
+                    _breaker.record_failure()
+                else:
+                    _breaker.record_ignored()
+            sleep_s = max(0.0, _BACKOFF_FACTOR * (2 ** attempt))
+            retry_after = _rate_limit_retry_after(err)
+            if retry_after is not None:
+                sleep_s = max(retry_after, sleep_s)
+                if _limiter is not None:
+                    _limiter.penalize(sleep_s)
+                    if not streaming:
+                        # Percobaan berikutnya menunggu jeda ini di antrean pembatas.
+                        sleep_s = 0.0
             if attempt >= _MAX_RETRIES:
                 break
-            sleep_s = max(0.0, _BACKOFF_FACTOR * (2 ** attempt))
             time.sleep(sleep_s)
+            continue
+        if _breaker is not None:
+            _breaker.record_success(latency_ms)
+        # Stream: latensi di sini hanya waktu membuka stream, bukan durasi completion.
+        if _latency is not None and not streaming:
+            _latency.observe(site, latency_ms)
+        return resp
     raise last_err  # type: ignore[misc]
 
 
-def llm_is_available() -> bool:
+def llm_is_configured() -> bool:
+    """Client router terkonfigurasi (terlepas dari keadaan circuit breaker)."""
     return hf_client is not None
 
 
+def llm_is_available() -> bool:
+    """
+    Router bisa dipakai sekarang: terkonfigurasi dan circuit breaker tidak terbuka.
+    Saat terbuka, pemanggil langsung memakai fallback deterministik (dicatat sebagai
+    short-circuit pada request yang dilacak track_llm_calls).
+    """
+    if hf_client is None:
+        return False
+    if _breaker is not None and _breaker.is_open():
+        _note_short_circuit()
+        return False
+    return True
+
+
+def llm_circuit_stats() -> Optional[Dict[str, object]]:
+    if _breaker is None and _latency is None:
+        return None
+    return {
+        "breaker": _breaker.stats() if _breaker is not None else None,
+        "timeouts": _latency.stats() if _latency is not None else None,
+    }
+
+
+def llm_limiter_stats() -> Optional[Dict[str, object]]:
+    return _limiter.stats() if _limiter is not None else None
+
+
+def track_llm_calls() -> Dict[str, float]:
+    """
+    Mulai akumulasi telemetri LLM untuk konteks saat ini: {'queue_wait_ms', 'queue_waits',
+    'short_circuited'}. short_circuited > 0 berarti sebagian output memakai fallback
+    deterministik karena circuit breaker terbuka. Panggilan LLM di thread lain ikut
+    terhitung bila dijalankan lewat contextvars.copy_context().
+    """
+    sink = {"queue_wait_ms": 0.0, "queue_waits": 0, "short_circuited": 0}
+    _call_sink.set(sink)
+    return sink
+
+
+def llm_response_cache_stats() -> Optional[Dict[str, object]]:
+    return _response_cache.stats() if _response_cache is not None else None
+
+
+def _cached_chat_completion(
+    *,
+    model_id: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+    cache_site: str,
+    use_cache: bool,
+) -> str:
+    """Chat completion ke router; respons identik diambil dari cache respons bila aktif."""
+    cache = _response_cache if use_cache else None
+    key = None
+    if cache is not None:
+        key = response_cache_key(model_id, messages, max_tokens, temperature, top_p)
+        cached = cache.get(key, cache_site)
+        if cached is not None:
+            return cached
+    resp = _call_with_retry(
+        hf_client.chat.completions.create,
+        site=cache_site,
+        limiter_tokens=estimate_request_tokens(messages, max_tokens),
+        model=model_id,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        top_p=top_p,
+    )
+    content = ((resp.choices or [{}])[0].message.content or "").strip()
+    if cache is not None and content:
+        cache.put(key, content)
+    return content
+
+
 def llm_text_generation(
     prompt: str,
     *,
@@ -95,6 +360,8 @@ def llm_text_generation(
     top_p: float = _DEFAULT_TOP_P,
     repetition_penalty: float = _DEFAULT_REPETITION_PENALTY,
     return_full_text: bool = False,
+    cache_site: str = "text_generation",
+    use_cache: bool = True,
 ) -> str:
     if hf_client is None:
         raise RuntimeError("HF Router client tidak terkonfigurasi (HF_API_TOKEN/HF_TOKEN?)")
@@ -104,15 +371,15 @@ def llm_text_generation(
     temperature = _normalize_temperature(temperature)
     top_p = _normalize_top_p(top_p)
     _ = _normalize_repetition_penalty(repetition_penalty)
-    resp = _call_with_retry(
-        hf_client.chat.completions.create,
-        model=model_id,
+    content = _cached_chat_completion(
+        model_id=model_id,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=max_new_tokens,
         temperature=temperature,
         top_p=top_p,
+        cache_site=cache_site,
+        use_cache=use_cache,
     )
-    content = ((resp.choices or [{}])[0].message.content or "").strip()
     return (prompt + content) if return_full_text else content
 
 
@@ -125,6 +392,8 @@ def llm_chat_completions_create(
     temperature: float = _DEFAULT_TEMPERATURE,
     top_p: float = _DEFAULT_TOP_P,
     repetition_penalty: float = _DEFAULT_REPETITION_PENALTY,
+    cache_site: str = "chat",
+    use_cache: bool = True,
 ) -> str:
     if hf_client is None:
         raise RuntimeError("HF Router client tidak terkonfigurasi (HF_API_TOKEN/HF_TOKEN?)")
@@ -134,12 +403,80 @@ def llm_chat_completions_create(
     temperature = _normalize_temperature(temperature)
     top_p = _normalize_top_p(top_p)
     _ = _normalize_repetition_penalty(repetition_penalty)
-    resp = _call_with_retry(
-        hf_client.chat.completions.create,
-        model=model_id,
+    return _cached_chat_completion(
+        model_id=model_id,
         messages=messages,
         max_tokens=max_tokens,
         temperature=temperature,
         top_p=top_p,
+        cache_site=cache_site,
+        use_cache=use_cache,
     )
-    return ((resp.choices or [{}])[0].message.content or "").strip()
+
+
+def llm_chat_completions_stream(
+    *,
+    model: Optional[str] = None,
+    messages: List[Dict[str, str]],
+    max_tokens: int = 512,
+    temperature: float = _DEFAULT_TEMPERATURE,
+    top_p: float = _DEFAULT_TOP_P,
+    cache_site: str = "chat_stream",
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Versi streaming llm_chat_completions_create: yield potongan teks (delta) begitu
+    token tiba. Gabungan semua delta sama dengan hasil versi non-streaming (setelah
+    strip). Retry hanya saat membuka stream; respons dari cache dikirim sebagai satu delta.
+    """
+    if hf_client is None:
+        raise RuntimeError("HF Router client tidak terkonfigurasi (HF_API_TOKEN/HF_TOKEN?)")
+    model_id = (model or HF_MODEL).strip()
+    max_tokens = _clamp_int(max_tokens, min_value=16, max_value=max(32, _MAX_CHAT_TOKENS_CAP))
+    temperature = _normalize_temperature(temperature)
+    top_p = _normalize_top_p(top_p)
+
+    cache = _response_cache if use_cache else None
+    key = None
+    if cache is not None:
+        key = response_cache_key(model_id, messages, max_tokens, temperature, top_p)
+        cached = cache.get(key, cache_site)
+        if cached is not None:
+            yield cached
+            return
+    parts: List[str] = []
+    # Slot pembatas dipegang selama stream dibaca (request masih in-flight di router).
+    with _llm_permit(cache_site, estimate_request_tokens(messages, max_tokens)):
+        stream = _call_with_retry(
+            hf_client.chat.completions.create,
+            site=cache_site,
+            model=model_id,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            stream=True,
+        )
+        leading = True
+        try:
+            for chunk in stream:
+                choices = getattr(chunk, "choices", None) or []
+                delta = getattr(choices[0].delta, "content", None) if choices else None
+                if not delta:
+                    continue
+                if leading:
+                    # Samakan dengan .strip() versi non-streaming.
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                    leading = False
+                parts.append(delta)
+                yield delta
+        except Exception as err:
+            # Stream putus/timeout di tengah jalan juga tanda router tidak sehat.
+            if _breaker is not None and _is_router_failure(err):
+                _breaker.record_failure()
+            raise
+    content = "".join(parts).strip()
+    if cache is not None and content:
+        cache.put(key, content)
@@ -0,0 +1,281 @@
+"""
+Cache respons LLM berbasis isi (content-addressed) untuk llm_backend.
+
+Kunci = sha256 dari (model, messages, max_tokens, temperature, top_p) setelah
+normalisasi parameter, sehingga prompt yang identik byte-per-byte (rerank kandidat
+yang sama, pros/cons dari review yang tidak berubah) tidak dikirim ulang ke router.
+
+Store yang bisa dipilih (HF_LLM_RESPONSE_CACHE):
+  off     — nonaktif (default)
+  memory  — LRU in-process
+  sqlite  — file SQLite lokal (HF_LLM_RESPONSE_CACHE_PATH), dibagi antar proses di host yang sama
+  redis   — Redis lewat redis_utils (dibagi antar worker/host)
+Semua store menerapkan TTL (HF_LLM_RESPONSE_CACHE_TTL_SECONDS) dan batas jumlah entri
+(HF_LLM_RESPONSE_CACHE_MAX_ENTRIES, entri paling lama tidak dipakai dibuang dulu).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+
+def response_cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+) -> str:
+    payload = json.dumps(
+        {
+            'model': model,
+            'messages': messages,
+            'max_tokens': int(max_tokens),
+            'temperature': round(float(temperature), 4),
+            'top_p': round(float(top_p), 4),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryResponseStore:
+    """LRU in-process dengan TTL."""
+
+    name = 'memory'
+
+    def __init__(self, maxsize: int = 2000, ttl_seconds: float = 86400.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl_seconds and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteResponseStore:
+    """File SQLite lokal; eviksi LRU (accessed_at) dijalankan berkala saat put."""
+
+    name = 'sqlite'
+    _EVICT_EVERY = 50
+
+    def __init__(self, path: str, maxsize: int = 2000, ttl_seconds: float = 86400.0):
+        self.path = path
+        self.maxsize = max(1, int(maxsize))
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self._local = threading.local()
+        self._puts = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_responses ('
+            ' key TEXT PRIMARY KEY, value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses (accessed_at)')
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute('SELECT value, created_at FROM llm_responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+            conn.execute('DELETE FROM llm_responses WHERE key = ?', (key,))
+            conn.commit()
+            return None
+        conn.execute('UPDATE llm_responses SET accessed_at = ? WHERE key = ?', (now, key))
+        conn.commit()
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO llm_responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, value, now, now),
+        )
+        self._puts += 1
+        if self._puts % self._EVICT_EVERY == 0:
+            self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds:
+            conn.execute('DELETE FROM llm_responses WHERE created_at < ?', (now - self.ttl_seconds,))
+        conn.execute(
+            'DELETE FROM llm_responses WHERE key IN ('
+            ' SELECT key FROM llm_responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,),
+        )
+
+    def size(self) -> int:
+        return int(self._conn().execute('SELECT COUNT(*) FROM llm_responses').fetchone()[0])
+
+
+class RedisResponseStore:
+    """Redis: nilai dengan EX=TTL, sorted set waktu akses untuk batas jumlah entri."""
+
+    name = 'redis'
+
+    def __init__(self, client, maxsize: int = 2000, ttl_seconds: float = 86400.0, prefix: str = 'cofind:llm_cache'):
+        self._client = client
+        self.maxsize = max(1, int(maxsize))
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self._prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f'{self._prefix}:{key}'
+
+    def get(self, key: str) -> Optional[str]:
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            return None
+        self._client.zadd(f'{self._prefix}:index', {key: time.time()})
+        return raw.decode('utf-8') if isinstance(raw, bytes) else str(raw)
+
+    def put(self, key: str, value: str) -> None:
+        client = self._client
+        index_key = f'{self._prefix}:index'
+        if self.ttl_seconds:
+            client.set(self._key(key), value, ex=max(1, int(self.ttl_seconds)))
+        else:
+            client.set(self._key(key), value)
+        client.zadd(index_key, {key: time.time()})
+        overflow = client.zcard(index_key) - self.maxsize
+        if overflow > 0:
+            stale = client.zrange(index_key, 0, overflow - 1)
+            if stale:
+                names = [s.decode('utf-8') if isinstance(s, bytes) else str(s) for s in stale]
+                client.delete(*[self._key(n) for n in names])
+                client.zrem(index_key, *names)
+
+    def size(self) -> int:
+        return int(self._client.zcard(f'{self._prefix}:index'))
+
+
+class ResponseCache:
+    """Pembungkus store + metrik hit/miss per call site. Error store tidak pernah menggagalkan panggilan LLM."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.errors = 0
+        self._warned = False
+
+    def get(self, key: str, site: str) -> Optional[str]:
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            self._error(e)
+            value = None
+        with self._lock:
+            (self.hits if value is not None else self.misses)[site] += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        try:
+            self.store.put(key, value)
+        except Exception as e:
+            self._error(e)
+
+    def _error(self, err: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+            warn = not self._warned
+            self._warned = True
+        if warn:
+            print(f'[WARN] LLM response cache ({self.store.name}) error: {err}')
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            sites = sorted(set(self.hits) | set(self.misses))
+            per_site = {
+                site: {
+                    'hits': self.hits[site],
+                    'misses': self.misses[site],
+                    'hit_rate': round(self.hits[site] / (self.hits[site] + self.misses[site]), 4),
+                }
+                for site in sites
+            }
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        try:
+            size = self.store.size()
+        except Exception:
+            size = None
+        return {
+            'store': self.store.name,
+            'size': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'errors': self.errors,
+            'sites': per_site,
+        }
+
+
+def build_response_cache_from_env() -> Optional[ResponseCache]:
+    """ResponseCache sesuai HF_LLM_RESPONSE_CACHE (None bila off / gagal dibuat)."""
+    kind = os.getenv('HF_LLM_RESPONSE_CACHE', 'off').strip().lower()
+    if kind in ('', '0', 'off', 'false', 'no', 'none'):
+        return None
+    ttl = float(os.getenv('HF_LLM_RESPONSE_CACHE_TTL_SECONDS', '86400') or 0)
+    maxsize = int(os.getenv('HF_LLM_RESPONSE_CACHE_MAX_ENTRIES', '2000') or 2000)
+    try:
+        if kind == 'memory':
+            store = MemoryResponseStore(maxsize, ttl)
+        elif kind == 'sqlite':
+            path = os.getenv('HF_LLM_RESPONSE_CACHE_PATH', os.path.join('data', 'llm_response_cache.sqlite3'))
+            store = SQLiteResponseStore(path, maxsize, ttl)
+        elif kind == 'redis':
+            from redis_utils import redis_from_url
+            store = RedisResponseStore(redis_from_url(socket_connect_timeout=1.0, socket_timeout=1.0), maxsize, ttl)
+        else:
+            print(f'[WARN] HF_LLM_RESPONSE_CACHE={kind!r} tidak dikenal; cache respons LLM nonaktif.')
+            return None
+    except Exception as e:
+        print(f'[WARN] Cache respons LLM ({kind}) gagal dibuat: {e}')
+        return None
+    print(f'[INFO] LLM response cache: {kind} (max_entries={maxsize}, ttl={ttl}s)')
+    return ResponseCache(store)
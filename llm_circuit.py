@@ -0,0 +1,201 @@
+"""
+Circuit breaker + timeout adaptif untuk request ke HF Router.
+
+Saat router melambat/gagal, setiap request tetap menunggu HF_LLM_TIMEOUT_SECONDS
+penuh sebelum jatuh ke output deterministik dan mengikat thread gunicorn selama itu.
+
+CircuitBreaker (per proses):
+  closed    — request jalan; kegagalan atau respons di atas SLO latensi berturut-turut
+              sebanyak failure_threshold membuka circuit
+  open      — request langsung ditolak (LLMCircuitOpenError; llm_is_available() False)
+              sehingga pemanggil memakai fallback deterministik, selama open_seconds
+  half_open — maksimal half_open_probes request percobaan; sukses menutup circuit,
+              gagal membukanya lagi
+
+LatencyTracker: latensi per call site (jendela bergulir); timeout request =
+max(p95 x multiplier, p99), dibatasi [min_timeout, max_timeout]. Percobaan yang kena
+timeout dicatat sebagai sampel senilai timeout-nya (observe_timeout), jadi timeout naik
+lagi saat router melambat alih-alih terus turun karena hanya respons cepat yang
+tercatat. Sebelum sampel cukup, dipakai max_timeout (HF_LLM_TIMEOUT_SECONDS).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LLMCircuitOpenError(RuntimeError):
+    """Circuit breaker router terbuka: request tidak dikirim."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        slow_call_ms: float = 0.0,
+    ):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = max(0.1, float(open_seconds))
+        self.half_open_probes = max(1, int(half_open_probes))
+        self.slow_call_ms = max(0.0, float(slow_call_ms or 0))
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._probes_in_flight = 0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self.outcomes: Counter = Counter()
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def is_open(self) -> bool:
+        """True selama open (half_open dianggap tertutup supaya probe bisa lewat)."""
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """Izinkan satu request? Di half_open, request yang diizinkan adalah probe."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, latency_ms: float) -> None:
+        if self.slow_call_ms and latency_ms > self.slow_call_ms:
+            self._record_failure('slow')
+            return
+        with self._lock:
+            self.outcomes['success'] += 1
+            self._consecutive_failures = 0
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._probes_in_flight = 0
+                print('[INFO] LLM circuit breaker: tertutup kembali (probe sukses).')
+
+    def record_failure(self) -> None:
+        self._record_failure('failure')
+
+    def record_ignored(self) -> None:
+        """Request selesai tanpa menilai kesehatan router (mis. 400): lepas slot probe."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def _record_failure(self, kind: str) -> None:
+        with self._lock:
+            self.outcomes[kind] += 1
+            self._consecutive_failures += 1
+            state = self._current_state(time.monotonic())
+            if state == HALF_OPEN or (state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                print(
+                    f'[WARN] LLM circuit breaker: terbuka {self.open_seconds:g}s '
+                    f'({self._consecutive_failures} {kind} berturut-turut).'
+                )
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'open_seconds': self.open_seconds,
+                'slow_call_ms': self.slow_call_ms,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited,
+                'outcomes': dict(self.outcomes),
+            }
+
+
+class LatencyTracker:
+    """Latensi per call site -> timeout adaptif (max(p95 x multiplier, p99) dalam [min, max])."""
+
+    def __init__(
+        self,
+        *,
+        min_timeout: float = 10.0,
+        max_timeout: float = 60.0,
+        multiplier: float = 2.0,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.max_timeout = max(0.1, float(max_timeout))
+        self.min_timeout = min(self.max_timeout, max(0.1, float(min_timeout)))
+        self.multiplier = max(1.0, float(multiplier))
+        self.min_samples = max(1, int(min_samples))
+        self.window = max(self.min_samples, int(window))
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self.timeouts: Counter = Counter()
+
+    def observe(self, site: str, latency_ms: float) -> None:
+        with self._lock:
+            samples = self._samples.get(site)
+            if samples is None:
+                samples = self._samples[site] = deque(maxlen=self.window)
+            samples.append(float(latency_ms))
+
+    def observe_timeout(self, site: str, timeout_seconds: float) -> None:
+        """Percobaan terpotong timeout: latensi sebenarnya >= timeout, catat senilai timeout."""
+        with self._lock:
+            self.timeouts[site] += 1
+        self.observe(site, float(timeout_seconds) * 1000.0)
+
+    @staticmethod
+    def _percentile(ordered, q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout_for(self, site: str) -> float:
+        with self._lock:
+            samples = self._samples.get(site)
+            if samples is None or len(samples) < self.min_samples:
+                return self.max_timeout
+            ordered = sorted(samples)
+            p95 = self._percentile(ordered, 0.95)
+            p99 = self._percentile(ordered, 0.99)
+        adaptive = max(p95 * self.multiplier, p99) / 1000.0
+        return round(min(self.max_timeout, max(self.min_timeout, adaptive)), 2)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            sites = {site: sorted(samples) for site, samples in self._samples.items()}
+            timeouts = dict(self.timeouts)
+        return {
+            site: {
+                'samples': len(ordered),
+                'p50_ms': round(self._percentile(ordered, 0.5), 1),
+                'p95_ms': round(self._percentile(ordered, 0.95), 1),
+                'p99_ms': round(self._percentile(ordered, 0.99), 1),
+                'timeouts': timeouts.get(site, 0),
+                'timeout_seconds': self.timeout_for(site),
+            }
+            for site, ordered in sorted(sites.items())
+            if ordered
+        }
@@ -0,0 +1,268 @@
+"""
+Pembatas request LLM sisi klien sebelum HF Router.
+
+Tanpa pembatas, worker web (--workers x --threads), thread pool pipeline, dan worker
+Celery bisa menembak router bersamaan; burst berujung 429 dan retry memperparahnya.
+LLMLimiter menerapkan:
+  - batas request in-flight (max_in_flight)
+  - token bucket tokens-per-minute; biaya request diestimasi dari ukuran prompt + max_tokens
+  - antrean adil per call site: prioritas kecil dilayani dulu (rerank > summary > pros/cons),
+    prioritas efektif naik seiring lama menunggu (aging) supaya site rendah tidak kelaparan
+  - jeda bersama setelah 429 (Retry-After) sehingga request lain ikut menahan diri
+Opsional lintas proses (redis_client): slot in-flight (sorted set dengan lease), token
+bucket, dan jeda 429 disimpan di Redis lewat satu skrip Lua atomik. Bila Redis gagal,
+pembatas kembali ke mode lokal.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Mapping, Optional
+
+# KEYS: in-flight zset, bucket hash, jeda 429. ARGV: lease_ms, max_in_flight,
+# token_per_ms, capacity, cost, member. Hasil: 0 = dapat slot, -1 = in-flight penuh,
+# >0 = ms sampai token/jeda cukup.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local lease = tonumber(ARGV[1])
+local max_in_flight = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local capacity = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+local blocked = redis.call('PTTL', KEYS[3])
+if blocked > 0 then return blocked end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if max_in_flight > 0 and redis.call('ZCARD', KEYS[1]) >= max_in_flight then return -1 end
+if rate > 0 then
+  local b = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or capacity
+  local ts = tonumber(b[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  if tokens < cost then
+    redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', now)
+    return math.max(1, math.ceil((cost - tokens) / rate))
+  end
+  redis.call('HSET', KEYS[2], 'tokens', tokens - cost, 'ts', now)
+  redis.call('PEXPIRE', KEYS[2], 3600000)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[6])
+redis.call('PEXPIRE', KEYS[1], lease * 2)
+return 0
+"""
+
+
+class LLMRateLimitTimeout(RuntimeError):
+    """Request LLM menunggu di antrean pembatas melebihi max_wait_seconds."""
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Estimasi kasar biaya token: ~4 karakter per token prompt + overhead per pesan + max_tokens."""
+    prompt_chars = sum(len(str(m.get('content') or '')) for m in messages or ())
+    return prompt_chars // 4 + 4 * len(messages or ()) + max(0, int(max_tokens))
+
+
+def parse_priorities(raw: str) -> Dict[str, int]:
+    """'rerank:0,pros_cons:2' -> {'rerank': 0, 'pros_cons': 2} (entri rusak diabaikan)."""
+    out: Dict[str, int] = {}
+    for part in (raw or '').split(','):
+        site, _, value = part.partition(':')
+        try:
+            out[site.strip()] = int(value)
+        except ValueError:
+            continue
+    return out
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'enqueued', 'tokens')
+
+    def __init__(self, priority: int, seq: int, enqueued: float, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = enqueued
+        self.tokens = tokens
+
+
+class LLMPermit:
+    """Izin satu request; dikembalikan lewat LLMLimiter.release."""
+
+    __slots__ = ('site', 'wait_ms', 'member')
+
+    def __init__(self, site: str, wait_ms: float, member: Optional[str]):
+        self.site = site
+        self.wait_ms = wait_ms
+        self.member = member
+
+
+class LLMLimiter:
+    """
+    `acquire(site, tokens)` memblok sampai giliran site itu (antrean prioritas + aging),
+    ada slot in-flight, dan token bucket cukup; `release(permit)` setelah request selesai.
+    max_in_flight / tokens_per_minute <= 0 = batas itu nonaktif.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: int = 4,
+        tokens_per_minute: int = 0,
+        site_priorities: Optional[Mapping[str, int]] = None,
+        default_priority: int = 1,
+        aging_seconds: float = 5.0,
+        max_wait_seconds: float = 30.0,
+        redis_client=None,
+        redis_prefix: str = 'cofind:llm_limiter',
+        lease_seconds: float = 120.0,
+        poll_interval_seconds: float = 0.1,
+    ):
+        self.max_in_flight = max(0, int(max_in_flight or 0))
+        self.tokens_per_minute = max(0, int(tokens_per_minute or 0))
+        self.site_priorities = dict(site_priorities or {})
+        self.default_priority = int(default_priority)
+        self.aging_seconds = max(0.001, float(aging_seconds))
+        self.max_wait_seconds = max(0.0, float(max_wait_seconds))
+        self.lease_ms = max(1000, int(float(lease_seconds) * 1000))
+        self.poll_interval_seconds = max(0.01, float(poll_interval_seconds))
+        self._redis = redis_client
+        self._prefix = redis_prefix
+        self._redis_warned = False
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._bucket = float(self.tokens_per_minute)
+        self._bucket_ts = time.monotonic()
+        self._blocked_until = 0.0
+        self.requests: Counter = Counter()
+        self.wait_ms_total: Counter = Counter()
+        self.wait_ms_max: Dict[str, float] = {}
+        self.timeouts: Counter = Counter()
+        self.rate_limited = 0
+
+    def priority(self, site: str) -> int:
+        return self.site_priorities.get(site, self.default_priority)
+
+    def _head(self, now: float) -> Optional[_Waiter]:
+        if not self._waiters:
+            return None
+        return min(
+            self._waiters,
+            key=lambda w: (w.priority - (now - w.enqueued) / self.aging_seconds, w.seq),
+        )
+
+    def _try_take(self, tokens: int, now: float):
+        """(tunggu_detik, member): tunggu 0 = slot didapat (dipanggil dengan _cond terkunci)."""
+        if self._blocked_until > now:
+            return self._blocked_until - now, None
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            return self.poll_interval_seconds, None
+        if self._redis is not None:
+            member = uuid.uuid4().hex
+            try:
+                delay_ms = int(self._redis.eval(
+                    _ACQUIRE_LUA, 3,
+                    f'{self._prefix}:in_flight', f'{self._prefix}:bucket', f'{self._prefix}:blocked',
+                    self.lease_ms, self.max_in_flight, self.tokens_per_minute / 60000.0,
+                    self.tokens_per_minute, min(tokens, self.tokens_per_minute), member,
+                ))
+            except Exception as e:
+                self._warn(e)
+                self._redis = None
+            else:
+                if delay_ms == 0:
+                    return 0.0, member
+                return (self.poll_interval_seconds if delay_ms < 0 else delay_ms / 1000.0), None
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute / 60.0
+            self._bucket = min(float(self.tokens_per_minute), self._bucket + (now - self._bucket_ts) * rate)
+            self._bucket_ts = now
+            cost = min(tokens, self.tokens_per_minute)
+            if self._bucket < cost:
+                return (cost - self._bucket) / rate, None
+            self._bucket -= cost
+        return 0.0, None
+
+    def acquire(self, site: str, tokens: int = 0) -> LLMPermit:
+        started = time.monotonic()
+        deadline = started + self.max_wait_seconds
+        with self._cond:
+            waiter = _Waiter(self.priority(site), next(self._seq), started, max(0, int(tokens)))
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self.poll_interval_seconds
+                    if self._head(now) is waiter:
+                        delay, member = self._try_take(waiter.tokens, now)
+                        if delay <= 0:
+                            self._in_flight += 1
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts[site] += 1
+                        raise LLMRateLimitTimeout(
+                            f'Antrean LLM ({site}) penuh: menunggu > {self.max_wait_seconds:g}s'
+                        )
+                    self._cond.wait(min(remaining, delay, self.poll_interval_seconds * 5))
+            finally:
+                self._waiters.remove(waiter)
+                self._cond.notify_all()
+            wait_ms = round((time.monotonic() - started) * 1000, 1)
+            self.requests[site] += 1
+            self.wait_ms_total[site] += wait_ms
+            self.wait_ms_max[site] = max(self.wait_ms_max.get(site, 0.0), wait_ms)
+        return LLMPermit(site, wait_ms, member)
+
+    def release(self, permit: LLMPermit) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+        if permit.member and self._redis is not None:
+            try:
+                self._redis.zrem(f'{self._prefix}:in_flight', permit.member)
+            except Exception as e:
+                self._warn(e)
+
+    def penalize(self, seconds: float) -> None:
+        """Router membalas 429: semua request (lokal + lintas proses) menahan diri selama `seconds`."""
+        seconds = max(0.0, float(seconds))
+        with self._cond:
+            self.rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        if self._redis is not None and seconds > 0:
+            try:
+                self._redis.set(f'{self._prefix}:blocked', '1', px=max(1, int(seconds * 1000)))
+            except Exception as e:
+                self._warn(e)
+
+    def _warn(self, err: Exception) -> None:
+        if not self._redis_warned:
+            print(f'[WARN] LLM limiter: Redis tidak bisa dipakai ({err}); pembatasan hanya lokal.')
+            self._redis_warned = True
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            sites = {
+                site: {
+                    'priority': self.priority(site),
+                    'requests': self.requests[site],
+                    'avg_wait_ms': round(self.wait_ms_total[site] / self.requests[site], 1) if self.requests[site] else 0.0,
+                    'max_wait_ms': self.wait_ms_max.get(site, 0.0),
+                    'timeouts': self.timeouts[site],
+                }
+                for site in sorted(set(self.requests) | set(self.timeouts))
+            }
+            return {
+                'max_in_flight': self.max_in_flight,
+                'tokens_per_minute': self.tokens_per_minute,
+                'in_flight': self._in_flight,
+                'queued': len(self._waiters),
+                'rate_limited': self.rate_limited,
+                'redis': self._redis is not None,
+                'sites': sites,
+            }
@@ -332,6 +332,7 @@ def expand_pill_keywords(
     parse_json_fn: Optional[Callable] = None,
     max_terms: Optional[int] = None,
     use_cache: bool = True,
+    defer_grounding: bool = False,
 ) -> Dict[str, object]:
     """
     Tahap A. LLM mengusulkan frasa pencarian tambahan untuk kombinasi pill,
@@ -339,6 +340,10 @@ def expand_pill_keywords(
       1. sanitizer aplikasi (buang frasa negatif / bentuk tidak valid)
       2. bukan pengulangan leksikon pill yang sudah dipakai
       3. semua tokennya ada di kosakata korpus review (kalau korpus tersedia)
+    defer_grounding: saringan 3 dilewati; frasa lolos saringan 1-2 disimpan di
+    'candidates' dan keywords kosong sampai ground_expansion_keywords dipanggil setelah
+    korpus siap. Dengan begitu panggilan LLM bisa berjalan paralel dengan pemuatan korpus
+    tanpa thread yang menunggu kosakata.
     """
     result: Dict[str, object] = {
         'keywords': [],
@@ -408,13 +413,26 @@ def expand_pill_keywords(
             continue
         deduped.append(term)
 
-    grounded, rejected_vocabulary = _terms_grounded_in_vocabulary(deduped, corpus_vocabulary)
-
-    result['keywords'] = list(dict.fromkeys(grounded))[:limit]
     result['rejected_lexicon'] = rejected_lexicon
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    result['candidates'] = deduped
+    result['limit'] = limit
+    if defer_grounding:
+        return result
+    return ground_expansion_keywords(result, corpus_vocabulary)
+
+
+def ground_expansion_keywords(result: Dict[str, object], corpus_vocabulary: Optional[set]) -> Dict[str, object]:
+    """
+    Saringan 3 expand_pill_keywords: frasa kandidat yang semua tokennya ada di kosakata
+    korpus menjadi keywords (kosakata kosong/None = semua kandidat dipakai).
+    """
+    grounded, rejected_vocabulary = _terms_grounded_in_vocabulary(
+        result.get('candidates') or [], corpus_vocabulary,
+    )
+    result['keywords'] = list(dict.fromkeys(grounded))[:result.get('limit') or expansion_max_terms()]
     result['rejected_vocabulary'] = len(rejected_vocabulary)
     result['rejected_vocabulary_sample'] = rejected_vocabulary[:5]
-    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
     return result
 
 
@@ -450,6 +468,7 @@ def build_user_taste_profile(
         'avg_rating_given': None,
         'review_lines': [],
         'favorite_names': [],
+        'favorite_place_ids': [],
         'vote_rating_bits': [],
         'vote_best_for_bits': [],
         'vote_slider_bits': [],
@@ -475,7 +494,7 @@ def build_user_taste_profile(
                 (uid, int(max_reviews)),
             ).fetchall()
             favorite_rows = cursor.execute(
-                'SELECT c.name FROM favorites f '
+                'SELECT c.name, f.place_id FROM favorites f '
                 'LEFT JOIN coffee_shops c ON f.place_id = c.place_id '
                 'WHERE f.user_id = ? ORDER BY f.added_at DESC LIMIT ?',
                 (uid, int(max_favorites)),
@@ -516,10 +535,15 @@ def build_user_taste_profile(
         review_lines.append(f'({rating_label} di {shop_label}) "{text}"')
 
     favorite_names = []
+    favorite_place_ids = []
     for row in favorite_rows or []:
-        name = str((list(row) + [None])[0] or '').strip()
+        name, place_id = (list(row) + [None, None])[:2]
+        name = str(name or '').strip()
         if name and name not in favorite_names:
             favorite_names.append(name)
+        place_id = str(place_id or '').strip()
+        if place_id and place_id not in favorite_place_ids:
+            favorite_place_ids.append(place_id)
 
     rating_counts: Dict[str, int] = {}
     best_for_counts: Dict[str, int] = {}
@@ -583,6 +607,7 @@ def build_user_taste_profile(
     profile['avg_rating_given'] = round(sum(ratings) / len(ratings), 2) if ratings else None
     profile['review_lines'] = review_lines
     profile['favorite_names'] = favorite_names
+    profile['favorite_place_ids'] = favorite_place_ids
     profile['vote_rating_bits'] = vote_rating_bits
     profile['vote_best_for_bits'] = vote_best_for_bits
     profile['vote_slider_bits'] = vote_slider_bits
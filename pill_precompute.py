@@ -0,0 +1,455 @@
+"""
+Prakomputasi hasil rekomendasi untuk semua kombinasi pill (offline, Celery / CLI).
+
+Pill berasal dari PILL_MAPPING yang tetap dan kombinasi dibatasi 3 pill, jadi ruangnya
+kecil: C(n,1) + C(n,2) + C(n,3) kombinasi (PILL_MAPPING sekarang 7 pill -> 7 + 21 + 35
+= 63; 6 pill -> 41). Job hanya menghitung bagian deterministik lapisan pill (kandidat
+BM25/hybrid, evidence, ringkasan deterministik; tanpa panggilan LLM) dan menyimpannya
+di tabel `pill_precomputed_results`. Endpoint online menambahkan rerank LLM (opsional)
+di atas baris itu, lalu lapisan per user.
+
+Job Celery memecah pekerjaan menjadi satu subtask per kombinasi dengan batas waktu
+sendiri (COFIND_PILL_PRECOMPUTE_TASK_TIME_LIMIT_SECONDS); baris yang revisi korpus dan
+sidik konfigurasinya sudah sama dengan sekarang dilewati. Job dan pembacaan baris
+sama-sama mengikuti COFIND_PILL_PRECOMPUTED.
+
+Validitas lintas proses memakai `corpus_state.revision`: dinaikkan setiap hook tulis
+korpus (profile_store.notify_*). Baris prakomputasi hanya dipakai bila revisi yang
+tersimpan sama dengan revisi sekarang dan sidik konfigurasi pipeline-nya cocok.
+
+Revisi hanya dinaikkan bila ada pemakainya (cache pill COFIND_PILL_CACHE_SIZE > 0 atau
+COFIND_PILL_PRECOMPUTE_AUTO); beberapa tulis dalam COFIND_CORPUS_STAMP_FLUSH_SECONDS
+digabung menjadi satu UPDATE di thread latar, bukan di jalur request penulis.
+
+COFIND_PILL_PRECOMPUTE_AUTO=true: setiap perubahan korpus menjadwalkan job Celery
+(di-debounce lewat Redis, COFIND_PILL_PRECOMPUTE_DEBOUNCE_SECONDS).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+from itertools import combinations
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from auth_utils import get_db_connection
+from db_backend import dict_from_row
+
+# Pembacaan baris prakomputasi di jalur online; job tidak dijalankan bila dimatikan.
+PILL_PRECOMPUTED_READ = os.getenv('COFIND_PILL_PRECOMPUTED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+PILL_PRECOMPUTE_AUTO = PILL_PRECOMPUTED_READ and os.getenv('COFIND_PILL_PRECOMPUTE_AUTO', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+PILL_PRECOMPUTE_DEBOUNCE_SECONDS = max(1, int(os.getenv('COFIND_PILL_PRECOMPUTE_DEBOUNCE_SECONDS', '120') or 120))
+# Sama dengan _pill_result_cache di app: kunci cache memakai corpus_stamp().
+PILL_CACHE_ENABLED = int(os.getenv('COFIND_PILL_CACHE_SIZE', '128') or 0) > 0
+CORPUS_STAMP_FLUSH_SECONDS = max(0.0, float(os.getenv('COFIND_CORPUS_STAMP_FLUSH_SECONDS', '1') or 0))
+MAX_PILLS_PER_REQUEST = 3
+
+_TABLES_READY = False
+_schedule_warned = False
+_schedule_client = None
+_bump_lock = threading.Lock()
+_bump_timer = None
+
+
+def ensure_precompute_tables():
+    """Buat tabel hasil prakomputasi + revisi korpus (idempotent)."""
+    global _TABLES_READY
+    if _TABLES_READY:
+        return True
+    conn = None
+    try:
+        from db_backend import use_postgres
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        revision_type = 'BIGINT' if use_postgres() else 'INTEGER'
+        timestamp_type = 'TIMESTAMPTZ DEFAULT NOW()' if use_postgres() else 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS corpus_state (
+                id INTEGER PRIMARY KEY,
+                revision {revision_type} NOT NULL DEFAULT 0,
+                updated_at {timestamp_type}
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS pill_precomputed_results (
+                preferences_key TEXT NOT NULL,
+                config_fingerprint TEXT NOT NULL,
+                corpus_revision {revision_type} NOT NULL,
+                payload_json TEXT NOT NULL,
+                computed_at {timestamp_type},
+                PRIMARY KEY (preferences_key, config_fingerprint)
+            )
+        """)
+        row = cursor.execute('SELECT id FROM corpus_state WHERE id = 1').fetchone()
+        if not row:
+            cursor.execute('INSERT INTO corpus_state (id, revision) VALUES (1, 0)')
+        conn.commit()
+        _TABLES_READY = True
+        return True
+    except Exception as e:
+        print(f"[WARN] ensure_precompute_tables: {e}")
+        try:
+            if conn:
+                conn.rollback()
+        except Exception:
+            pass
+        return False
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def corpus_stamp() -> Optional[int]:
+    """Revisi korpus lintas proses (None bila tabel tidak bisa dibaca)."""
+    if not ensure_precompute_tables():
+        return None
+    conn = None
+    try:
+        conn = get_db_connection()
+        row = conn.cursor().execute('SELECT revision FROM corpus_state WHERE id = 1').fetchone()
+        if not row:
+            return 0
+        return int(row['revision'] if isinstance(row, dict) else row[0])
+    except Exception as e:
+        print(f"[WARN] corpus_stamp: {e}")
+        return None
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def bump_corpus_stamp() -> None:
+    """Hook perubahan korpus: naikkan revisi (hasil prakomputasi lama jadi basi)."""
+    if not ensure_precompute_tables():
+        return
+    conn = None
+    try:
+        conn = get_db_connection()
+        conn.cursor().execute(
+            'UPDATE corpus_state SET revision = revision + 1, updated_at = ? WHERE id = 1',
+            (datetime.utcnow().isoformat(),),
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"[WARN] bump_corpus_stamp: {e}")
+        try:
+            if conn:
+                conn.rollback()
+        except Exception:
+            pass
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    if PILL_PRECOMPUTE_AUTO:
+        schedule_precompute()
+
+
+def corpus_stamp_enabled() -> bool:
+    """Revisi korpus lintas proses dipakai (cache pill atau baris prakomputasi)?"""
+    return PILL_CACHE_ENABLED or PILL_PRECOMPUTED_READ
+
+
+def request_corpus_stamp_bump() -> None:
+    """
+    Hook tulis korpus: jadwalkan bump_corpus_stamp. Tulis-tulis dalam satu jendela
+    CORPUS_STAMP_FLUSH_SECONDS digabung menjadi satu UPDATE (0 = langsung).
+    """
+    global _bump_timer
+    if not corpus_stamp_enabled():
+        return
+    if CORPUS_STAMP_FLUSH_SECONDS <= 0:
+        bump_corpus_stamp()
+        return
+    with _bump_lock:
+        if _bump_timer is not None:
+            return
+        _bump_timer = threading.Timer(CORPUS_STAMP_FLUSH_SECONDS, flush_corpus_stamp)
+        _bump_timer.daemon = True
+        _bump_timer.start()
+
+
+def flush_corpus_stamp() -> None:
+    """Jalankan bump yang tertunda sekarang (timer, atau saat proses berhenti)."""
+    global _bump_timer
+    with _bump_lock:
+        timer, _bump_timer = _bump_timer, None
+    if timer is None:
+        return
+    timer.cancel()
+    bump_corpus_stamp()
+
+
+atexit.register(flush_corpus_stamp)
+
+
+def schedule_precompute() -> bool:
+    """
+    Jadwalkan job prakomputasi (debounce: paling banyak satu job per jendela
+    COFIND_PILL_PRECOMPUTE_DEBOUNCE_SECONDS, dijalankan di akhir jendela).
+    """
+    global _schedule_warned, _schedule_client
+    if not PILL_PRECOMPUTED_READ:
+        return False
+    try:
+        if _schedule_client is None:
+            from redis_utils import redis_from_url
+
+            _schedule_client = redis_from_url(socket_connect_timeout=1.0, socket_timeout=1.0)
+        if not _schedule_client.set('cofind:pill_precompute:scheduled', '1', nx=True, ex=PILL_PRECOMPUTE_DEBOUNCE_SECONDS):
+            return False
+        from tasks import precompute_pill_combinations_task
+
+        precompute_pill_combinations_task.apply_async(countdown=PILL_PRECOMPUTE_DEBOUNCE_SECONDS)
+        return True
+    except Exception as e:
+        if not _schedule_warned:
+            print(f"[WARN] Prakomputasi pill tidak bisa dijadwalkan: {e}")
+            _schedule_warned = True
+        return False
+
+
+def pill_combinations(pills: Sequence[str], max_size: int = MAX_PILLS_PER_REQUEST) -> List[tuple]:
+    """Semua kombinasi 1..max_size pill (tiap kombinasi terurut abjad)."""
+    ordered = sorted(set(pills or ()))
+    out = []
+    for size in range(1, max(1, int(max_size)) + 1):
+        out.extend(combinations(ordered, size))
+    return out
+
+
+def recent_feedback_preference_keys(days: int = 30, limit: int = 200) -> List[str]:
+    """preferences_key dari recommendation_feedback terbaru, paling sering dulu."""
+    from recommendation_feedback_utils import ensure_recommendation_feedback_table
+
+    if not ensure_recommendation_feedback_table():
+        return []
+    conn = None
+    try:
+        from datetime import timedelta
+
+        since = (datetime.utcnow() - timedelta(days=max(1, int(days)))).isoformat()
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        rows = cursor.execute(
+            '''
+            SELECT preferences_key, COUNT(*) AS cnt
+            FROM recommendation_feedback
+            WHERE updated_at >= ?
+            GROUP BY preferences_key
+            ORDER BY cnt DESC
+            LIMIT ?
+            ''',
+            (since, int(limit)),
+        ).fetchall()
+        keys = []
+        for row in rows or []:
+            key = str((dict_from_row(cursor, row) or {}).get('preferences_key') or '').strip()
+            if key:
+                keys.append(key)
+        return keys
+    except Exception as e:
+        print(f"[WARN] recent_feedback_preference_keys: {e}")
+        return []
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def order_combinations(combos: Iterable[tuple], priority_keys: Sequence[str], *, only_priority: bool = False) -> List[tuple]:
+    """Kombinasi yang ada di priority_keys (urutan priority_keys) dulu, sisanya menyusul."""
+    by_key = {'+'.join(combo): combo for combo in combos}
+    first = [by_key[key] for key in dict.fromkeys(priority_keys or ()) if key in by_key]
+    if only_priority:
+        return first
+    seen = set(first)
+    return first + [combo for combo in by_key.values() if combo not in seen]
+
+
+def precomputed_revision(preferences_key: str, fingerprint: str) -> Optional[int]:
+    """Revisi korpus baris prakomputasi yang tersimpan (None bila belum ada)."""
+    if not ensure_precompute_tables():
+        return None
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        row = cursor.execute(
+            '''
+            SELECT corpus_revision
+            FROM pill_precomputed_results
+            WHERE preferences_key = ? AND config_fingerprint = ?
+            ''',
+            (preferences_key, fingerprint),
+        ).fetchone()
+        stored_revision = (dict_from_row(cursor, row) or {}).get('corpus_revision')
+        return int(stored_revision) if stored_revision is not None else None
+    except Exception as e:
+        print(f"[WARN] precomputed_revision {preferences_key}: {e}")
+        return None
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def load_precomputed(preferences_key: str, fingerprint: str, revision: Optional[int]) -> Optional[dict]:
+    """Hasil prakomputasi yang masih valid untuk revisi korpus ini (None bila tidak ada/basi)."""
+    if revision is None or not ensure_precompute_tables():
+        return None
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        row = cursor.execute(
+            '''
+            SELECT corpus_revision, payload_json
+            FROM pill_precomputed_results
+            WHERE preferences_key = ? AND config_fingerprint = ?
+            ''',
+            (preferences_key, fingerprint),
+        ).fetchone()
+        rd = dict_from_row(cursor, row) or {}
+        stored_revision = rd.get('corpus_revision')
+        if stored_revision is None or int(stored_revision) != int(revision):
+            return None
+        return json.loads(rd.get('payload_json') or 'null')
+    except Exception as e:
+        print(f"[WARN] load_precomputed {preferences_key}: {e}")
+        return None
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def save_precomputed(preferences_key: str, fingerprint: str, revision: int, payload: dict) -> bool:
+    if not ensure_precompute_tables():
+        return False
+    conn = None
+    try:
+        conn = get_db_connection()
+        conn.cursor().execute(
+            '''
+            INSERT INTO pill_precomputed_results
+                (preferences_key, config_fingerprint, corpus_revision, payload_json, computed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (preferences_key, config_fingerprint) DO UPDATE SET
+                corpus_revision = excluded.corpus_revision,
+                payload_json = excluded.payload_json,
+                computed_at = excluded.computed_at
+            ''',
+            (
+                preferences_key,
+                fingerprint,
+                int(revision),
+                json.dumps(payload, ensure_ascii=False, default=str),
+                datetime.utcnow().isoformat(),
+            ),
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"[WARN] save_precomputed {preferences_key}: {e}")
+        try:
+            if conn:
+                conn.rollback()
+        except Exception:
+            pass
+        return False
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def precompute_combination(
+    combo: Sequence[str],
+    compute_fn: Callable[[List[str]], dict],
+    *,
+    fingerprint: str,
+) -> str:
+    """
+    Hitung + simpan hasil satu kombinasi. Revisi korpus dibaca sebelum dihitung,
+    sehingga hasil yang tersusul perubahan korpus otomatis basi. Return status:
+    'current' (baris sudah berlaku, tidak dihitung ulang), 'saved', 'skipped', 'errors'.
+    """
+    combo = tuple(sorted(set(combo)))
+    key = '+'.join(combo)
+    revision = corpus_stamp()
+    try:
+        if revision is None:
+            raise RuntimeError('revisi korpus tidak terbaca')
+        if precomputed_revision(key, fingerprint) == revision:
+            return 'current'
+        result = compute_fn(list(combo))
+        if 'error' in result:
+            print(f"[PRECOMPUTE] {key}: dilewati ({result['error'][0].get('message')})")
+            return 'skipped'
+        return 'saved' if save_precomputed(key, fingerprint, revision, result) else 'errors'
+    except Exception as e:
+        print(f"[PRECOMPUTE] {key}: gagal: {e}")
+        return 'errors'
+
+
+def precompute_combinations(
+    combos: Sequence[tuple],
+    compute_fn: Callable[[List[str]], dict],
+    *,
+    fingerprint: str,
+    progress_fn: Optional[Callable[[Dict[str, object]], None]] = None,
+) -> Dict[str, object]:
+    """precompute_combination untuk tiap kombinasi secara berurutan (CLI / satu proses)."""
+    summary = {
+        'total': len(combos), 'done': 0, 'current': 0, 'saved': 0, 'skipped': 0, 'errors': 0,
+        'fingerprint': fingerprint,
+    }
+    for combo in combos:
+        summary[precompute_combination(combo, compute_fn, fingerprint=fingerprint)] += 1
+        summary['done'] += 1
+        if progress_fn is not None:
+            progress_fn(dict(summary, current='+'.join(combo)))
+    return summary
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Prakomputasi rekomendasi semua kombinasi pill.')
+    parser.add_argument('--recent-only', action='store_true', help='hanya kombinasi dari feedback terbaru')
+    parser.add_argument('--no-recent-first', action='store_true', help='jangan dahulukan kombinasi dari feedback')
+    parser.add_argument('--recent-days', type=int, default=30)
+    args = parser.parse_args()
+
+    from app import _precompute_pill_results
+
+    def _print_progress(info):
+        print(f"[PRECOMPUTE] {info['done']}/{info['total']} {info['current']}", flush=True)
+
+    _precompute_pill_results(
+        recent_first=not args.no_recent_first,
+        recent_only=args.recent_only,
+        recent_days=args.recent_days,
+        progress_fn=_print_progress,
+    )
@@ -0,0 +1,360 @@
+"""
+Materialized profile coffee shop untuk pipeline rekomendasi (Step 1).
+
+Profil per place_id disusun dari beberapa bagian yang kedaluwarsa sendiri-sendiri:
+  - 'shop'       : baris coffee_shops (nama, rating Google)
+  - 'reviews'    : review lean (teks ter-normalisasi, token, lemma)
+  - 'facilities' : entri facilities.json
+  - 'votes'      : ringkasan vote komunitas (shop_votes)
+  - 'pros'       : pros teratas hasil vote (shop_pros_cons)
+
+Hook tulis (notify_profile_changed) menandai bagian yang basi; request berikutnya hanya
+memuat ulang bagian basi itu secara batch lewat loader dari app, lalu profil dirakit
+ulang. Profil yang tidak berubah dikembalikan apa adanya (dict dibagi antar request,
+perlakukan read-only). TTL menjadi jaring pengaman untuk perubahan di luar hook
+(SQL manual, migrasi).
+
+COFIND_PROFILE_STORE_REDIS=true: event invalidasi dibagikan antar worker lewat Redis
+(sorted set bernomor urut, ditulis atomik lewat Lua); profil tetap disimpan di memori
+proses masing-masing. Tiap event membawa id proses pengirim, jadi proses yang sudah
+menginvalidasi lokal tidak menerapkan event-nya sendiri lagi.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+PROFILE_PARTS = ('shop', 'reviews', 'facilities', 'votes', 'pros')
+
+PROFILE_STORE_REDIS = os.getenv('COFIND_PROFILE_STORE_REDIS', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+_REDIS_PREFIX = os.getenv('COFIND_PROFILE_STORE_REDIS_PREFIX', 'cofind:profile_store').strip() or 'cofind:profile_store'
+# Event lama dipangkas; worker yang tertinggal lebih jauh dari ini mengosongkan store-nya.
+_REDIS_MAX_EVENTS = 5000
+_ALL_PLACES = '*'
+
+# KEYS: seq, events. ARGV: max_events, origin, place_id, bagian... Semua bagian mendapat
+# nomor urut dan masuk sorted set dalam satu langkah atomik (tanpa celah seq tanpa event).
+_PUBLISH_LUA = """
+local seq = 0
+for i = 4, #ARGV do
+  seq = redis.call('INCR', KEYS[1])
+  redis.call('ZADD', KEYS[2], seq, seq .. '|' .. ARGV[2] .. '|' .. ARGV[i] .. '|' .. ARGV[3])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[1]) + 1))
+return seq
+"""
+
+PartLoader = Callable[[List[str]], Dict[str, object]]
+
+_origin: Tuple[int, str] = (0, '')
+
+
+def process_origin() -> str:
+    """Id proses ini untuk event Redis (dibuat ulang setelah fork, mis. worker gunicorn)."""
+    global _origin
+    pid = os.getpid()
+    if _origin[0] != pid:
+        _origin = (pid, f'{pid}-{uuid.uuid4().hex[:12]}')
+    return _origin[1]
+
+
+class ShopProfileStore:
+    """
+    Store profil per place_id. `loaders[part](place_ids) -> {place_id: nilai}` memuat satu
+    bagian untuk banyak toko sekaligus; `assemble_fn(place_id, parts)` merakit profil
+    (None = toko tidak valid, mis. baris coffee_shops hilang).
+    """
+
+    def __init__(
+        self,
+        loaders: Dict[str, PartLoader],
+        assemble_fn: Callable[[str, Dict[str, object]], Optional[dict]],
+        *,
+        ttl_seconds: float = 600.0,
+        redis_client=None,
+        origin: Optional[str] = None,
+    ):
+        unknown = set(loaders) - set(PROFILE_PARTS)
+        if unknown:
+            raise ValueError(f'Bagian profil tidak dikenal: {sorted(unknown)}')
+        self._loaders = dict(loaders)
+        self._assemble = assemble_fn
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self._lock = threading.Lock()
+        # place_id -> bagian -> (nilai, stamp saat mulai dimuat, waktu muat)
+        self._parts: Dict[str, Dict[str, Tuple[object, Tuple[int, int], float]]] = {}
+        # place_id -> (profil, waktu muat tiap bagian yang dipakai merakitnya)
+        self._profiles: Dict[str, Tuple[Optional[dict], Tuple[float, ...]]] = {}
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._generation = 0
+        # Naik setiap ada invalidasi (lokal maupun dari Redis): versi korpus untuk cache hilir.
+        self.revision = 0
+        self._redis = redis_client
+        # None = process_origin() (dibaca saat event diterapkan, aman setelah fork).
+        self._origin = origin
+        self._redis_seq: Optional[int] = None
+        self._redis_warned = False
+        self.hits = 0
+        self.misses = 0
+        self.part_loads: Counter = Counter()
+
+    def _stamp(self, place_id: str, part: str) -> Tuple[int, int]:
+        return self._generation, self._versions.get((place_id, part), 0)
+
+    def invalidate(self, place_id: object, parts: Optional[Iterable[str]] = None) -> None:
+        pid = str(place_id or '').strip()
+        if not pid:
+            return
+        with self._lock:
+            for part in parts or PROFILE_PARTS:
+                key = (pid, part)
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._profiles.pop(pid, None)
+            self.revision += 1
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+            self._parts.clear()
+            self._profiles.clear()
+            self.revision += 1
+
+    def _apply_remote_event(self, raw: object) -> None:
+        value = raw.decode('utf-8', 'replace') if isinstance(raw, bytes) else str(raw)
+        _, origin, part, pid = (value.split('|', 3) + ['', '', ''])[:4]
+        if origin == (self._origin or process_origin()):
+            return  # event proses ini sendiri: sudah diinvalidasi lokal oleh hook tulis
+        if pid == _ALL_PLACES:
+            self.invalidate_all()
+        else:
+            self.invalidate(pid, [part] if part in PROFILE_PARTS else None)
+
+    def _sync_remote(self) -> None:
+        """Terapkan event invalidasi dari worker lain (sekali round-trip bila tidak ada event)."""
+        client = self._redis
+        if client is None:
+            return
+        try:
+            seq = int(client.get(f'{_REDIS_PREFIX}:seq') or 0)
+            last = self._redis_seq
+            self._redis_seq = seq
+            if last is None or seq <= last:
+                return
+            events = client.zrangebyscore(f'{_REDIS_PREFIX}:events', last + 1, seq)
+            if len(events) < seq - last:
+                # Event sudah terpangkas: aman-nya kosongkan semua.
+                self.invalidate_all()
+                return
+            for raw in events:
+                self._apply_remote_event(raw)
+        except Exception as e:
+            if not self._redis_warned:
+                print(f'[WARN] Profile store: sinkronisasi invalidasi Redis gagal ({e}); pakai TTL saja.')
+                self._redis_warned = True
+
+    def current_revision(self) -> int:
+        """Revisi setelah event Redis terbaru diterapkan."""
+        self._sync_remote()
+        return self.revision
+
+    def get_profiles(self, place_ids: Sequence[object]) -> Dict[str, Optional[dict]]:
+        """place_id -> profil (None bila tidak valid). Hanya bagian basi/kedaluwarsa yang dimuat."""
+        self._sync_remote()
+        ids = list(dict.fromkeys(str(pid) for pid in (place_ids or []) if pid))
+        now = time.time()
+        stale: Dict[str, List[str]] = {}
+        stamps: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        with self._lock:
+            for pid in ids:
+                cached = self._parts.get(pid) or {}
+                for part in self._loaders:
+                    entry = cached.get(part)
+                    stamp = self._stamp(pid, part)
+                    if (
+                        entry is None
+                        or entry[1] != stamp
+                        or (self.ttl_seconds and now - entry[2] > self.ttl_seconds)
+                    ):
+                        stale.setdefault(part, []).append(pid)
+                        stamps[(pid, part)] = stamp
+
+        # Loader dipanggil di luar lock; hasil yang tertimpa invalidasi selama muat tetap
+        # dipakai untuk request ini, tapi tidak disimpan.
+        fresh: Dict[Tuple[str, str], object] = {}
+        for part, pids in stale.items():
+            values = self._loaders[part](pids) or {}
+            self.part_loads[part] += len(pids)
+            loaded_at = time.time()
+            with self._lock:
+                for pid in pids:
+                    value = values.get(pid)
+                    if self._stamp(pid, part) == stamps[(pid, part)]:
+                        self._parts.setdefault(pid, {})[part] = (value, stamps[(pid, part)], loaded_at)
+                    else:
+                        fresh[(pid, part)] = value
+
+        stale_ids = {pid for pids in stale.values() for pid in pids}
+        out: Dict[str, Optional[dict]] = {}
+        with self._lock:
+            self.hits += len(ids) - len(stale_ids)
+            self.misses += len(stale_ids)
+            for pid in ids:
+                cached = self._parts.get(pid) or {}
+                parts: Dict[str, object] = {}
+                loaded: List[float] = []
+                reusable = True
+                for part in self._loaders:
+                    if (pid, part) in fresh:
+                        parts[part] = fresh[(pid, part)]
+                        reusable = False
+                    elif part in cached:
+                        parts[part] = cached[part][0]
+                        loaded.append(cached[part][2])
+                    else:
+                        parts[part] = None
+                        reusable = False
+                key = tuple(loaded)
+                previous = self._profiles.get(pid)
+                if reusable and previous is not None and previous[1] == key:
+                    out[pid] = previous[0]
+                    continue
+                profile = self._assemble(pid, parts)
+                if reusable:
+                    self._profiles[pid] = (profile, key)
+                out[pid] = profile
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        with self._lock:
+            size = len(self._profiles)
+        return {
+            'profiles': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'part_loads': dict(self.part_loads),
+            'ttl_seconds': self.ttl_seconds,
+            'redis': self._redis is not None,
+        }
+
+
+_shared_store: Optional[ShopProfileStore] = None
+_shared_lock = threading.Lock()
+# Revisi hook tulis di proses ini selama store bersama belum dibuat.
+_local_revision = 0
+_publisher = None
+_publisher_failed = False
+
+
+def _redis_client():
+    """Klien Redis untuk event invalidasi (None bila nonaktif / gagal dibuat)."""
+    global _publisher, _publisher_failed
+    if not PROFILE_STORE_REDIS or _publisher_failed:
+        return None
+    if _publisher is None:
+        try:
+            from redis_utils import redis_from_url
+            _publisher = redis_from_url(socket_connect_timeout=1.0, socket_timeout=1.0)
+        except Exception as e:
+            _publisher_failed = True
+            print(f'[WARN] Profile store: Redis tidak tersedia ({e}); invalidasi hanya lokal.')
+            return None
+    return _publisher
+
+
+def get_shared_profile_store(
+    loaders: Dict[str, PartLoader],
+    assemble_fn: Callable[[str, Dict[str, object]], Optional[dict]],
+    *,
+    ttl_seconds: float = 600.0,
+) -> ShopProfileStore:
+    """Store bersama per proses; loader/assemble dari panggilan pertama yang dipakai."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ShopProfileStore(
+                loaders,
+                assemble_fn,
+                ttl_seconds=ttl_seconds,
+                redis_client=_redis_client(),
+            )
+        return _shared_store
+
+
+def publish_invalidation(client, place_id: str, parts: Sequence[str], *, origin: Optional[str] = None) -> int:
+    """Tulis event invalidasi (satu per bagian) secara atomik; hasil = nomor urut terakhir."""
+    return int(client.eval(
+        _PUBLISH_LUA, 2,
+        f'{_REDIS_PREFIX}:seq', f'{_REDIS_PREFIX}:events',
+        _REDIS_MAX_EVENTS, origin or process_origin(), place_id, *parts,
+    ) or 0)
+
+
+def _publish(place_id: str, parts: Sequence[str]) -> None:
+    client = _redis_client()
+    if client is None:
+        return
+    try:
+        publish_invalidation(client, place_id, parts)
+    except Exception as e:
+        print(f'[WARN] Profile store: publish invalidasi {place_id} gagal: {e}')
+
+
+def _bump_corpus_stamp() -> None:
+    """Revisi korpus lintas proses (cache pill + prakomputasi; di-batch di pill_precompute)."""
+    try:
+        from pill_precompute import request_corpus_stamp_bump
+        request_corpus_stamp_bump()
+    except Exception as e:
+        print(f'[WARN] Profile store: revisi korpus gagal dinaikkan: {e}')
+
+
+def notify_profile_changed(place_id: object, *parts: str) -> None:
+    """
+    Hook tulis: bagian `parts` (default semua) profil place_id basi. Dipanggil setelah
+    commit review / vote / vote pros-cons / fasilitas / data toko.
+    """
+    pid = str(place_id or '').strip()
+    if not pid:
+        return
+    global _local_revision
+    parts = tuple(p for p in parts if p in PROFILE_PARTS) or PROFILE_PARTS
+    store = _shared_store
+    if store is not None:
+        store.invalidate(pid, parts)
+    _local_revision += 1
+    _publish(pid, parts)
+    _bump_corpus_stamp()
+
+
+def notify_all_profiles_changed() -> None:
+    """Hook perubahan massal (migrasi, backfill): semua profil dimuat ulang."""
+    global _local_revision
+    store = _shared_store
+    if store is not None:
+        store.invalidate_all()
+    _local_revision += 1
+    _publish(_ALL_PLACES, ('all',))
+    _bump_corpus_stamp()
+
+
+def corpus_revision() -> Tuple[int, int]:
+    """
+    Versi data korpus (review/vote/pros/fasilitas/toko) di proses ini: berubah setiap
+    hook tulis lokal atau event invalidasi Redis. Dipakai sebagai bagian kunci cache
+    hasil rekomendasi.
+    """
+    store = _shared_store
+    return (_local_revision, store.current_revision() if store is not None else 0)
+
+
+def profile_store_stats() -> Optional[Dict[str, object]]:
+    store = _shared_store
+    return store.stats() if store is not None else None
@@ -26,6 +26,7 @@ from datetime import datetime, timedelta
 
 from auth_utils import get_db_connection
 from db_backend import dict_from_row
+from profile_store import notify_profile_changed
 from llm_backend import llm_is_available, llm_chat_completions_create, HF_MODEL
 
 PROS_CONS_REFRESH_INTERVAL_DAYS = 7
@@ -96,6 +97,7 @@ Jawab HANYA JSON valid dengan format:
             ],
             max_tokens=500,
             temperature=0.2,
+            cache_site='pros_cons',
         )
         parsed = _extract_json_block(raw)
         pros = [str(p).strip() for p in (parsed.get('pros') or []) if str(p).strip()]
@@ -198,6 +200,7 @@ def maybe_refresh_pros_cons(place_id, shop_name):
                 (place_id, now, total_count),
             )
         conn.commit()
+        notify_profile_changed(place_id, 'pros')
     except Exception as e:
         conn.rollback()
         print(f"[PROS_CONS] maybe_refresh_pros_cons failed for {place_id}: {e}")
@@ -384,6 +387,7 @@ def toggle_pros_cons_vote(user_id, point_id, vote_type):
         ).fetchone()[0]
 
         conn.commit()
+        notify_profile_changed(point[1], 'pros')
         return {
             'success': True,
             'upvotes': upvotes,
@@ -0,0 +1,93 @@
+"""
+Cache hasil rekomendasi pill (lapisan bersama, bukan per user).
+
+Bagian mahal pipeline (BM25, scoring hybrid, evidence, rerank LLM, ringkasan) hanya
+bergantung pada kombinasi pill + keadaan korpus + konfigurasi pipeline. Hasilnya
+disimpan di sini dengan kunci (pill terurut, revisi korpus, sidik konfigurasi);
+eksklusi feedback dan personalisasi user diterapkan di atasnya oleh app.
+
+Invalidasi: revisi korpus berubah setiap hook tulis, jadi kunci lama tidak pernah
+cocok lagi dan tersingkir oleh LRU. App memakai revisi lintas proses
+(pill_precompute.corpus_stamp) digabung revisi lokal (profile_store.corpus_revision),
+sehingga tulis lewat worker lain juga membatalkan cache proses ini. TTL membatasi umur
+hasil (mis. output LLM) walau korpus tidak berubah.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+
+def pipeline_fingerprint(config: Dict[str, object]) -> str:
+    """Hash pendek konfigurasi pipeline (mode BM25, top-K, backend LLM, ...)."""
+    payload = json.dumps(config, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def pill_cache_key(pills: Iterable[str], corpus_revision: Hashable, fingerprint: str) -> Tuple:
+    return (tuple(sorted(set(pills or ()))), corpus_revision, fingerprint)
+
+
+class PillResultCache:
+    """LRU + TTL hasil lapisan pill. maxsize <= 0 = nonaktif (get selalu None, put diabaikan)."""
+
+    def __init__(self, maxsize: int = 128, ttl_seconds: float = 900.0):
+        self.maxsize = max(0, int(maxsize or 0))
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self._entries: 'OrderedDict[Tuple, Tuple[float, dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        if not self.maxsize:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, value: dict) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
@@ -4,10 +4,21 @@ CRUD operations for coffee shop reviews
 """
 
 import base64
+import json
 import re
+import time
 from datetime import datetime
 from auth_utils import get_db_connection
+from bm25_utils import notify_review_deleted, notify_review_upserted
 from db_backend import dict_from_row
+from profile_store import notify_all_profiles_changed, notify_profile_changed
+from slang_normalize import (
+    lemma_table,
+    normalize_texts,
+    normalize_text_with_slang,
+    slang_map_version,
+    tokens_from_normalized,
+)
 
 # Batas ukuran decoded image per foto (selaras dengan frontend review).
 MAX_REVIEW_PHOTO_BYTES = 2 * 1024 * 1024
@@ -44,6 +55,86 @@ def _validate_review_photos_size(photos):
             return f'Ukuran gambar maksimal 2 MB per file (foto #{idx + 1}).'
     return None
 
+# Kolom hasil normalisasi slang yang disimpan saat tulis (lihat ensure_review_normalization_columns).
+_NORMALIZATION_COLUMNS = (
+    ('review_text_normalized', 'TEXT'),
+    ('review_tokens', 'TEXT'),
+    ('review_token_lemmas', 'TEXT'),
+    ('normalization_version', 'TEXT'),
+)
+_NORMALIZATION_UPDATE_SQL = (
+    'UPDATE reviews SET review_text_normalized = ?, review_tokens = ?, review_token_lemmas = ?, '
+    'normalization_version = ? WHERE id = ?'
+)
+_NORMALIZATION_READY = False
+# Kunci pg_try_advisory_lock agar backfill tidak jalan ganda di beberapa worker.
+_BACKFILL_ADVISORY_LOCK_KEY = 7_420_013
+
+
+def _review_table_columns(cursor):
+    try:
+        from db_backend import use_postgres
+        if use_postgres():
+            rows = cursor.execute(
+                """
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'reviews'
+                """
+            ).fetchall()
+            return {str(r[0]).lower() for r in (rows or [])}
+        rows = cursor.execute("PRAGMA table_info(reviews)").fetchall()
+        return {str(r[1]).lower() for r in (rows or [])}
+    except Exception:
+        return set()
+
+
+def ensure_review_normalization_columns():
+    """Tambah kolom teks ter-normalisasi + token + versi slang map di tabel reviews (idempotent)."""
+    global _NORMALIZATION_READY
+    if _NORMALIZATION_READY:
+        return True
+    conn = None
+    try:
+        from db_backend import use_postgres
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        pg = use_postgres()
+        cols = _review_table_columns(cursor)
+        for col_name, col_type in _NORMALIZATION_COLUMNS:
+            if col_name in cols:
+                continue
+            if pg:
+                cursor.execute(f'ALTER TABLE reviews ADD COLUMN IF NOT EXISTS {col_name} {col_type}')
+            else:
+                cursor.execute(f'ALTER TABLE reviews ADD COLUMN {col_name} {col_type}')
+        conn.commit()
+        _NORMALIZATION_READY = True
+        return True
+    except Exception as e:
+        print(f"[WARN] ensure_review_normalization_columns: {e}")
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _normalized_review_fields(text, normalized=None):
+    """
+    (teks ter-normalisasi, JSON token BM25, JSON tabel lemma, versi slang map) untuk
+    disimpan bersama review. Tabel lemma mencakup semua token teks ter-normalisasi.
+    """
+    if normalized is None:
+        normalized = normalize_text_with_slang(text or '')
+    return (
+        normalized,
+        json.dumps(tokens_from_normalized(normalized)),
+        json.dumps(lemma_table(normalized.split())),
+        slang_map_version(),
+    )
+
+
 def _validate_rating(r, allow_none=False):
     if allow_none and r is None:
         return True
@@ -84,6 +175,11 @@ def create_review(user_id, place_id, rating, text='', photos=None):
             datetime.utcnow().isoformat(),
         ))
         review_id = cursor.lastrowid
+        if _NORMALIZATION_READY:
+            cursor.execute(
+                _NORMALIZATION_UPDATE_SQL,
+                (*_normalized_review_fields(text or ''), review_id),
+            )
         
         photos = photos or []
         for i, p in enumerate(photos[:1]):  # maksimal 1 foto per review
@@ -104,6 +200,8 @@ def create_review(user_id, place_id, rating, text='', photos=None):
             (review_id,)
         ).fetchall()
         conn.close()
+        notify_review_upserted(place_id, review_id, text or '')
+        notify_profile_changed(place_id, 'reviews')
 
         return {
             'success': True,
@@ -232,6 +330,72 @@ def get_reviews_for_shop(place_id, limit=50, current_user_id=None):
         return {'success': False, 'error': str(e)}
 
 
+_RECOMMENDATION_REVIEW_COLUMNS = '''
+    SELECT r.id, r.user_id, r.shop_id, r.place_id, r.rating, r.review_text,
+           r.created_at, r.updated_at, u.username
+    FROM reviews r
+    LEFT JOIN users u ON r.user_id = u.id
+'''
+_RECOMMENDATION_REVIEW_COLUMNS_NORMALIZED = '''
+    SELECT r.id, r.user_id, r.shop_id, r.place_id, r.rating, r.review_text,
+           r.created_at, r.updated_at, u.username,
+           r.review_text_normalized, r.review_tokens, r.normalization_version,
+           r.review_token_lemmas
+    FROM reviews r
+    LEFT JOIN users u ON r.user_id = u.id
+'''
+
+
+def _recommendation_review_select():
+    return _RECOMMENDATION_REVIEW_COLUMNS_NORMALIZED if _NORMALIZATION_READY else _RECOMMENDATION_REVIEW_COLUMNS
+
+
+def _stored_normalization(review):
+    """(normalized, tokens, lemma) dari baris bila versinya cocok dengan slang map proses ini."""
+    if len(review) < 13 or review[11] != slang_map_version() or review[9] is None:
+        return None, None, None
+    try:
+        tokens = json.loads(review[10]) if review[10] else tokens_from_normalized(review[9])
+    except (TypeError, ValueError):
+        tokens = tokens_from_normalized(review[9])
+    try:
+        lemmas = json.loads(review[12]) if review[12] else lemma_table(review[9].split())
+    except (TypeError, ValueError):
+        lemmas = lemma_table(review[9].split())
+    return (
+        review[9],
+        tokens if isinstance(tokens, list) else None,
+        lemmas if isinstance(lemmas, dict) else None,
+    )
+
+
+def _lean_recommendation_review(review):
+    """
+    Baris review (urutan kolom _recommendation_review_select()) -> dict lean pipeline.
+    text_normalized / tokens / token_lemmas terisi bila hasil normalisasi tersimpan masih
+    sesuai versi slang map saat ini; None berarti pemanggil menormalisasi sendiri.
+    """
+    text_normalized, tokens, token_lemmas = _stored_normalization(review)
+    return {
+        'id': review[0],
+        'user_id': review[1],
+        'shop_id': review[2],
+        'place_id': review[3],
+        'rating': review[4],
+        'text': review[5],
+        'created_at': review[6],
+        'updated_at': review[7],
+        'username': review[8],
+        'full_name': review[8],
+        'photos': [],
+        'like_count': 0,
+        'user_has_liked': False,
+        'text_normalized': text_normalized,
+        'tokens': tokens,
+        'token_lemmas': token_lemmas,
+    }
+
+
 def get_reviews_for_recommendation_batch(place_ids):
     """
     Ambil review lean untuk pipeline rekomendasi (tanpa foto/like).
@@ -245,11 +409,7 @@ def get_reviews_for_recommendation_batch(place_ids):
         cursor = conn.cursor()
         placeholders = ','.join('?' * len(place_ids))
         rows = cursor.execute(
-            f'''
-            SELECT r.id, r.user_id, r.shop_id, r.place_id, r.rating, r.review_text,
-                   r.created_at, r.updated_at, u.username
-            FROM reviews r
-            LEFT JOIN users u ON r.user_id = u.id
+            _recommendation_review_select() + f'''
             WHERE r.place_id IN ({placeholders})
             ORDER BY r.created_at DESC
             ''',
@@ -262,26 +422,122 @@ def get_reviews_for_recommendation_batch(place_ids):
             pid = review[3]
             if pid not in by_place:
                 by_place[pid] = []
-            by_place[pid].append({
-                'id': review[0],
-                'user_id': review[1],
-                'shop_id': review[2],
-                'place_id': pid,
-                'rating': review[4],
-                'text': review[5],
-                'created_at': review[6],
-                'updated_at': review[7],
-                'username': review[8],
-                'full_name': review[8],
-                'photos': [],
-                'like_count': 0,
-                'user_has_liked': False,
-            })
+            by_place[pid].append(_lean_recommendation_review(review))
         return {'success': True, 'by_place': by_place}
     except Exception as e:
         return {'success': False, 'error': str(e), 'by_place': {}}
 
 
+def iter_reviews_for_recommendation_batch(place_ids, itersize=None):
+    """
+    Versi streaming get_reviews_for_recommendation_batch lewat server-side cursor.
+    Yield (place_id, [review_dict, ...]) per toko begitu semua barisnya tiba, jadi
+    pemanggil bisa membangun profil/dokumen BM25 sementara sisa korpus masih mengalir.
+    Review per toko tetap berurutan created_at DESC; toko tanpa review tidak di-yield.
+    Error DB diteruskan ke pemanggil (tidak dibungkus dict seperti versi batch).
+    """
+    place_ids = [str(pid).strip() for pid in (place_ids or []) if str(pid).strip()]
+    if not place_ids:
+        return
+    conn = get_db_connection()
+    try:
+        cursor = conn.streaming_cursor(itersize=itersize)
+        placeholders = ','.join('?' * len(place_ids))
+        cursor.execute(
+            _recommendation_review_select() + f'''
+            WHERE r.place_id IN ({placeholders})
+            ORDER BY r.place_id, r.created_at DESC
+            ''',
+            place_ids,
+        )
+        current_pid = None
+        current = []
+        for review in cursor:
+            pid = review[3]
+            if pid != current_pid and current:
+                yield current_pid, current
+                current = []
+            current_pid = pid
+            current.append(_lean_recommendation_review(review))
+        if current:
+            yield current_pid, current
+    finally:
+        conn.close()
+
+
+def backfill_review_normalization(batch_size=500, max_rows=None, processes=0):
+    """
+    Isi / perbarui kolom normalisasi untuk review lama atau yang versinya basi (slang map
+    atau DOMAIN_CANONICAL_REPLACEMENTS berubah). Diproses per batch (normalize_texts),
+    di Postgres dijaga advisory lock agar hanya satu worker yang jalan.
+    Return dict ringkasan: updated, batches, version, skipped_locked.
+    """
+    if not ensure_review_normalization_columns():
+        return {'success': False, 'error': 'Kolom normalisasi belum tersedia'}
+    from db_backend import use_postgres
+
+    version = slang_map_version()
+    batch_size = max(1, int(batch_size or 500))
+    summary = {'success': True, 'updated': 0, 'batches': 0, 'version': version, 'skipped_locked': False}
+    conn = get_db_connection()
+    locked = False
+    t0 = time.perf_counter()
+    try:
+        cursor = conn.cursor()
+        if use_postgres():
+            locked = bool(cursor.execute(
+                'SELECT pg_try_advisory_lock(?)', (_BACKFILL_ADVISORY_LOCK_KEY,)
+            ).fetchone()[0])
+            if not locked:
+                summary['skipped_locked'] = True
+                return summary
+        last_id = 0
+        while max_rows is None or summary['updated'] < max_rows:
+            limit = batch_size if max_rows is None else min(batch_size, max_rows - summary['updated'])
+            rows = cursor.execute(
+                '''
+                SELECT id, review_text FROM reviews
+                WHERE id > ? AND (normalization_version IS NULL OR normalization_version <> ?)
+                ORDER BY id
+                LIMIT ?
+                ''',
+                (last_id, version, limit),
+            ).fetchall()
+            if not rows:
+                break
+            normalized = normalize_texts([row[1] or '' for row in rows], processes=processes)
+            cursor.executemany(
+                _NORMALIZATION_UPDATE_SQL,
+                [
+                    (*_normalized_review_fields(row[1] or '', norm), row[0])
+                    for row, norm in zip(rows, normalized)
+                ],
+            )
+            conn.commit()
+            last_id = rows[-1][0]
+            summary['updated'] += len(rows)
+            summary['batches'] += 1
+        return summary
+    except Exception as e:
+        return {**summary, 'success': False, 'error': str(e)}
+    finally:
+        if locked:
+            try:
+                conn.rollback()
+                conn.cursor().execute('SELECT pg_advisory_unlock(?)', (_BACKFILL_ADVISORY_LOCK_KEY,))
+            except Exception:
+                pass
+        conn.close()
+        if summary['updated']:
+            # Teks ter-normalisasi/token/lemma di profil tersimpan ikut berubah.
+            notify_all_profiles_changed()
+            print(
+                f"[INFO] Backfill normalisasi review: {summary['updated']} baris "
+                f"(versi {version}, {round((time.perf_counter() - t0) * 1000)} ms)",
+                flush=True,
+            )
+
+
 def get_latest_reviews(limit=10):
     """Ambil ulasan terbaru tanpa filter umur, untuk aside publik."""
     try:
@@ -422,6 +678,11 @@ def update_review(review_id, user_id, rating=None, text=None, photos=None):
             datetime.utcnow().isoformat(),
             review_id,
         ))
+        if _NORMALIZATION_READY and text is not None:
+            cursor.execute(
+                _NORMALIZATION_UPDATE_SQL,
+                (*_normalized_review_fields(new_text or ''), review_id),
+            )
         if photos is not None:
             cursor.execute('DELETE FROM review_photos WHERE review_id = ?', (review_id,))
             for p in (photos or [])[:1]:
@@ -434,6 +695,8 @@ def update_review(review_id, user_id, rating=None, text=None, photos=None):
                     )
         conn.commit()
         conn.close()
+        notify_review_upserted(review[3], review_id, new_text)
+        notify_profile_changed(review[3], 'reviews')
 
         result = get_review(review_id)
         return result
@@ -448,7 +711,7 @@ def delete_review(review_id, user_id):
         
         # Check review exists and user owns it
         review = cursor.execute(
-            'SELECT * FROM reviews WHERE id = ?',
+            'SELECT id, user_id, place_id FROM reviews WHERE id = ?',
             (review_id,)
         ).fetchone()
         
@@ -462,6 +725,8 @@ def delete_review(review_id, user_id):
         cursor.execute('DELETE FROM reviews WHERE id = ?', (review_id,))
         conn.commit()
         conn.close()
+        notify_review_deleted(review[2], review_id)
+        notify_profile_changed(review[2], 'reviews')
         
         return {'success': True, 'message': 'Review deleted'}
     except Exception as e:
@@ -582,3 +847,21 @@ def create_review_report(review_id, reported_by_user_id, report_reason=None, rep
         return {'success': True, 'report_id': report_id}
     except Exception as e:
         return {'success': False, 'error': str(e), 'code': 'ERROR'}
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Normalisasi ulang review lama / versi slang map basi.')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--max-rows', type=int, default=None)
+    parser.add_argument('--processes', type=int, default=int(os.getenv('COFIND_NORMALIZE_PROCESSES', '0') or 0))
+    args = parser.parse_args()
+
+    summary = backfill_review_normalization(
+        batch_size=args.batch_size,
+        max_rows=args.max_rows,
+        processes=max(0, args.processes),
+    )
+    print(f"[INFO] Backfill normalisasi review: {summary}", flush=True)
@@ -0,0 +1,207 @@
+"""
+Single-flight untuk komputasi generator yang identik (request rekomendasi pill yang sama).
+
+Request konkuren dengan kunci sama di satu proses menunggu satu komputasi: pemimpin
+menjalankan generator, setiap event yang di-yield dicatat dan diteruskan ke semua
+penunggu (fan-out progress SSE), lalu semua menerima nilai `return` yang sama.
+
+Opsional lintas worker (redis_client + shared_key): pemimpin memegang lock Redis
+(SET NX EX) dan menaruh hasil JSON di Redis; worker lain mem-poll hasil itu. Bila
+lock hilang tanpa hasil (pemimpin gagal) atau batas tunggu habis, worker menghitung
+sendiri. Event progress tidak dibagi lintas worker; penunggu remote hanya menerima
+`wait_event` sekali.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Generator, Hashable, Optional
+
+# Pemimpin berhenti karena klien-nya putus (GeneratorExit): penunggu menghitung sendiri.
+_ABANDONED = object()
+
+_RELEASE_LOCK_LUA = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+)
+
+
+class _Flight:
+    __slots__ = ('events', 'done', 'result', 'error', 'cond')
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    `run(key, factory)` adalah generator: yield event dari `factory()` (generator) lalu
+    `return (hasil, peran)` dengan peran 'leader' | 'follower' | 'remote'.
+    """
+
+    def __init__(
+        self,
+        *,
+        redis_client=None,
+        redis_prefix: str = 'cofind:single_flight',
+        lock_ttl_seconds: float = 180.0,
+        result_ttl_seconds: float = 60.0,
+        wait_timeout_seconds: float = 120.0,
+        poll_interval_seconds: float = 0.25,
+    ):
+        self._redis = redis_client
+        self._prefix = redis_prefix
+        self.lock_ttl_seconds = max(1, int(lock_ttl_seconds))
+        self.result_ttl_seconds = max(1, int(result_ttl_seconds))
+        self.wait_timeout_seconds = max(0.0, float(wait_timeout_seconds))
+        self.poll_interval_seconds = max(0.01, float(poll_interval_seconds))
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.remote_hits = 0
+        self._redis_warned = False
+
+    def run(
+        self,
+        key: Hashable,
+        factory: Callable[[], Generator],
+        *,
+        shared_key: Optional[str] = None,
+        share_result: Optional[Callable[[object], bool]] = None,
+        wait_event=None,
+    ):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            result = yield from self._follow(flight)
+            if result is _ABANDONED:
+                return (yield from self.run(
+                    key, factory, shared_key=shared_key, share_result=share_result, wait_event=wait_event,
+                ))
+            return result, 'follower'
+        try:
+            if self._redis is not None and shared_key:
+                result, role = yield from self._lead_shared(flight, factory, shared_key, share_result, wait_event)
+            else:
+                result, role = (yield from self._lead(flight, factory)), 'leader'
+            return result, role
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _lead(self, flight: _Flight, factory: Callable[[], Generator]):
+        gen = factory()
+        while True:
+            try:
+                event = next(gen)
+            except StopIteration as stop:
+                flight.result = stop.value
+                return stop.value
+            with flight.cond:
+                flight.events.append(event)
+                flight.cond.notify_all()
+            yield event
+
+    def _follow(self, flight: _Flight):
+        index = 0
+        while True:
+            with flight.cond:
+                while index >= len(flight.events) and not flight.done:
+                    flight.cond.wait()
+                pending = flight.events[index:]
+                index += len(pending)
+                done = flight.done
+            for event in pending:
+                yield event
+            if done and index >= len(flight.events):
+                break
+        if isinstance(flight.error, GeneratorExit):
+            return _ABANDONED
+        if flight.error is not None:
+            raise RuntimeError(f'Komputasi bersama gagal: {flight.error}')
+        return flight.result
+
+    def _publish_event(self, flight: _Flight, event) -> None:
+        with flight.cond:
+            flight.events.append(event)
+            flight.cond.notify_all()
+
+    def _lead_shared(self, flight, factory, shared_key, share_result, wait_event):
+        """Pemimpin di proses ini; koordinasi lintas worker lewat lock + hasil di Redis."""
+        client = self._redis
+        lock_key = f'{self._prefix}:lock:{shared_key}'
+        result_key = f'{self._prefix}:result:{shared_key}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        waited = False
+        while True:
+            try:
+                cached = client.get(result_key)
+                if cached is not None:
+                    result = json.loads(cached)
+                    flight.result = result
+                    self.remote_hits += 1
+                    return result, 'remote'
+                if client.set(lock_key, token, nx=True, ex=self.lock_ttl_seconds):
+                    break
+            except Exception as e:
+                self._warn(e)
+                return (yield from self._lead(flight, factory)), 'leader'
+            if time.monotonic() >= deadline:
+                return (yield from self._lead(flight, factory)), 'leader'
+            if not waited and wait_event is not None:
+                waited = True
+                self._publish_event(flight, wait_event)
+                yield wait_event
+            time.sleep(self.poll_interval_seconds)
+
+        try:
+            result = yield from self._lead(flight, factory)
+            if share_result is None or share_result(result):
+                try:
+                    client.set(result_key, json.dumps(result, ensure_ascii=False, default=str), ex=self.result_ttl_seconds)
+                except Exception as e:
+                    self._warn(e)
+            return result, 'leader'
+        finally:
+            try:
+                client.eval(_RELEASE_LOCK_LUA, 1, lock_key, token)
+            except Exception as e:
+                self._warn(e)
+
+    def _warn(self, err: Exception) -> None:
+        if not self._redis_warned:
+            print(f'[WARN] Single-flight: Redis tidak bisa dipakai ({err}); koordinasi hanya lokal.')
+            self._redis_warned = True
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            'in_flight': in_flight,
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'remote_hits': self.remote_hits,
+            'redis': self._redis is not None,
+        }
@@ -4,16 +4,30 @@ Normalisasi slang Indonesia untuk matching review / BM25.
 Memuat data/indonesia_slang_map.json
 dan menggabungkannya dengan canonical replacements domain coffee shop.
 Domain replacements selalu menang atas kamus slang umum.
+
+Normalisasi memakai automaton trie token: satu lintasan kiri-ke-kanan mengganti frasa
+multi-kata (longest match) dan token tunggal sekaligus, dengan hasil identik dengan
+implementasi regex lama (_normalize_regex, tetap ada sebagai referensi/benchmark).
+Benchmark: `python slang_normalize.py --bench [jumlah_review]`.
+
+Untuk korpus utuh (rebuild indeks BM25) pakai normalize_texts / tokenize_texts: satu
+panggilan per batch, dedup di dalam batch (bukan lewat LRU global yang terbatas 20k
+entri), dan opsional dibagi ke process pool.
+
+token_lemmas / lemma_table: bentuk dasar tiap token setelah imbuhan Indonesia yang
+diizinkan dilepas (berkeluarganya -> keluarga), disimpan bersama token review agar
+pencocokan kata kunci cukup berupa lookup set.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
 import unicodedata
 from functools import lru_cache
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple
 
 _ROOT = os.path.dirname(os.path.abspath(__file__))
 _SLANG_JSON_PATH = os.path.join(_ROOT, 'data', 'indonesia_slang_map.json')
@@ -43,6 +57,29 @@ DOMAIN_CANONICAL_REPLACEMENTS: Dict[str, str] = {
 }
 
 
+# Naikkan bila logika normalisasi berubah (bukan datanya) agar hasil tersimpan ikut diulang.
+# 2: tabel lemma per review ikut disimpan.
+NORMALIZER_REVISION = 2
+
+
+@lru_cache(maxsize=1)
+def slang_map_version() -> str:
+    """
+    Hash versi aturan normalisasi: isi indonesia_slang_map.json + DOMAIN_CANONICAL_REPLACEMENTS
+    + NORMALIZER_REVISION. Disimpan bersama teks ter-normalisasi di DB; bila berbeda dari
+    versi proses ini, hasil tersimpan dianggap basi dan dinormalisasi ulang.
+    """
+    digest = hashlib.sha256()
+    digest.update(f'rev:{NORMALIZER_REVISION}\n'.encode('utf-8'))
+    try:
+        with open(_SLANG_JSON_PATH, 'rb') as f:
+            digest.update(f.read())
+    except OSError:
+        digest.update(b'no-slang-map')
+    digest.update(json.dumps(DOMAIN_CANONICAL_REPLACEMENTS, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
 def _basic_clean(text: str) -> str:
     text = str(text or '').strip().lower()
     if not text:
@@ -146,11 +183,75 @@ def _apply_token_map(text: str, token_map: Dict[str, str]) -> str:
     return text
 
 
-@lru_cache(maxsize=20000)
-def _normalize_cached(value: str) -> str:
-    text = _basic_clean(value)
-    if not text:
-        return ''
+# Node trie: token -> (anak, dest frasa bila node ini akhir sebuah src multi-kata).
+_TrieNode = Dict[str, Tuple[dict, Optional[str]]]
+
+
+@lru_cache(maxsize=1)
+def _compiled_automaton() -> tuple:
+    """
+    Bentuk satu lintasan dari aturan yang sama dengan _compiled_replacements():
+      - trie token untuk src multi-kata (cari match terpanjang di tiap awal token,
+        sama dengan alternation regex yang diurutkan panjang menurun + \\b)
+      - closure token: hasil _MAX_TOKEN_PASSES lintasan token_map untuk tiap token,
+        dihitung sekali di depan, jadi per token cukup satu lookup dict
+    """
+    token_map, multiword_map, _multiword_re = _compiled_replacements()
+
+    closure: Dict[str, str] = {}
+    for src in token_map:
+        text = src
+        for _ in range(_MAX_TOKEN_PASSES):
+            replaced = ' '.join(token_map.get(tok, tok) for tok in text.split())
+            if replaced == text:
+                break
+            text = replaced
+        closure[src] = text
+
+    root: _TrieNode = {}
+    for src, dest in multiword_map.items():
+        tokens = src.split()
+        node = root
+        for depth, tok in enumerate(tokens):
+            children, node_dest = node.get(tok, ({}, None))
+            if depth == len(tokens) - 1:
+                node_dest = dest
+            node[tok] = (children, node_dest)
+            node = children
+    return root, closure
+
+
+def _normalize_tokens_automaton(text: str) -> str:
+    root, closure = _compiled_automaton()
+    tokens = text.split()
+    n = len(tokens)
+    out: List[str] = []
+    i = 0
+    while i < n:
+        node = root
+        best_dest = None
+        best_end = i
+        j = i
+        while j < n:
+            entry = node.get(tokens[j])
+            if entry is None:
+                break
+            node, dest = entry
+            j += 1
+            if dest is not None:
+                best_dest, best_end = dest, j
+        if best_dest is not None:
+            for tok in best_dest.split():
+                out.append(closure.get(tok, tok))
+            i = best_end
+        else:
+            tok = tokens[i]
+            out.append(closure.get(tok, tok))
+            i += 1
+    return ' '.join(' '.join(out).split())
+
+
+def _replace_regex(text: str) -> str:
     token_map, multiword_map, multiword_re = _compiled_replacements()
     if multiword_re is not None:
         text = multiword_re.sub(lambda m: multiword_map[m.group(0)], text)
@@ -158,6 +259,24 @@ def _normalize_cached(value: str) -> str:
     return re.sub(r'\s+', ' ', text).strip()
 
 
+def _normalize_regex(value: str) -> str:
+    """Implementasi lama (regex multi-kata + lintasan token_map); referensi perilaku."""
+    text = _basic_clean(value)
+    if not text:
+        return ''
+    return _replace_regex(text)
+
+
+def _normalize_uncached(value: str) -> str:
+    text = _basic_clean(value)
+    if not text:
+        return ''
+    return _normalize_tokens_automaton(text)
+
+
+_normalize_cached = lru_cache(maxsize=20000)(_normalize_uncached)
+
+
 def normalize_text_with_slang(value: str) -> str:
     """
     Normalisasi teks: lowercase, strip aksen, lalu canonical + slang map.
@@ -174,3 +293,184 @@ def tokenize_normalized(value: str) -> list:
     if not text:
         return []
     return [t for t in text.split() if len(t) > 1]
+
+
+# Di bawah ini batch tetap dikerjakan serial: overhead spawn proses tidak sebanding.
+_MIN_TEXTS_PER_PROCESS = 500
+
+
+def _normalize_chunk(texts: List[str]) -> List[str]:
+    return [_normalize_uncached(text) for text in texts]
+
+
+def _tokenize_chunk(texts: List[str]) -> List[List[str]]:
+    return [[t for t in _normalize_uncached(text).split() if len(t) > 1] for text in texts]
+
+
+def _run_batch(fn, texts: Iterable[object], processes: int, chunksize: int) -> list:
+    items = [value if isinstance(value, str) else str(value or '') for value in texts]
+    # Review duplikat (copy-paste, "mantap", "enak") cukup diproses sekali per batch.
+    unique = list(dict.fromkeys(items))
+    workers = max(0, int(processes or 0))
+    if workers > 1 and len(unique) >= _MIN_TEXTS_PER_PROCESS * 2:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunksize = max(1, int(chunksize))
+        chunks = [unique[i:i + chunksize] for i in range(0, len(unique), chunksize)]
+        # spawn, bukan fork: pemanggil biasanya worker gunicorn/Celery yang sudah multi-thread.
+        ctx = multiprocessing.get_context('spawn')
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=ctx) as pool:
+                results = [value for part in pool.map(fn, chunks) for value in part]
+        except Exception as err:
+            print(f'[WARN] Process pool normalisasi gagal, lanjut serial: {err}')
+            results = fn(unique)
+    else:
+        results = fn(unique)
+    by_text = dict(zip(unique, results))
+    return [by_text[value] for value in items]
+
+
+def normalize_texts(texts: Iterable[object], *, processes: int = 0, chunksize: int = 1000) -> List[str]:
+    """
+    Versi batch normalize_text_with_slang untuk banyak teks sekaligus (urutan dipertahankan).
+    processes > 1 membagi teks unik ke process pool bila batch cukup besar.
+    """
+    return _run_batch(_normalize_chunk, texts, processes, chunksize)
+
+
+def tokenize_texts(texts: Iterable[object], *, processes: int = 0, chunksize: int = 1000) -> List[List[str]]:
+    """Versi batch tokenize_normalized: list token per teks, siap masuk indeks BM25."""
+    return _run_batch(_tokenize_chunk, texts, processes, chunksize)
+
+
+def tokens_from_normalized(normalized: str) -> List[str]:
+    """Token BM25 dari teks yang sudah dinormalisasi (sama dengan tokenize_normalized)."""
+    return [t for t in str(normalized or '').split() if len(t) > 1]
+
+
+# Imbuhan Indonesia yang boleh menempel pada kata kunci (anaknya, ngegame, berkeluarga).
+# Bukan substring bebas: "anak" di dalam "pontianak" atau "story" di dalam "history" tidak lolos.
+ID_AFFIX_SUFFIXES = ('nya', 'lah', 'kah', 'pun', 'ku', 'mu', 'kan', 'an', 'i')
+ID_AFFIX_PREFIXES = ('ber', 'me', 'di', 'ter', 'se', 'pe', 'per', 'ke', 'nge', 'ng')
+# Bentuk dasar hasil lepas imbuhan minimal 4 huruf; kata kunci <= 3 huruf hanya cocok utuh.
+_MIN_LEMMA_LEN = 4
+
+
+@lru_cache(maxsize=50000)
+def token_lemmas(token: str) -> Tuple[str, ...]:
+    """
+    Semua bentuk dasar satu token: token itu sendiri + hasil lepas prefiks/sufiks yang
+    diizinkan. Kata kunci cocok dengan token bila ada di tuple ini. Token ber-tanda
+    hubung dipecah per bagian (anak-anak -> anak), tanda baca di tepi dibuang.
+    """
+    tok = re.sub(r'^[^\w]+|[^\w]+$', '', str(token or '').lower(), flags=re.UNICODE)
+    if not tok:
+        return ()
+    if '-' in tok:
+        return tuple(dict.fromkeys(
+            lemma for part in tok.split('-') if part for lemma in token_lemmas(part)
+        ))
+    lemmas = [tok]
+    for pre in ('',) + ID_AFFIX_PREFIXES:
+        if not tok.startswith(pre):
+            continue
+        for suf in ('',) + ID_AFFIX_SUFFIXES:
+            if (pre or suf) and tok.endswith(suf):
+                core = tok[len(pre):len(tok) - len(suf)]
+                if len(core) >= _MIN_LEMMA_LEN:
+                    lemmas.append(core)
+    return tuple(dict.fromkeys(lemmas))
+
+
+def lemma_table(tokens: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    token -> lemma untuk token review yang punya bentuk dasar selain dirinya sendiri.
+    Token yang tidak tercantum berarti lemmanya hanya token itu (lihat lemmas_from_table).
+    """
+    table: Dict[str, List[str]] = {}
+    for token in dict.fromkeys(tokens or ()):
+        lemmas = token_lemmas(token)
+        if lemmas != (token,):
+            table[token] = list(lemmas)
+    return table
+
+
+def lemmas_from_table(token: str, table: Optional[Dict[str, List[str]]]) -> Tuple[str, ...]:
+    """Lemma token dari tabel tersimpan; tanpa tabel dihitung langsung (token_lemmas)."""
+    if table is None:
+        return token_lemmas(token)
+    lemmas = table.get(token)
+    return tuple(lemmas) if lemmas else (token,)
+
+
+def _synthetic_reviews(count: int, seed: int = 7) -> List[str]:
+    """Korpus review sintetis: campuran kata biasa, slang tunggal, dan frasa multi-kata."""
+    import random
+
+    rng = random.Random(seed)
+    token_map, multiword_map, _ = _compiled_replacements()
+    slang = list(token_map) or ['bgt']
+    phrases = list(multiword_map) or ['wi fi']
+    plain = [
+        'kopi', 'enak', 'tempat', 'nyaman', 'wifi', 'kencang', 'harga', 'murah', 'parkir',
+        'luas', 'pelayan', 'ramah', 'cocok', 'buat', 'kerja', 'nugas', 'santai', 'sore',
+    ]
+    reviews = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(8, 60)):
+            roll = rng.random()
+            if roll < 0.6:
+                words.append(rng.choice(plain))
+            elif roll < 0.9:
+                words.append(rng.choice(slang))
+            else:
+                words.append(rng.choice(phrases))
+        reviews.append(' '.join(words).capitalize() + rng.choice(['.', '!', '!!', ' :)']))
+    return reviews
+
+
+def benchmark_normalizers(count: int = 5000, repeat: int = 3) -> Dict[str, float]:
+    """Bandingkan automaton vs regex lama pada korpus sintetis (tanpa cache LRU)."""
+    import time
+
+    reviews = _synthetic_reviews(count)
+    _compiled_replacements()
+    _compiled_automaton()
+    cleaned = [_basic_clean(text) for text in reviews]
+    mismatches = sum(1 for text in cleaned if _normalize_tokens_automaton(text) != _replace_regex(text))
+
+    def _best(fn, inputs) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for text in inputs:
+                fn(text)
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    clean_s = _best(_basic_clean, reviews)
+    regex_s = _best(_replace_regex, cleaned)
+    automaton_s = _best(_normalize_tokens_automaton, cleaned)
+    return {
+        'reviews': count,
+        'rules': len(get_replacement_pairs()),
+        'mismatches': mismatches,
+        'basic_clean_ms': round(clean_s * 1000, 1),
+        'regex_replace_ms': round(regex_s * 1000, 1),
+        'automaton_replace_ms': round(automaton_s * 1000, 1),
+        'speedup': round(regex_s / automaton_s, 2) if automaton_s else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) >= 2 and sys.argv[1] == '--bench':
+        n = int(sys.argv[2]) if len(sys.argv) >= 3 else 5000
+        print(f'[BENCH] slang_normalize {benchmark_normalizers(n)}')
+    else:
+        for line in sys.stdin:
+            print(normalize_text_with_slang(line))
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+
 from celery_app import celery_app
 
 
@@ -18,3 +20,59 @@ def summarize_review_task(place_id: str, shop_name: str):
             "status_code": int(result.get("status_code") or 500),
         }
     return result.get("payload") or {"status": "success"}
+
+
+@celery_app.task(name="cofind.backfill_review_normalization")
+def backfill_review_normalization_task(batch_size: int = 500, max_rows: int | None = None):
+    """
+    Task async: isi ulang kolom normalisasi review (setelah slang map / domain replacement berubah).
+    Satu-satunya jalur otomatis backfill (selain CLI `python review_utils.py`); task yang
+    terpotong time limit aman diulang karena hanya baris berversi basi yang diproses.
+    """
+    from review_utils import backfill_review_normalization
+
+    return backfill_review_normalization(
+        batch_size=batch_size,
+        max_rows=max_rows,
+        processes=max(0, int(os.getenv("COFIND_NORMALIZE_PROCESSES", "0") or 0)),
+    )
+
+
+PILL_PRECOMPUTE_TASK_TIME_LIMIT = int(os.getenv("COFIND_PILL_PRECOMPUTE_TASK_TIME_LIMIT_SECONDS", "120") or 120)
+PILL_PRECOMPUTE_TASK_SOFT_TIME_LIMIT = int(os.getenv("COFIND_PILL_PRECOMPUTE_TASK_SOFT_TIME_LIMIT_SECONDS", "90") or 90)
+
+
+@celery_app.task(name="cofind.precompute_pill_combinations")
+def precompute_pill_combinations_task(recent_first: bool = True, recent_only: bool = False, recent_days: int = 30):
+    """
+    Task async: jadwalkan prakomputasi semua kombinasi pill sebagai satu subtask per
+    kombinasi (cofind.precompute_pill_combination), bukan satu task panjang yang
+    melewati batas waktu global worker.
+    """
+    from app import COFIND_PILL_PRECOMPUTED, _precompute_pill_combos
+
+    if not COFIND_PILL_PRECOMPUTED:
+        return {"status": "disabled"}
+    combos = _precompute_pill_combos(
+        recent_first=recent_first,
+        recent_only=recent_only,
+        recent_days=recent_days,
+    )
+    for combo in combos:
+        precompute_pill_combination_task.apply_async(args=[list(combo)])
+    return {"status": "scheduled", "total": len(combos)}
+
+
+@celery_app.task(
+    name="cofind.precompute_pill_combination",
+    time_limit=PILL_PRECOMPUTE_TASK_TIME_LIMIT,
+    soft_time_limit=PILL_PRECOMPUTE_TASK_SOFT_TIME_LIMIT,
+)
+def precompute_pill_combination_task(pills: list):
+    """
+    Task async: prakomputasi deterministik satu kombinasi pill. Baris yang masih berlaku
+    (revisi korpus + sidik konfigurasi sama) dilewati.
+    """
+    from app import _precompute_pill_combination
+
+    return {"preferences": "+".join(sorted(pills)), "status": _precompute_pill_combination(pills)}
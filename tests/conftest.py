@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul aplikasi berada di root repo (layout datar).
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,128 @@
+"""IncrementalBM25Index: paritas dengan BM25Okapi setelah tambah/ganti/hapus, dan sync berbasis stamp."""
+
+import random
+
+import pytest
+
+rank_bm25 = pytest.importorskip('rank_bm25')
+
+from bm25_utils import IncrementalBM25Index
+
+VOCAB = [f't{i}' for i in range(40)]
+
+
+def _review(rng):
+    weights = [1.0 / (rank + 1) for rank in range(len(VOCAB))]
+    return ' '.join(rng.choices(VOCAB, weights=weights, k=rng.randint(2, 15)))
+
+
+def _assert_parity(index, docs, queries):
+    """docs: place_id -> {review_id: teks}; referensi dibangun ulang dari nol."""
+    place_ids = index.place_ids
+    assert sorted(place_ids) == sorted(docs)
+    reference = rank_bm25.BM25Okapi([
+        [token for text in docs[pid].values() for token in text.split()] for pid in place_ids
+    ])
+    for query in queries:
+        expected = reference.get_scores(query)
+        got = index.get_scores(query)
+        assert max(abs(float(a) - float(b)) for a, b in zip(expected, got)) < 1e-9
+        top = index.top_k(query, 5)['results']
+        ranked = sorted(
+            ((float(score), pid) for pid, score in zip(place_ids, expected) if score > 0),
+            key=lambda item: -item[0],
+        )[:5]
+        assert [score for _pid, score in top] == pytest.approx([score for score, _pid in ranked], abs=1e-9)
+
+
+@pytest.mark.parametrize('seed', [3, 11, 29])
+def test_incremental_add_replace_delete_matches_bm25okapi(seed):
+    rng = random.Random(seed)
+    index = IncrementalBM25Index(str.split)
+    docs = {}
+    queries = [rng.sample(VOCAB, rng.randint(1, 4)) for _ in range(20)]
+
+    # Tambah review satu per satu.
+    for i in range(30):
+        pid = f'place_{i}'
+        docs[pid] = {}
+        for r in range(rng.randint(1, 4)):
+            text = _review(rng)
+            docs[pid][f'r{i}_{r}'] = text
+            assert index.upsert_review(pid, f'r{i}_{r}', text)
+    _assert_parity(index, docs, queries)
+
+    # Ganti teks review yang sudah ada + ganti seluruh isi beberapa toko.
+    for pid in rng.sample(sorted(docs), 8):
+        review_id = rng.choice(sorted(docs[pid]))
+        docs[pid][review_id] = _review(rng)
+        assert index.upsert_review(pid, review_id, docs[pid][review_id])
+    for pid in rng.sample(sorted(docs), 4):
+        docs[pid] = {f'{pid}_baru_{r}': _review(rng) for r in range(rng.randint(1, 3))}
+        assert index.replace_document(pid, [{'id': key, 'text': text} for key, text in docs[pid].items()])
+    _assert_parity(index, docs, queries)
+
+    # Hapus review (toko tanpa review keluar dari korpus) dan hapus toko.
+    for pid in rng.sample(sorted(docs), 6):
+        review_id = rng.choice(sorted(docs[pid]))
+        assert index.remove_review(pid, review_id)
+        del docs[pid][review_id]
+        if not docs[pid]:
+            del docs[pid]
+    for pid in rng.sample(sorted(docs), 3):
+        assert index.remove_document(pid)
+        del docs[pid]
+    _assert_parity(index, docs, queries)
+
+
+def test_unchanged_review_does_not_bump_version():
+    index = IncrementalBM25Index(str.split)
+    assert index.upsert_review('a', 1, 't1 t2')
+    version = index.version
+    assert not index.upsert_review('a', 1, 't1 t2')
+    assert not index.replace_document('a', [{'id': 1, 'text': 't1 t2'}])
+    assert index.version == version
+
+
+def _profiles(docs):
+    return [
+        {'place_id': pid, 'reviews': [{'id': key, 'text': text} for key, text in reviews.items()]}
+        for pid, reviews in docs.items()
+    ]
+
+
+def test_sync_profiles_skips_when_stamp_unchanged(monkeypatch):
+    index = IncrementalBM25Index(str.split)
+    docs = {'a': {'1': 't1 t2'}, 'b': {'2': 't2 t3'}}
+    assert index.sync_profiles(_profiles(docs), stamp=(1,)) == 2
+
+    calls = []
+    original = index.replace_document
+    monkeypatch.setattr(index, 'replace_document', lambda *a, **kw: calls.append(a) or original(*a, **kw))
+    # Stamp sama: tidak ada profil yang di-hash ulang, meski daftar profil berbeda.
+    assert index.sync_profiles(_profiles({'a': {'1': 'ubah'}}), stamp=(1,)) == 0
+    assert calls == []
+    # Perubahan lewat hook tulis tetap masuk tanpa sync penuh.
+    assert index.upsert_review('c', '3', 't4')
+    assert sorted(index.place_ids) == ['a', 'b', 'c']
+
+    # Stamp berubah: sync penuh, dokumen basi dibuang.
+    docs = {'a': {'1': 't1 t5'}, 'c': {'3': 't4'}}
+    assert index.sync_profiles(_profiles(docs), stamp=(2,)) == 2
+    assert len(calls) == 2
+    assert sorted(index.place_ids) == ['a', 'c']
+
+
+def test_sync_profiles_full_sync_after_max_age(monkeypatch):
+    import bm25_utils
+
+    now = [1000.0]
+    monkeypatch.setattr(bm25_utils.time, 'time', lambda: now[0])
+    index = IncrementalBM25Index(str.split)
+    index.sync_profiles(_profiles({'a': {'1': 't1'}}), stamp=(1,), max_age_seconds=60)
+    now[0] += 30
+    assert index.sync_profiles(_profiles({'a': {'1': 't2'}}), stamp=(1,), max_age_seconds=60) == 0
+    now[0] += 31
+    assert index.sync_profiles(_profiles({'a': {'1': 't2'}}), stamp=(1,), max_age_seconds=60) == 1
+    # Tanpa stamp selalu sync penuh.
+    assert index.sync_profiles(_profiles({'a': {'1': 't3'}})) == 1
@@ -0,0 +1,87 @@
+"""Paritas skor SparseBM25Scorer / InvertedBM25Index.top_k dengan rank_bm25.BM25Okapi."""
+
+import random
+from collections import Counter
+
+import pytest
+
+rank_bm25 = pytest.importorskip('rank_bm25')
+pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from bm25_utils import InvertedBM25Index, SparseBM25Scorer, okapi_idf
+
+VOCAB = [f't{i}' for i in range(60)]
+
+
+def _corpus(seed: int, n_docs: int = 80):
+    rng = random.Random(seed)
+    place_ids = [f'place_{i}' for i in range(n_docs)]
+    # Distribusi miring supaya ada term sangat umum (idf negatif -> epsilon) dan term langka.
+    weights = [1.0 / (rank + 1) for rank in range(len(VOCAB))]
+    corpus = [rng.choices(VOCAB, weights=weights, k=rng.randint(3, 40)) for _ in place_ids]
+    queries = [rng.sample(VOCAB, rng.randint(1, 6)) for _ in range(40)]
+    queries.append(['t0', 't0', 't5'])  # token berulang dihitung berulang
+    queries.append(['tidak_ada_di_korpus'])
+    return place_ids, corpus, queries
+
+
+def _inverted(place_ids, corpus):
+    freqs = [Counter(doc) for doc in corpus]
+    df = Counter()
+    for doc in freqs:
+        df.update(doc.keys())
+    return InvertedBM25Index.from_term_freqs(place_ids, freqs, okapi_idf(df, len(freqs)))
+
+
+@pytest.mark.parametrize('seed', [1, 7, 42])
+def test_sparse_scorer_matches_bm25okapi(seed):
+    place_ids, corpus, queries = _corpus(seed)
+    reference = rank_bm25.BM25Okapi(corpus)
+    scorer = SparseBM25Scorer.from_tokenized_corpus(place_ids, corpus)
+
+    for query in queries:
+        expected = reference.get_scores(query)
+        got = scorer.get_scores(query)
+        assert max(abs(float(a) - float(b)) for a, b in zip(expected, got)) < 1e-9
+
+    many = scorer.score_many(queries)
+    for row, query in zip(many, queries):
+        expected = reference.get_scores(query)
+        assert max(abs(float(a) - float(b)) for a, b in zip(expected, row)) < 1e-9
+
+
+@pytest.mark.parametrize('seed', [1, 7, 42])
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_inverted_top_k_matches_bm25okapi(seed, k):
+    place_ids, corpus, queries = _corpus(seed)
+    reference = rank_bm25.BM25Okapi(corpus)
+    index = _inverted(place_ids, corpus)
+
+    for query in queries:
+        expected = reference.get_scores(query)
+        ranked = sorted(
+            ((float(score), -doc_id) for doc_id, score in enumerate(expected) if score > 0),
+            reverse=True,
+        )[:k]
+        got = index.top_k(query, k)['results']
+        assert [pid for pid, _score in got] == [place_ids[-neg] for _score, neg in ranked]
+        for (_pid, score), (ref_score, _neg) in zip(got, ranked):
+            assert score == pytest.approx(ref_score, abs=1e-9)
+
+
+def test_inverted_top_k_respects_place_filter():
+    place_ids, corpus, queries = _corpus(3)
+    reference = rank_bm25.BM25Okapi(corpus)
+    index = _inverted(place_ids, corpus)
+    subset = place_ids[::3]
+    allowed = {place_ids.index(pid) for pid in subset}
+
+    for query in queries:
+        expected = reference.get_scores(query)
+        ranked = sorted(
+            ((float(expected[d]), -d) for d in allowed if expected[d] > 0),
+            reverse=True,
+        )[:5]
+        got = index.top_k(query, 5, place_ids=subset)['results']
+        assert [pid for pid, _score in got] == [place_ids[-neg] for _score, neg in ranked]
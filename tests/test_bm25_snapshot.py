@@ -0,0 +1,174 @@
+"""BM25Snapshot: round-trip file mmap, overlay perubahan lokal di atas snapshot, dan hot-swap generasi."""
+
+import random
+
+import pytest
+
+import bm25_utils
+from bm25_utils import (
+    DEFAULT_BM25F_FIELDS,
+    BM25Snapshot,
+    IncrementalBM25Index,
+    get_shared_bm25_index,
+    publish_bm25_snapshot,
+    write_bm25_snapshot,
+)
+
+VOCAB = [f't{i}' for i in range(40)]
+
+
+def _text(rng, low=2, high=15):
+    weights = [1.0 / (rank + 1) for rank in range(len(VOCAB))]
+    return ' '.join(rng.choices(VOCAB, weights=weights, k=rng.randint(low, high)))
+
+
+def _build(seed, n_docs=25):
+    """(indeks, rng, teks review per toko) dengan field BM25F fasilitas/pros."""
+    rng = random.Random(seed)
+    index = IncrementalBM25Index(str.split)
+    texts = {}
+    for i in range(n_docs):
+        pid = f'place_{i}'
+        texts[pid] = {f'r{i}_{r}': _text(rng) for r in range(rng.randint(1, 3))}
+        for key, text in texts[pid].items():
+            index.upsert_review(pid, key, text)
+        index.set_field_text(pid, 'facilities', _text(rng, 0, 4))
+        index.set_field_text(pid, 'pros', _text(rng, 0, 3))
+    # Satu toko dengan review tanpa token (placeholder dokumen kosong).
+    texts['place_kosong'] = {'r_kosong': ''}
+    index.upsert_review('place_kosong', 'r_kosong', '')
+    return index, rng, texts
+
+
+def _queries(seed):
+    rng = random.Random(seed + 1000)
+    return [rng.sample(VOCAB, rng.randint(1, 4)) for _ in range(15)] + [['tidak_ada']]
+
+
+def _assert_same_scores(expected_index, got_index, queries, fields=None):
+    assert sorted(got_index.place_ids) == sorted(expected_index.place_ids)
+    assert len(got_index) == len(expected_index)
+    assert got_index.avgdl == pytest.approx(expected_index.avgdl)
+    for query in queries:
+        expected = expected_index.score_places(query, fields=fields)
+        got = got_index.score_places(query, fields=fields)
+        assert got.keys() == expected.keys()
+        for pid, score in expected.items():
+            assert got[pid] == pytest.approx(score, abs=1e-9)
+        top_expected = expected_index.top_k(query, 5, fields=fields)['results']
+        top_got = got_index.top_k(query, 5, fields=fields)['results']
+        assert [s for _pid, s in top_got] == pytest.approx([s for _pid, s in top_expected], abs=1e-9)
+
+
+def _open(index, path):
+    write_bm25_snapshot(index, str(path))
+    loaded = IncrementalBM25Index.from_snapshot(str.split, BM25Snapshot(str(path)))
+    # Field BM25F tidak ikut snapshot; diisi ulang lewat sync_profiles di aplikasi.
+    for field, docs in index._field_docs.items():
+        for pid, (text, _tf) in docs.items():
+            loaded.set_field_text(pid, field, text)
+    return loaded
+
+
+@pytest.mark.parametrize('seed', [2, 17])
+def test_snapshot_round_trip_matches_in_memory_index(tmp_path, seed):
+    index, _rng, _texts = _build(seed)
+    loaded = _open(index, tmp_path / 'bm25.snap')
+
+    assert loaded.generation == index.generation == 1
+    assert loaded.vocabulary() == index.vocabulary()
+    assert loaded.stats()['reviews'] == index.stats()['reviews']
+    _assert_same_scores(index, loaded, _queries(seed))
+    _assert_same_scores(index, loaded, _queries(seed), fields=DEFAULT_BM25F_FIELDS)
+    # BM25F di atas snapshot tidak menyalin dokumen snapshot ke memori proses.
+    assert loaded.stats()['overlay_documents'] == 0
+
+
+@pytest.mark.parametrize('seed', [2, 17])
+def test_overlay_changes_match_in_memory_index(tmp_path, seed):
+    index, rng, texts = _build(seed)
+    loaded = _open(index, tmp_path / 'bm25.snap')
+
+    def both(method, *args):
+        assert getattr(index, method)(*args) == getattr(loaded, method)(*args)
+
+    def upsert(pid, key, text):
+        texts.setdefault(pid, {})[key] = text
+        both('upsert_review', pid, key, text)
+
+    upsert('place_3', 'r3_0', _text(rng))      # ganti review
+    upsert('place_4', 'r4_baru', _text(rng))   # tambah review
+    upsert('place_baru', 'r_baru', _text(rng))  # toko baru
+    upsert('place_kosong', 'r_kosong', 't1 t1')  # dokumen kosong jadi berisi
+    texts['place_5'].pop('r5_0')
+    both('remove_review', 'place_5', 'r5_0')
+    texts.pop('place_6')
+    both('remove_document', 'place_6')
+    texts['place_7'] = {'x': _text(rng)}
+    both('replace_document', 'place_7', [{'id': 'x', 'text': texts['place_7']['x']}])
+    both('set_field_text', 'place_8', 'pros', _text(rng, 1, 3))
+    assert loaded.stats()['overlay_documents'] <= 7  # hanya toko yang diubah
+    _assert_same_scores(index, loaded, _queries(seed), fields=DEFAULT_BM25F_FIELDS)
+
+    profiles = [
+        {'place_id': pid, 'reviews': [{'id': key, 'text': text} for key, text in reviews.items()]}
+        for pid, reviews in texts.items() if reviews and pid != 'place_9'
+    ]
+    # Hanya place_9 (basi) yang berubah; field BM25F profil kosong ikut disamakan di keduanya.
+    assert index.sync_profiles(profiles) == loaded.sync_profiles(profiles) == 1
+
+    assert loaded.stats()['mmap_snapshot']
+    assert loaded.stats()['overlay_documents'] < len(loaded) // 2
+    assert loaded.vocabulary() == index.vocabulary()
+    assert loaded.stats()['reviews'] == index.stats()['reviews']
+    _assert_same_scores(index, loaded, _queries(seed))
+    _assert_same_scores(index, loaded, _queries(seed), fields=DEFAULT_BM25F_FIELDS)
+
+    # Overlay ditulis lagi sebagai generasi baru dan dibaca ulang: skor tetap sama.
+    reloaded = _open(loaded, tmp_path / 'bm25.snap')
+    assert reloaded.generation == 2
+    assert reloaded.stats()['overlay_documents'] == 0
+    _assert_same_scores(index, reloaded, _queries(seed))
+
+
+def test_hot_swap_to_newer_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_utils, '_shared_index', None)
+    monkeypatch.setattr(bm25_utils, '_snapshot_seen', None)
+    path = str(tmp_path / 'bm25.snap')
+
+    # Tanpa file snapshot: indeks kosong di memori proses.
+    shared = get_shared_bm25_index(str.split, snapshot_path=path)
+    assert shared.generation == 0 and len(shared) == 0
+
+    writer = IncrementalBM25Index(str.split)
+    writer.upsert_review('a', 1, 't1 t2')
+    writer.upsert_review('b', 2, 't2 t3')
+    assert publish_bm25_snapshot(writer, path) == 1
+    first = get_shared_bm25_index(str.split, snapshot_path=path)
+    assert first is not shared
+    assert first.generation == 1 and first.stats()['mmap_snapshot']
+    assert get_shared_bm25_index(str.split, snapshot_path=path) is first
+
+    writer.upsert_review('c', 3, 't3 t4')
+    assert publish_bm25_snapshot(writer, path) == 2
+    second = get_shared_bm25_index(str.split, snapshot_path=path)
+    assert second is not first
+    assert second.generation == 2
+    assert sorted(second.place_ids) == ['a', 'b', 'c']
+    assert second.state_key() != first.state_key()
+    # Indeks lama (mmap lama) tetap bisa dipakai request yang masih memegangnya.
+    assert sorted(first.place_ids) == ['a', 'b']
+    assert first.vocabulary() == {'t1', 't2', 't3'}
+
+
+def test_old_snapshot_format_is_ignored(tmp_path):
+    path = tmp_path / 'bm25.snap'
+    index = IncrementalBM25Index(str.split)
+    index.upsert_review('a', 1, 't1')
+    write_bm25_snapshot(index, str(path))
+    data = bytearray(path.read_bytes())
+    data[8:10] = (1).to_bytes(2, 'little')  # format lama tanpa post_tf
+    path.write_bytes(bytes(data))
+    assert bm25_utils.read_bm25_snapshot_generation(str(path)) == 0
+    with pytest.raises(ValueError):
+        BM25Snapshot(str(path))
@@ -0,0 +1,33 @@
+"""_community_score_from_signals: mode BM25F tidak menghitung ulang pros dan best-for."""
+
+import pytest
+
+app = pytest.importorskip('app')
+
+
+def _signals(**vote):
+    return {
+        'vote': {
+            'rating_counts': vote.get('rating_counts') or {},
+            'best_for_counts': vote.get('best_for_counts') or {},
+            'slider_averages': vote.get('slider_averages') or {},
+        },
+        'top_pros': vote.get('top_pros') or [],
+    }
+
+
+def test_bm25f_mode_skips_pros_and_best_for():
+    signals = _signals(
+        rating_counts={'love': 1, 'ok': 1},      # 0.75
+        best_for_counts={'kerja': 1, 'meeting': 1},  # 0.5
+        top_pros=[{'text': 'wifi kencang', 'net': 8}],  # 1.0
+    )
+    full = app._community_score_from_signals(signals, ['kerja'])
+    assert full == pytest.approx((0.75 * 0.40 + 0.5 * 0.20 + 1.0 * 0.15) / 0.75, abs=1e-4)
+    assert app._community_score_from_signals(signals, ['kerja'], bm25f_fields=True) == pytest.approx(0.75)
+
+
+def test_bm25f_mode_without_vote_signals_is_none():
+    signals = _signals(best_for_counts={'kerja': 2}, top_pros=[{'text': 'nyaman', 'net': 3}])
+    assert app._community_score_from_signals(signals, ['kerja']) is not None
+    assert app._community_score_from_signals(signals, ['kerja'], bm25f_fields=True) is None
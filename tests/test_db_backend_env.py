@@ -0,0 +1,19 @@
+"""Env numerik db_backend yang tidak valid jatuh ke default, bukan membuat import gagal."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.mark.parametrize('raw, expected', [('abc', 1024), ('', 1024), ('-5', 0), ('64', 64)])
+def test_sql_translation_cache_size_env(raw, expected):
+    env = dict(os.environ, COFIND_SQL_TRANSLATION_CACHE_SIZE=raw)
+    out = subprocess.run(
+        [sys.executable, '-c', 'import db_backend; print(db_backend._translate_sql.cache_info().maxsize)'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.strip().splitlines()[-1] == str(expected)
@@ -0,0 +1,181 @@
+"""ConnectionPool: checkout/return, pengembalian lewat finalizer, umur maksimum, dan ping idle."""
+
+import gc
+import threading
+
+import pytest
+
+pytest.importorskip('psycopg2')
+from psycopg2 import extensions
+
+import db_backend
+from db_backend import ConnectionPool, PoolTimeout
+
+
+class _Cursor:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql, params=None):
+        if self.raw.dead:
+            raise RuntimeError('server closed the connection unexpectedly')
+        self.raw.queries.append(sql)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class _Raw:
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.dead = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self, *args, **kwargs):
+        return _Cursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _pool(**kwargs):
+    created = []
+
+    def connect():
+        raw = _Raw(len(created))
+        created.append(raw)
+        return raw
+
+    options = dict(size=2, max_overflow=1, timeout_seconds=0.05, max_lifetime_seconds=0, ping_idle_seconds=30)
+    options.update(kwargs)
+    return ConnectionPool(connect, **options), created
+
+
+def test_checkout_return_overflow_and_timeout():
+    pool, created = _pool()
+    conns = [pool.acquire() for _ in range(3)]
+    assert len(created) == 3
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    # Transaksi yang belum selesai di-rollback sebelum koneksi dipinjamkan lagi.
+    created[0].status = extensions.TRANSACTION_STATUS_INTRANS
+    for conn in conns:
+        conn.close()
+    conns[0].close()  # close kedua kali tidak mengembalikan lagi
+    assert created[0].rollbacks == 1
+    stats = pool.stats()
+    assert (stats['in_use'], stats['idle'], stats['closed'], stats['timeouts']) == (0, 2, 1, 1)
+    assert created[2].closed  # koneksi overflow ditutup saat kembali
+
+    # LIFO: koneksi yang terakhir kembali dipinjam lebih dulu, tanpa koneksi baru.
+    again = pool.acquire()
+    assert again._raw is created[1]
+    assert len(created) == 3
+    again.close()
+
+
+def test_broken_connection_is_closed_on_return():
+    pool, created = _pool()
+    conn = pool.acquire()
+    created[0].status = extensions.TRANSACTION_STATUS_UNKNOWN
+    conn.close()
+    stats = pool.stats()
+    assert (stats['idle'], stats['broken_on_return']) == (0, 1)
+    assert created[0].closed
+
+
+def test_finalizer_returns_connection_while_lock_is_held():
+    pool, created = _pool(size=1, max_overflow=0)
+    conn = pool.acquire()
+    # GC bisa membuang koneksi yang lupa di-close di thread yang sedang memegang lock pool:
+    # finalizer hanya mengantrekan, tidak menunggu lock (tidak deadlock).
+    with pool._cond:
+        del conn
+        gc.collect()
+        assert len(pool._pending_returns) == 1
+    again = pool.acquire()
+    assert again._raw is created[0]
+    assert pool.stats()['pending_returns'] == 0
+    again.close()
+    assert pool.stats()['idle'] == 1
+
+
+def test_finalizer_return_wakes_waiting_acquire():
+    pool, created = _pool(size=1, max_overflow=0, timeout_seconds=2.0)
+    holder = {'conn': pool.acquire()}
+    out = {}
+
+    def _wait():
+        out['conn'] = pool.acquire()
+
+    thread = threading.Thread(target=_wait, daemon=True)
+    thread.start()
+    while pool.stats()['waits'] == 0:
+        thread.join(0.005)
+    holder.clear()  # koneksi dibuang tanpa close()
+    gc.collect()
+    thread.join(2.0)
+    assert out['conn']._raw is created[0]
+    assert len(created) == 1
+    out['conn'].close()
+
+
+def test_max_lifetime_recycles_connections(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(db_backend.time, 'monotonic', clock)
+    pool, created = _pool(max_lifetime_seconds=10)
+    pool.acquire().close()
+    clock.now += 11
+    conn = pool.acquire()
+    assert conn._raw is created[1]
+    assert created[0].closed
+    # Koneksi yang kedaluwarsa saat dipinjam ditutup ketika dikembalikan.
+    clock.now += 11
+    conn.close()
+    stats = pool.stats()
+    assert (stats['recycled_lifetime'], stats['idle'], stats['created']) == (2, 0, 2)
+
+
+def test_idle_ping_replaces_dead_connection(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(db_backend.time, 'monotonic', clock)
+    pool, created = _pool(ping_idle_seconds=5)
+    pool.acquire().close()
+
+    clock.now += 1
+    pool.acquire().close()
+    assert created[0].queries == []  # baru saja dipakai: tanpa ping
+
+    clock.now += 6
+    pool.acquire().close()
+    assert created[0].queries == ['SELECT 1']
+
+    clock.now += 6
+    created[0].dead = True
+    conn = pool.acquire()
+    assert conn._raw is created[1]
+    assert created[0].closed
+    assert pool.stats()['ping_failures'] == 1
+    conn.close()
@@ -0,0 +1,35 @@
+"""expand_pill_keywords: validasi kosakata korpus ditunda (defer_grounding) sama dengan langsung."""
+
+import json
+
+import llm_recommender
+from llm_recommender import expand_pill_keywords, ground_expansion_keywords
+
+
+def _expand(**kwargs):
+    return expand_pill_keywords(
+        ['belajar'],
+        pill_labels={'belajar': 'Belajar'},
+        pill_lexicon=['tenang', 'wifi'],
+        chat_fn=lambda **_kw: json.dumps(['colokan banyak', 'wifi', 'meja luas', 'kopi susu']),
+        sanitize_keywords=list,
+        use_cache=False,
+        **kwargs,
+    )
+
+
+def test_deferred_grounding_matches_direct(monkeypatch):
+    monkeypatch.setattr(llm_recommender, 'expansion_max_terms', lambda: 8)
+    vocabulary = {'colokan', 'banyak', 'meja', 'luas'}
+
+    deferred = _expand(defer_grounding=True)
+    assert deferred['keywords'] == []
+    assert deferred['candidates'] == ['colokan banyak', 'meja luas', 'kopi susu']
+    assert deferred['rejected_lexicon'] == 1
+
+    grounded = ground_expansion_keywords(deferred, vocabulary)
+    direct = _expand(corpus_vocabulary=vocabulary)
+    assert grounded['keywords'] == direct['keywords'] == ['colokan banyak', 'meja luas']
+    assert grounded['rejected_vocabulary'] == direct['rejected_vocabulary'] == 1
+    # Korpus tidak tersedia: semua kandidat dipakai.
+    assert ground_expansion_keywords(_expand(defer_grounding=True), None)['keywords'] == deferred['candidates']
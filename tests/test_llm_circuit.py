@@ -0,0 +1,212 @@
+"""CircuitBreaker, LatencyTracker, dan jalur retry router (_call_with_retry) dengan jam tiruan."""
+
+import pytest
+
+import llm_backend
+import llm_circuit
+from llm_circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LatencyTracker, LLMCircuitOpenError
+from llm_limiter import LLMLimiter
+
+
+class _Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(llm_circuit.time, 'monotonic', fake)
+    return fake
+
+
+def _open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=30, half_open_probes=1)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(10)  # sukses mereset hitungan berturut-turut
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_success(10)
+
+    _open_breaker(breaker)
+    assert breaker.is_open()
+    assert not breaker.allow()
+    clock.now += 29.9
+    assert not breaker.allow()
+    assert breaker.short_circuited == 2
+
+    clock.now += 0.1
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open()
+    assert breaker.allow()        # probe
+    assert not breaker.allow()    # slot probe sudah terpakai
+    breaker.record_success(10)
+    assert breaker.state == CLOSED
+    stats = breaker.stats()
+    assert stats['times_opened'] == 1
+    assert stats['outcomes'] == {'failure': 6, 'success': 3}
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=10)
+    _open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    clock.now += 9
+    assert not breaker.allow()
+
+
+def test_record_ignored_releases_half_open_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=5, half_open_probes=1)
+    _open_breaker(breaker)
+    clock.now += 5
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Probe berakhir tanpa menilai router (mis. 400/429): slot dilepas, state tetap half_open.
+    breaker.record_ignored()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # Di state closed record_ignored tidak berpengaruh.
+    breaker.record_success(1)
+    breaker.record_ignored()
+    assert breaker.state == CLOSED
+
+
+def test_slow_success_counts_as_failure(clock):
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_ms=1000)
+    breaker.record_success(1500)
+    breaker.record_success(999)
+    breaker.record_success(2000)
+    assert breaker.state == CLOSED
+    breaker.record_success(2000)
+    assert breaker.state == OPEN
+    assert breaker.stats()['outcomes'] == {'slow': 3, 'success': 1}
+
+
+def test_adaptive_timeout_and_timeout_observation():
+    tracker = LatencyTracker(min_timeout=1.0, max_timeout=60.0, multiplier=2.0, min_samples=10, window=20)
+    assert tracker.timeout_for('rerank') == 60.0  # sampel belum cukup
+    for _ in range(20):
+        tracker.observe('rerank', 1000.0)
+    assert tracker.timeout_for('rerank') == 2.0
+    # Percobaan yang timeout dicatat senilai timeout-nya, jadi timeout naik lagi.
+    tracker.observe_timeout('rerank', 2.0)
+    tracker.observe_timeout('rerank', 2.0)
+    assert tracker.timeout_for('rerank') == 4.0
+    stats = tracker.stats()['rerank']
+    assert (stats['samples'], stats['timeouts'], stats['p99_ms']) == (20, 2, 2000.0)
+    assert tracker.timeout_for('summary') == 60.0
+
+
+class _RouterError(Exception):
+    def __init__(self, status_code=None, retry_after=None):
+        super().__init__(f'router {status_code}')
+        self.status_code = status_code
+        headers = {'retry-after': retry_after} if retry_after is not None else {}
+        self.response = type('Response', (), {'headers': headers})()
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+class _Limiter(LLMLimiter):
+    def __init__(self):
+        super().__init__(max_in_flight=0)
+        self.penalties = []
+
+    def penalize(self, seconds):
+        self.penalties.append(seconds)
+        super().penalize(0)
+
+
+@pytest.fixture
+def backend(monkeypatch, clock):
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=30)
+    tracker = LatencyTracker(min_timeout=1.0, max_timeout=60.0, min_samples=1)
+    limiter = _Limiter()
+    sleeps = []
+    monkeypatch.setattr(llm_backend, '_breaker', breaker)
+    monkeypatch.setattr(llm_backend, '_latency', tracker)
+    monkeypatch.setattr(llm_backend, '_limiter', limiter)
+    monkeypatch.setattr(llm_backend, '_MAX_RETRIES', 1)
+    monkeypatch.setattr(llm_backend, '_BACKOFF_FACTOR', 0.5)
+    monkeypatch.setattr(llm_backend.time, 'sleep', sleeps.append)
+    return breaker, tracker, limiter, sleeps
+
+
+def _router(*outcomes):
+    calls = []
+
+    def call(**kwargs):
+        calls.append(kwargs)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return call, calls
+
+
+def test_429_penalizes_limiter_without_tripping_breaker(backend):
+    breaker, _tracker, limiter, sleeps = backend
+    call, calls = _router(_RouterError(429, retry_after='3'), 'ok')
+    assert llm_backend._call_with_retry(call, site='rerank') == 'ok'
+    assert len(calls) == 2
+    assert limiter.penalties == [3.0]
+    assert sleeps == [0.0]  # jeda dijalani di antrean pembatas, bukan sleep
+    stats = breaker.stats()
+    assert stats['consecutive_failures'] == 0
+    assert stats['outcomes'] == {'success': 1}
+
+
+def test_429_without_retry_after_uses_backoff(backend):
+    _breaker, _tracker, limiter, _sleeps = backend
+    call, _calls = _router(_RouterError(429), 'ok')
+    assert llm_backend._call_with_retry(call, site='rerank') == 'ok'
+    assert limiter.penalties == [0.5]
+
+
+def test_router_failures_open_breaker_and_short_circuit(backend, clock):
+    breaker, _tracker, _limiter, _sleeps = backend
+    call, calls = _router(_RouterError(503), _RouterError(502))
+    with pytest.raises(_RouterError):
+        llm_backend._call_with_retry(call, site='rerank')
+    assert breaker.state == OPEN
+    with pytest.raises(LLMCircuitOpenError):
+        llm_backend._call_with_retry(call, site='rerank')
+    assert len(calls) == 2
+    # Probe sukses menutup circuit; 4xx sesudahnya bukan kegagalan router.
+    clock.now += 30
+    call, _calls = _router('ok')
+    assert llm_backend._call_with_retry(call, site='rerank') == 'ok'
+    assert breaker.state == CLOSED
+    call, _calls = _router(_RouterError(400), _RouterError(400))
+    with pytest.raises(_RouterError):
+        llm_backend._call_with_retry(call, site='rerank')
+    assert breaker.state == CLOSED
+
+
+def test_timeout_is_observed_as_latency_sample(backend):
+    breaker, tracker, _limiter, _sleeps = backend
+    tracker.observe('summary', 500.0)
+    call, calls = _router(APITimeoutError('timeout'), 'ok')
+    assert llm_backend._call_with_retry(call, site='summary') == 'ok'
+    assert calls[0]['timeout'] == 1.0
+    assert tracker.stats()['summary']['timeouts'] == 1
+    # Sampel timeout (1000 ms) menaikkan timeout percobaan berikutnya.
+    assert calls[1]['timeout'] == 2.0
+    assert breaker.stats()['outcomes'] == {'failure': 1, 'success': 1}
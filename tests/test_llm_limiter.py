@@ -0,0 +1,171 @@
+"""LLMLimiter dengan jam tiruan: prioritas, aging, token bucket, penalize, dan fallback Redis."""
+
+import threading
+import time
+
+import pytest
+
+import llm_limiter
+from llm_limiter import LLMLimiter, LLMRateLimitTimeout, _Waiter
+
+
+class _Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(llm_limiter.time, 'monotonic', fake)
+    return fake
+
+
+def _limiter(**kwargs):
+    kwargs.setdefault('site_priorities', {'rerank': 0, 'summary': 1, 'pros_cons': 2})
+    return LLMLimiter(**kwargs)
+
+
+def test_head_prefers_lower_priority_then_fifo(clock):
+    limiter = _limiter(aging_seconds=5.0)
+    pros = _Waiter(2, 0, clock.now, 0)
+    summary_1 = _Waiter(1, 1, clock.now, 0)
+    summary_2 = _Waiter(1, 2, clock.now, 0)
+    limiter._waiters = [pros, summary_2, summary_1]
+    assert limiter._head(clock.now) is summary_1
+    limiter._waiters = [pros, summary_2]
+    assert limiter._head(clock.now) is summary_2
+
+
+def test_aging_lets_old_low_priority_waiter_overtake(clock):
+    limiter = _limiter(aging_seconds=5.0)
+    old_pros = _Waiter(2, 0, clock.now, 0)
+    clock.now += 11.0  # prioritas efektif 2 - 11/5 = -0.2
+    new_rerank = _Waiter(0, 1, clock.now, 0)
+    limiter._waiters = [new_rerank, old_pros]
+    assert limiter._head(clock.now) is old_pros
+    # Baru menunggu 9 detik (2 - 9/5 = 0.2): rerank yang baru tetap didahulukan.
+    old_pros.enqueued = clock.now - 9.0
+    assert limiter._head(clock.now) is new_rerank
+
+
+def test_token_bucket_refills_over_time(clock):
+    limiter = _limiter(max_in_flight=0, tokens_per_minute=600)  # 10 token/detik
+    assert limiter._try_take(400, clock.now) == (0.0, None)
+    assert limiter._try_take(200, clock.now) == (0.0, None)
+    delay, _ = limiter._try_take(100, clock.now)
+    assert delay == pytest.approx(10.0)
+    clock.now += 4.0
+    delay, _ = limiter._try_take(100, clock.now)
+    assert delay == pytest.approx(6.0)
+    clock.now += 6.0
+    assert limiter._try_take(100, clock.now) == (0.0, None)
+    # Biaya di atas kapasitas dipotong ke kapasitas (request besar tetap bisa lewat).
+    clock.now += 60.0
+    assert limiter._try_take(10_000, clock.now) == (0.0, None)
+
+
+def test_in_flight_limit_and_release(clock):
+    limiter = _limiter(max_in_flight=1, max_wait_seconds=0.0)
+    permit = limiter.acquire('summary')
+    assert limiter.stats()['in_flight'] == 1
+    with pytest.raises(LLMRateLimitTimeout):
+        limiter.acquire('rerank')
+    limiter.release(permit)
+    limiter.release(limiter.acquire('rerank'))
+    stats = limiter.stats()
+    assert stats['in_flight'] == 0
+    assert stats['sites']['rerank'] == {
+        'priority': 0, 'requests': 1, 'avg_wait_ms': 0.0, 'max_wait_ms': 0.0, 'timeouts': 1,
+    }
+
+
+def test_penalize_blocks_until_retry_after(clock):
+    limiter = _limiter(max_in_flight=0)
+    limiter.penalize(3.0)
+    delay, _ = limiter._try_take(0, clock.now)
+    assert delay == pytest.approx(3.0)
+    clock.now += 3.0
+    assert limiter._try_take(0, clock.now) == (0.0, None)
+    assert limiter.stats()['rate_limited'] == 1
+
+
+def test_waiters_are_served_by_priority(clock):
+    limiter = _limiter(max_in_flight=1, max_wait_seconds=5.0, poll_interval_seconds=0.01)
+    held = limiter.acquire('summary')
+    order = []
+
+    def _worker(site):
+        permit = limiter.acquire(site)
+        order.append(site)
+        limiter.release(permit)
+
+    threads = []
+    for site in ('pros_cons', 'summary', 'rerank'):
+        thread = threading.Thread(target=_worker, args=(site,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        deadline = time.time() + 2.0
+        while limiter.stats()['queued'] < len(threads) and time.time() < deadline:
+            time.sleep(0.005)
+    limiter.release(held)
+    for thread in threads:
+        thread.join(2.0)
+    assert order == ['rerank', 'summary', 'pros_cons']
+
+
+class _FakeRedis:
+    def __init__(self, replies=(), error=None):
+        self.replies = list(replies)
+        self.error = error
+        self.calls = []
+
+    def eval(self, script, numkeys, *args):
+        self.calls.append(('eval', args))
+        if self.error is not None:
+            raise self.error
+        return self.replies.pop(0)
+
+    def zrem(self, key, member):
+        self.calls.append(('zrem', key, member))
+
+    def set(self, key, value, px=None):
+        self.calls.append(('set', key, px))
+
+
+def test_redis_lua_delay_mapping(clock):
+    client = _FakeRedis(replies=[1500, -1, 0])
+    limiter = _limiter(max_in_flight=2, tokens_per_minute=600, redis_client=client, poll_interval_seconds=0.1)
+    assert limiter._try_take(50, clock.now) == (1.5, None)   # token bucket Redis kurang
+    assert limiter._try_take(50, clock.now) == (0.1, None)   # in-flight Redis penuh
+    delay, member = limiter._try_take(50, clock.now)
+    assert delay == 0.0 and member
+    # Argumen skrip: lease, max_in_flight, token/ms, kapasitas, biaya, member.
+    assert client.calls[-1][1][3:] == (120000, 2, 0.01, 600, 50, member)
+
+    limiter.penalize(2.0)
+    assert ('set', 'cofind:llm_limiter:blocked', 2000) in client.calls
+
+
+def test_redis_release_removes_member(clock):
+    client = _FakeRedis(replies=[0])
+    limiter = _limiter(redis_client=client)
+    permit = limiter.acquire('rerank')
+    assert permit.member
+    limiter.release(permit)
+    assert client.calls[-1] == ('zrem', 'cofind:llm_limiter:in_flight', permit.member)
+
+
+def test_redis_failure_falls_back_to_local(clock, capsys):
+    client = _FakeRedis(error=ConnectionError('redis mati'))
+    limiter = _limiter(max_in_flight=1, tokens_per_minute=600, redis_client=client)
+    assert limiter._try_take(400, clock.now) == (0.0, None)
+    assert limiter.stats()['redis'] is False
+    assert 'pembatasan hanya lokal' in capsys.readouterr().out
+    # Token bucket lokal yang melanjutkan pembatasan.
+    delay, member = limiter._try_take(400, clock.now)
+    assert member is None and delay == pytest.approx(20.0)
+    assert len(client.calls) == 1
@@ -0,0 +1,52 @@
+"""PhraseIndex memakai KeywordPhraseMatcher: hasil frasa per review sama dengan pindaian matcher."""
+
+import random
+
+from bm25_utils import KeywordPhraseMatcher, PhraseIndex
+
+VOCAB = ['wifi', 'kencang', 'colokan', 'banyak', 'tempat', 'nugas', 'nyaman', 'tenang']
+
+
+def _lemmas(token):
+    # Imbuhan tiruan: 'nugasnya' -> ('nugasnya', 'nugas').
+    return (token, token[:-3]) if token.endswith('nya') else (token,)
+
+
+def _docs(rng):
+    return [
+        [rng.choice(VOCAB) + ('nya' if rng.random() < 0.2 else '') for _ in range(rng.randint(0, 12))]
+        for _ in range(rng.randint(1, 6))
+    ]
+
+
+def _keywords(rng):
+    return [' '.join(rng.sample(VOCAB, rng.randint(1, 3))) for _ in range(8)]
+
+
+def test_match_phrases_equals_matcher_per_review():
+    for seed in range(50):
+        rng = random.Random(seed)
+        docs, keywords = _docs(rng), _keywords(rng)
+        matcher = KeywordPhraseMatcher(keywords, lemma_fn=_lemmas)
+        expected = {}
+        for doc_id, tokens in enumerate(docs):
+            matched = matcher.matched_keywords(matcher.match_tokens(tokens))
+            if matched:
+                expected[doc_id] = matched
+        index = PhraseIndex(docs, lemma_fn=_lemmas)
+        assert index.match_phrases(keywords, matcher=matcher) == expected
+        # Tabel lemma tersimpan per dokumen memberi hasil yang sama dengan lemma_fn.
+        tables = [{token: _lemmas(token) for token in tokens} for tokens in docs]
+        assert PhraseIndex(docs, docs_lemmas=tables).match_phrases(keywords, matcher=matcher) == expected
+
+
+def test_phrase_spans_and_score():
+    index = PhraseIndex(
+        [['wifi', 'kencang', 'dan', 'colokannya', 'banyak'], ['colokan', 'ada', 'tapi', 'tidak', 'banyak']],
+        lemma_fn=_lemmas,
+    )
+    assert index.phrase_spans(['colokan', 'banyak']) == {0: [(3, 4)]}
+    assert index.phrase_spans(['banyak', 'colokan']) == {}
+    assert index.proximity_spans(['banyak', 'colokan'], 5) == {0: [(3, 4)], 1: [(0, 4)]}
+    # Frasa utuh = 1.0, berdekatan = 0.5, tidak ada = 0; keyword satu kata diabaikan.
+    assert index.phrase_score(['wifi kencang', 'tidak colokan', 'tempat nugas', 'wifi'], window=5) == 0.5
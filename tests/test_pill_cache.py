@@ -0,0 +1,148 @@
+"""PillResultCache (LRU + TTL) dan lapisan per-user _personalize_pill_result."""
+
+import json
+
+import pytest
+
+import recommendation_cache
+from recommendation_cache import PillResultCache, pill_cache_key
+
+
+def test_pill_cache_key_ignores_pill_order_and_duplicates():
+    assert pill_cache_key(['kerja', 'belajar', 'kerja'], 3, 'fp') == pill_cache_key(['belajar', 'kerja'], 3, 'fp')
+    assert pill_cache_key(['kerja'], 3, 'fp') != pill_cache_key(['kerja'], 4, 'fp')
+
+
+def test_pill_cache_lru_evicts_least_recently_used():
+    cache = PillResultCache(maxsize=2, ttl_seconds=0)
+    cache.put('a', {'v': 1})
+    cache.put('b', {'v': 2})
+    assert cache.get('a') == {'v': 1}  # 'a' jadi paling baru dipakai
+    cache.put('c', {'v': 3})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'v': 1}
+    assert cache.get('c') == {'v': 3}
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+
+def test_pill_cache_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recommendation_cache.time, 'time', lambda: now[0])
+    cache = PillResultCache(maxsize=4, ttl_seconds=10)
+    cache.put('a', {'v': 1})
+    now[0] += 9.5
+    assert cache.get('a') == {'v': 1}
+    now[0] += 1.0
+    assert cache.get('a') is None
+    assert cache.stats()['expired'] == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_pill_cache_disabled_when_maxsize_zero():
+    cache = PillResultCache(maxsize=0)
+    cache.put('a', {'v': 1})
+    assert not cache.enabled
+    assert cache.get('a') is None
+
+
+app = pytest.importorskip('app')
+
+
+def _shared(n=5):
+    return {
+        'search_keywords': ['wifi'],
+        'llm_preference_keywords': ['colokan'],
+        'keyword_expansion': {'source': 'llm'},
+        'rerank': {'backend': 'llm'},
+        'shortlisted': n,
+        'recommendations': [
+            {
+                'place_id': f'p{i}',
+                'name': f'Toko {i}',
+                'score': round(0.9 - i * 0.1, 2),
+                'final_score': round(0.9 - i * 0.1, 2),
+                'llm_fit': None,
+                'ranking_source': 'hybrid',
+                'supporting_evidence': {
+                    'review_count': 3,
+                    'review_quotes': [{'quote': f'wifi kencang sekali di toko {i} buat kerja', 'rating': 5}],
+                },
+            }
+            for i in range(n)
+        ],
+    }
+
+
+def _ids(body):
+    return [rec['place_id'] for rec in body['recommendations']]
+
+
+def test_personalize_excludes_not_helpful_and_backfills_from_reserve():
+    body, status = app._personalize_pill_result(
+        _shared(), ['kerja'], excluded_place_ids={'p0', 'p2'}, max_results=3,
+    )
+    assert status == 200
+    assert _ids(body) == ['p1', 'p3', 'p4']
+    assert body['llm_pipeline']['personalization_used'] is False
+
+
+def test_personalize_favorite_boost_moves_up_one_position(monkeypatch):
+    monkeypatch.setattr(app, 'COFIND_PILL_FAVORITE_RANK_BOOST', 1)
+    body, _ = app._personalize_pill_result(_shared(), ['kerja'], favorite_place_ids=['p3'], max_results=3)
+    assert _ids(body) == ['p0', 'p1', 'p3']
+    assert body['llm_pipeline']['personalization_used'] is True
+    # Favorit yang sudah teratas tidak dihitung sebagai personalisasi.
+    body, _ = app._personalize_pill_result(_shared(), ['kerja'], favorite_place_ids=['p0'], max_results=3)
+    assert _ids(body) == ['p0', 'p1', 'p2']
+    assert body['llm_pipeline']['personalization_used'] is False
+
+
+def test_personalize_empty_after_exclusion():
+    body, status = app._personalize_pill_result(
+        _shared(2), ['kerja'], excluded_place_ids={'p0', 'p1'}, max_results=3,
+    )
+    assert status == 200
+    assert body['recommendations'] == []
+
+
+def test_personalize_reranks_cached_pool_with_user_taste(monkeypatch):
+    prompts = []
+
+    def fake_chat(*, messages, max_tokens, temperature, cache_site='pipeline'):
+        prompt = messages[-1]['content']
+        prompts.append((cache_site, prompt))
+        # Kandidat diurutkan per place_id di prompt: id 5 = p4 paling cocok, id 1 = p0 paling tidak.
+        return json.dumps([
+            {'id': idx, 'fit_score': float(idx * 2), 'reason': f'alasan unik {idx}', 'evidence_index': 1}
+            for idx in range(1, 6)
+        ])
+
+    monkeypatch.setattr(app, 'llm_is_available', lambda: True)
+    monkeypatch.setattr(app, 'llm_rerank_enabled', lambda: True)
+    monkeypatch.setattr(app, 'COFIND_PILL_PERSONAL_RERANK', True)
+    monkeypatch.setattr(app, '_llm_chat_for_pipeline', fake_chat)
+    monkeypatch.setenv('COFIND_LLM_RERANK_WEIGHT', '1.0')
+
+    shared = _shared()
+    body, _ = app._personalize_pill_result(
+        shared, ['kerja'], excluded_place_ids={'p3'}, user_taste_block='SELERA_USER', max_results=3,
+    )
+    assert len(prompts) == 1
+    assert prompts[0][0] == 'rerank'
+    assert 'SELERA_USER' in prompts[0][1]
+    assert 'Toko 3' not in prompts[0][1]
+    assert _ids(body) == ['p4', 'p2', 'p1']
+    assert all(rec['ranking_source'] == 'llm' for rec in body['recommendations'])
+    assert 'evidence' not in body['recommendations'][0]
+    assert body['llm_pipeline']['rerank']['personalized'] is True
+    assert body['llm_pipeline']['personalization_used'] is True
+    # Hasil bersama (isi cache) tidak ikut berubah.
+    assert [rec['place_id'] for rec in shared['recommendations']] == ['p0', 'p1', 'p2', 'p3', 'p4']
+    assert shared['recommendations'][0]['llm_fit'] is None
+
+    prompts.clear()
+    body, _ = app._personalize_pill_result(shared, ['kerja'], user_taste_block='', max_results=3)
+    assert prompts == []
+    assert _ids(body) == ['p0', 'p1', 'p2']
@@ -0,0 +1,129 @@
+"""ShopProfileStore: invalidasi per bagian, TTL, dan event Redis (atomik, tanpa event sendiri)."""
+
+import pytest
+
+import profile_store
+from profile_store import PROFILE_PARTS, ShopProfileStore, publish_invalidation
+
+
+def _store(calls, **kwargs):
+    version = {}
+
+    def loader(part):
+        def load(place_ids):
+            calls.append((part, tuple(place_ids)))
+            version[part] = version.get(part, 0) + 1
+            return {pid: f'{part}-{pid}-v{version[part]}' for pid in place_ids}
+        return load
+
+    return ShopProfileStore(
+        {part: loader(part) for part in PROFILE_PARTS},
+        lambda pid, parts: {'place_id': pid, **parts},
+        **kwargs,
+    )
+
+
+def test_invalidate_reloads_only_stale_part():
+    calls = []
+    store = _store(calls, ttl_seconds=0)
+    first = store.get_profiles(['a', 'b'])
+    assert sorted(calls) == sorted((part, ('a', 'b')) for part in PROFILE_PARTS)
+
+    calls.clear()
+    assert store.get_profiles(['a', 'b']) == first
+    assert calls == []
+
+    revision = store.revision
+    store.invalidate('a', ['votes'])
+    assert store.revision == revision + 1
+    second = store.get_profiles(['a', 'b'])
+    assert calls == [('votes', ('a',))]
+    assert second['a']['votes'] == 'votes-a-v2'
+    assert second['a']['reviews'] == first['a']['reviews']
+    # Profil yang tidak berubah dikembalikan apa adanya (objek yang sama).
+    assert second['b'] is first['b']
+    stats = store.stats()
+    assert (stats['hits'], stats['misses']) == (3, 3)
+    assert stats['part_loads']['votes'] == 3
+
+
+def test_ttl_expires_parts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profile_store.time, 'time', lambda: now[0])
+    calls = []
+    store = _store(calls, ttl_seconds=60)
+    store.get_profiles(['a'])
+    now[0] += 59
+    calls.clear()
+    store.get_profiles(['a'])
+    assert calls == []
+    now[0] += 2
+    store.get_profiles(['a'])
+    assert sorted(part for part, _pids in calls) == sorted(PROFILE_PARTS)
+
+
+class _FakeRedis:
+    """Redis minimal: INCR/ZADD/ZREMRANGEBYRANK lewat eval skrip publish."""
+
+    def __init__(self):
+        self.seq = 0
+        self.events = []  # (skor, member)
+
+    def get(self, key):
+        return str(self.seq).encode() if key.endswith(':seq') else None
+
+    def zrangebyscore(self, key, low, high):
+        return [member.encode() for score, member in self.events if low <= score <= high]
+
+    def eval(self, script, numkeys, seq_key, events_key, max_events, origin, place_id, *parts):
+        assert script == profile_store._PUBLISH_LUA
+        for part in parts:
+            self.seq += 1
+            self.events.append((self.seq, f'{self.seq}|{origin}|{part}|{place_id}'))
+        self.events = self.events[-int(max_events):]
+        return self.seq
+
+
+def test_redis_events_skip_own_origin_and_invalidate_others():
+    client = _FakeRedis()
+    calls_1, calls_2 = [], []
+    worker_1 = _store(calls_1, ttl_seconds=0, redis_client=client, origin='w1')
+    worker_2 = _store(calls_2, ttl_seconds=0, redis_client=client, origin='w2')
+    worker_1.get_profiles(['a'])
+    worker_2.get_profiles(['a'])
+    calls_1.clear()
+    calls_2.clear()
+
+    # Hook tulis di worker 1: invalidasi lokal + satu event per bagian.
+    worker_1.invalidate('a', ['votes', 'pros'])
+    assert publish_invalidation(client, 'a', ['votes', 'pros'], origin='w1') == 2
+
+    worker_1.get_profiles(['a'])
+    worker_2.get_profiles(['a'])
+    assert sorted(calls_1) == sorted(calls_2) == [('pros', ('a',)), ('votes', ('a',))]
+    # Event sendiri tidak menaikkan revisi lagi (sudah naik lewat invalidasi lokal).
+    assert worker_1.current_revision() == 1
+    assert worker_2.current_revision() == 2
+
+
+def test_redis_trimmed_events_invalidate_everything(monkeypatch):
+    monkeypatch.setattr(profile_store, '_REDIS_MAX_EVENTS', 2)
+    client = _FakeRedis()
+    calls = []
+    store = _store(calls, ttl_seconds=0, redis_client=client, origin='w2')
+    store.get_profiles(['a', 'b'])
+    calls.clear()
+    publish_invalidation(client, 'a', ['votes', 'pros', 'shop'], origin='w1')
+    store.get_profiles(['a', 'b'])
+    assert sorted(part for part, _pids in calls) == sorted(PROFILE_PARTS)
+
+
+@pytest.mark.parametrize('raw', [b'7|w1|*|*', '7|w1|all|*'])
+def test_redis_all_places_event(raw):
+    calls = []
+    store = _store(calls, ttl_seconds=0, origin='w2')
+    store.get_profiles(['a'])
+    calls.clear()
+    store._apply_remote_event(raw)
+    store.get_profiles(['a'])
+    assert len(calls) == len(PROFILE_PARTS)
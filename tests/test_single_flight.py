@@ -0,0 +1,185 @@
+"""SingleFlight: serah-terima pemimpin/penunggu, pemimpin yang berhenti (_ABANDONED), dan Redis."""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _drain(gen):
+    events = []
+    while True:
+        try:
+            events.append(next(gen))
+        except StopIteration as stop:
+            return events, stop.value
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            raise AssertionError('kondisi tidak tercapai')
+        time.sleep(0.005)
+
+
+def _start_follower(flight, key, factory, **kwargs):
+    out = {}
+
+    def _run():
+        try:
+            out['events'], out['value'] = _drain(flight.run(key, factory, **kwargs))
+        except BaseException as e:  # diteruskan ke assertion di thread utama
+            out['error'] = e
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread, out
+
+
+def _counting_factory(calls, result='hasil'):
+    def factory():
+        calls.append(1)
+        yield 'profiles'
+        yield 'summary'
+        return result
+    return factory
+
+
+def test_follower_receives_leader_events_and_result():
+    flight = SingleFlight()
+    calls = []
+    factory = _counting_factory(calls)
+    leader = flight.run('k', factory)
+    assert next(leader) == 'profiles'
+
+    thread, out = _start_follower(flight, 'k', factory)
+    _wait_until(lambda: flight.stats()['followers'] == 1)
+    events, value = _drain(leader)
+    thread.join(2.0)
+
+    assert events == ['summary']
+    assert value == ('hasil', 'leader')
+    assert out['events'] == ['profiles', 'summary']
+    assert out['value'] == ('hasil', 'follower')
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert (stats['in_flight'], stats['leaders'], stats['followers']) == (0, 1, 1)
+
+
+def test_abandoned_leader_hands_off_to_follower():
+    flight = SingleFlight()
+    calls = []
+    factory = _counting_factory(calls)
+    leader = flight.run('k', factory)
+    assert next(leader) == 'profiles'
+
+    thread, out = _start_follower(flight, 'k', factory)
+    _wait_until(lambda: flight.stats()['followers'] == 1)
+    leader.close()  # klien pemimpin putus: GeneratorExit di dalam run()
+    thread.join(2.0)
+
+    assert 'error' not in out
+    # Penunggu menerima event pemimpin lama, lalu menghitung sendiri sebagai pemimpin baru.
+    assert out['events'] == ['profiles', 'profiles', 'summary']
+    assert out['value'] == ('hasil', 'leader')
+    assert len(calls) == 2
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_leader_error_is_raised_for_followers():
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def factory():
+        yield 'profiles'
+        gate.wait(2.0)
+        raise ValueError('korpus rusak')
+
+    leader = flight.run('k', factory)
+    assert next(leader) == 'profiles'
+    thread, out = _start_follower(flight, 'k', factory)
+    _wait_until(lambda: flight.stats()['followers'] == 1)
+    gate.set()
+    with pytest.raises(ValueError):
+        _drain(leader)
+    thread.join(2.0)
+
+    assert isinstance(out['error'], RuntimeError)
+    assert 'korpus rusak' in str(out['error'])
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    calls = []
+    factory = _counting_factory(calls)
+    first = flight.run('a', factory)
+    next(first)
+    assert _drain(flight.run('b', factory))[1] == ('hasil', 'leader')
+    assert _drain(first)[1] == ('hasil', 'leader')
+    assert len(calls) == 2
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+def test_redis_leader_shares_result_and_releases_lock():
+    client = _FakeRedis()
+    calls = []
+    worker_a = SingleFlight(redis_client=client)
+    worker_b = SingleFlight(redis_client=client)
+
+    events, value = _drain(worker_a.run('k', _counting_factory(calls, {'v': 1}), shared_key='s'))
+    assert value == ({'v': 1}, 'leader')
+    assert 'cofind:single_flight:lock:s' not in client.data
+
+    events, value = _drain(worker_b.run('k', _counting_factory(calls, {'v': 2}), shared_key='s'))
+    assert events == []
+    assert value == ({'v': 1}, 'remote')
+    assert len(calls) == 1
+    assert worker_b.stats()['remote_hits'] == 1
+
+
+def test_redis_share_result_filter_skips_degraded_results():
+    client = _FakeRedis()
+    flight = SingleFlight(redis_client=client)
+    _drain(flight.run(
+        'k', _counting_factory([], {'llm_degraded': True}), shared_key='s',
+        share_result=lambda result: not result.get('llm_degraded'),
+    ))
+    assert 'cofind:single_flight:result:s' not in client.data
+
+
+def test_redis_lock_held_elsewhere_waits_then_computes_locally():
+    client = _FakeRedis()
+    client.data['cofind:single_flight:lock:s'] = 'worker-lain'
+    calls = []
+    flight = SingleFlight(redis_client=client, wait_timeout_seconds=0.05, poll_interval_seconds=0.01)
+
+    events, value = _drain(flight.run('k', _counting_factory(calls), shared_key='s', wait_event='menunggu'))
+    assert events == ['menunggu', 'profiles', 'summary']
+    assert value == ('hasil', 'leader')
+    assert len(calls) == 1
+    assert client.data['cofind:single_flight:lock:s'] == 'worker-lain'
+    # Tanpa lock sendiri hasil tidak dibagi; pemegang lock yang akan menaruhnya.
+    assert 'cofind:single_flight:result:s' not in client.data
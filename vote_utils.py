@@ -10,6 +10,7 @@ Menyimpan & mengagregasi vote user terhadap coffee shop:
 from datetime import datetime
 from auth_utils import get_db_connection
 from db_backend import dict_from_row
+from profile_store import notify_all_profiles_changed, notify_profile_changed
 
 PRESENCE_OPTIONS = ('here', 'been', 'want')
 RATING_OPTIONS = ('love', 'like', 'ok', 'dislike', 'hate')
@@ -120,6 +121,8 @@ def migrate_review_ratings_to_votes():
                 updated += 1
 
         conn.commit()
+        if updated:
+            notify_all_profiles_changed()
         return updated
     except Exception:
         try:
@@ -244,6 +247,7 @@ def upsert_vote(user_id, place_id, presence=None, rating=None, best_for=None,
             )
 
         conn.commit()
+        notify_profile_changed(canonical_place_id, 'votes')
         return {'success': True}
     except Exception as e:
         if conn: